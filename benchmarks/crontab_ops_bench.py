@@ -0,0 +1,238 @@
+"""
+Runs the init, insert, delete and update operations of ManagePyCronScript against synthetic crontabs
+of 10 up to 100k lines, through a fake 'crontab' executable so nothing touches the real cron.
+Reports per operation the latency, how many processes were spawned, if the crontab was written and
+the peak python memory, and stores the results as JSON so two commits can be compared. The replaced
+crontabs are snapshot as usual, PYCRON_SNAPSHOT_KEEP=0 measures the operations without the snapshots. The
+'insert-existing' and 'delete-missing' operations change nothing, so they should write nothing
+
+    python benchmarks/crontab_ops_bench.py [--sizes 10,100,1000,10000,100000] [--repeat 5]
+                                           [--backend crontab|spool] [--output results.json]
+    python benchmarks/crontab_ops_bench.py --compare old.json new.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from python_crontab.build_py_cron import BuildPyCronScript  # noqa: E402
+from python_crontab.manage_pycron import ManagePyCronScript  # noqa: E402
+from python_crontab.snapshots import SnapshotStore  # noqa: E402
+from python_crontab.table_cache import TableCache  # noqa: E402
+from utilities.cron_backend import make_cron_backend  # noqa: E402
+
+OPERATIONS = ("init", "insert", "delete", "update", "insert-existing", "delete-missing")
+
+# Keeps the crontab in $FAKE_CRONTAB_DIR/<user> and logs every call on $FAKE_CRONTAB_DIR/calls.log
+FAKE_CRONTAB = """#!/bin/sh
+file="$FAKE_CRONTAB_DIR/${USER:-unknown}"
+echo "$*" >> "$FAKE_CRONTAB_DIR/calls.log"
+if [ "$1" = "-u" ]; then file="$FAKE_CRONTAB_DIR/$2"; shift 2; fi
+case "$1" in
+  -l) [ -f "$file" ] && exec cat "$file" || { echo "no crontab for user" >&2; exit 1; } ;;
+  -) cat > "$file.tmp" && mv "$file.tmp" "$file" ;;
+  *) echo "unsupported: $*" >&2; exit 2 ;;
+esac
+"""
+
+
+def job_script(index: int) -> str:
+    return f"/opt/jobs/job{index}.py"
+
+
+def synthetic_crontab(lines: int) -> str:
+    """A crontab with an environment line, a comment every 50 lines and pycron entries for the rest"""
+    builder = BuildPyCronScript()
+    builder._py_interpreter = sys.executable
+    crontab = ["MAILTO=''"]
+    for index in range(1, lines):
+        if index % 50 == 0:
+            crontab.append(f"# block {index // 50}")
+            continue
+        builder.interval = str(index % 59 + 1)
+        builder.script = job_script(index)
+        crontab.append(builder.build_cron_script())
+    return "\n".join(crontab[:lines]) + "\n"
+
+
+class Bench:
+    def __init__(self, work_dir: str, backend: str):
+        self.work_dir = work_dir
+        self.backend_name = backend
+        self.user = "bench"
+        self.crontab_path = os.path.join(work_dir, self.user)
+        self.calls_log = os.path.join(work_dir, "calls.log")
+
+    def install_fakes(self) -> None:
+        bin_dir = os.path.join(self.work_dir, "bin")
+        os.makedirs(bin_dir)
+        for name, content in (("crontab", FAKE_CRONTAB), ("postfix", "#!/bin/sh\n")):
+            path = os.path.join(bin_dir, name)
+            with open(path, "w") as fake:
+                fake.write(content)
+            os.chmod(path, 0o755)
+        os.environ["PATH"] = bin_dir + os.pathsep + os.environ["PATH"]
+        os.environ["FAKE_CRONTAB_DIR"] = self.work_dir
+        os.environ["USER"] = self.user
+        os.environ["PYCRON_LOCK_DIR"] = os.path.join(self.work_dir, "locks")
+
+    def spawns(self) -> int:
+        if not os.path.exists(self.calls_log):
+            return 0
+        with open(self.calls_log) as calls:
+            return sum(1 for _ in calls)
+
+    def writes(self) -> int:
+        """Tells the crontab writes apart by the inode, as both backends replace the crontab file"""
+        try:
+            return os.stat(self.crontab_path).st_ino
+        except FileNotFoundError:
+            return 0
+
+    def manager(self) -> ManagePyCronScript:
+        backend = make_cron_backend(self.backend_name, self.user, self.work_dir)
+        if backend.snapshots is not None:
+            backend.snapshots = SnapshotStore(os.path.join(self.work_dir, "snapshots"), backend.snapshots.keep)
+        if backend.table_cache is not None:
+            backend.table_cache = TableCache(os.path.join(self.work_dir, "tables"))
+        manager = ManagePyCronScript(BuildPyCronScript(), backend)
+        manager.pycron_builder.set_py_interpreter(sys.executable)
+        # Measures the operations themselves, even when a pycron daemon is running
+        manager.use_daemon = False
+        return manager
+
+    def operation(self, name: str, lines: int) -> Callable[[], None]:
+        """Prepares the crontab for the operation and returns the operation itself"""
+        if os.path.exists(self.crontab_path):
+            os.unlink(self.crontab_path)
+        if name != "init":
+            with open(self.crontab_path, "w") as crontab:
+                crontab.write(synthetic_crontab(lines))
+        manager = self.manager()
+        middle = max(1, lines // 2 // 50 * 50 + 1)
+        if name == "init":
+            manager.interval = "5"
+            manager.set_script(job_script(0))
+            return manager.init_cron
+        if name in ("insert", "insert-existing"):
+            manager.interval = str(middle % 59 + 1) if name == "insert-existing" else "5"
+            manager.set_script(job_script(middle if name == "insert-existing" else lines + 1))
+            return manager.insert_new_cron
+        if name in ("delete", "delete-missing"):
+            manager.interval = str(middle % 59 + 1)
+            manager.set_script(job_script(middle if name == "delete" else lines + 1))
+            return manager.remove_cron_entry
+        manager.set_old_values([str(middle % 59 + 1), job_script(middle)])
+        manager.set_new_values(["*/7 * * * *", job_script(middle)])
+        return manager.update_cron
+
+    def measure(self, name: str, lines: int, repeat: int) -> Dict:
+        timings = []
+        spawns = writes = 0
+        for _ in range(repeat):
+            run = self.operation(name, lines)
+            spawns_before, inode_before = self.spawns(), self.writes()
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                start = time.perf_counter()
+                run()
+                timings.append((time.perf_counter() - start) * 1000)
+            spawns = self.spawns() - spawns_before
+            writes = int(self.writes() != inode_before)
+            if not run.__self__.successfully_command and name not in ("insert-existing", "delete-missing"):
+                raise RuntimeError(f"{name} over {lines} lines did not succeed")
+
+        run = self.operation(name, lines)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            tracemalloc.start()
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return {
+            "operation": name,
+            "lines": lines,
+            "backend": self.backend_name,
+            "latency_ms": {"min": min(timings), "median": statistics.median(timings), "max": max(timings)},
+            "spawns": spawns,
+            "writes": writes,
+            "peak_memory_kib": peak // 1024,
+        }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              encoding="utf-8", check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_results(results: List[Dict]) -> None:
+    print(f"{'operation':>15} {'lines':>7} {'min ms':>9} {'median ms':>10} {'max ms':>9} {'spawns':>6} {'writes':>6} "
+          f"{'peak KiB':>9}")
+    for result in results:
+        latency = result["latency_ms"]
+        print(f"{result['operation']:>15} {result['lines']:>7} {latency['min']:>9.2f} {latency['median']:>10.2f} "
+              f"{latency['max']:>9.2f} {result['spawns']:>6} {result.get('writes', '-'):>6} "
+              f"{result['peak_memory_kib']:>9}")
+    written = [result for result in results if "writes" in result]
+    print(f"{sum(result['writes'] for result in written)} of {len(written)} operations wrote the crontab")
+
+
+def compare(old_path: str, new_path: str) -> None:
+    with open(old_path) as old_file, open(new_path) as new_file:
+        old, new = json.load(old_file), json.load(new_file)
+    old_results = {(r["operation"], r["lines"], r["backend"]): r for r in old["results"]}
+    print(f"{old['commit']} -> {new['commit']}")
+    print(f"{'operation':>15} {'lines':>7} {'median ms':>21} {'ratio':>6} {'spawns':>9} {'peak KiB':>17}")
+    for result in new["results"]:
+        before = old_results.get((result["operation"], result["lines"], result["backend"]))
+        if before is None:
+            continue
+        old_median, new_median = before["latency_ms"]["median"], result["latency_ms"]["median"]
+        print(f"{result['operation']:>15} {result['lines']:>7} {old_median:>9.2f} -> {new_median:>8.2f} "
+              f"{new_median / old_median if old_median else 0:>6.2f} {before['spawns']:>3} -> {result['spawns']:>3} "
+              f"{before['peak_memory_kib']:>7} -> {result['peak_memory_kib']:>7}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1000,10000,100000")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--operations", default=",".join(OPERATIONS))
+    parser.add_argument("--backend", choices=("crontab", "spool"), default="crontab")
+    parser.add_argument("--output", help="the JSON file the results are written to")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compares two result files")
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        bench = Bench(work_dir, args.backend)
+        bench.install_fakes()
+        for lines in (int(size) for size in args.sizes.split(",")):
+            for operation in args.operations.split(","):
+                results.append(bench.measure(operation, lines, args.repeat))
+    print_results(results)
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({"commit": git_commit(), "python": platform.python_version(), "backend": args.backend,
+                       "timestamp": time.time(), "results": results}, output, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Compares the per-fire latency and cpu time of a job with heavy imports run cold, as the plain
+crontab entries run it, and through the trigger of the warm entries with the pool preloading
+the imports
+
+    python benchmarks/pool_bench.py [--fires 20] [--workers 2]
+"""
+import argparse
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRIGGER_SCRIPT = os.path.join(ROOT, "pycron", "trigger.py")
+
+HEAVY_IMPORTS = ["argparse", "asyncio", "decimal", "email.mime.multipart", "http.client", "json", "logging",
+                 "unittest", "xml.dom.minidom"]
+
+JOB = "import " + ", ".join(HEAVY_IMPORTS) + "\nprint(sum(range(1000)))\n"
+
+
+def children_cpu() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def tree_cpu(pid: int) -> float:
+    """The cpu time of a process and of the children it reaped, plus the same for its live children"""
+    with open(f"/proc/{pid}/stat") as stat:
+        fields = stat.read().rsplit(")", 1)[1].split()
+    cpu = sum(int(ticks) for ticks in fields[11:15]) / os.sysconf("SC_CLK_TCK")
+    with open(f"/proc/{pid}/task/{pid}/children") as children:
+        return cpu + sum(tree_cpu(int(child)) for child in children.read().split())
+
+
+def fire(commands: List[str], fires: int, pool_pid: int = 0) -> Tuple[List[float], float]:
+    timings = []
+    cpu_start = children_cpu() + (tree_cpu(pool_pid) if pool_pid else 0)
+    for _ in range(fires):
+        start = time.perf_counter()
+        subprocess.run(commands, stdout=subprocess.DEVNULL, check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    cpu = children_cpu() + (tree_cpu(pool_pid) if pool_pid else 0) - cpu_start
+    return timings, cpu * 1000 / fires
+
+
+def report(name: str, timings: List[float], cpu_ms: float) -> None:
+    print(f"{name:>5}: latency min {min(timings):6.1f} ms  median {statistics.median(timings):6.1f} ms  "
+          f"max {max(timings):6.1f} ms  cpu {cpu_ms:6.1f} ms per fire")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fires", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        job = os.path.join(work_dir, "job.py")
+        with open(job, "w") as job_file:
+            job_file.write(JOB)
+        socket_path = os.path.join(work_dir, "pool.sock")
+        job_command = [sys.executable, job]
+
+        report("cold", *fire(job_command, args.fires))
+
+        pool = subprocess.Popen([sys.executable, "-m", "pycron.pool", "--socket", socket_path,
+                                 "--workers", str(args.workers), "--preload", ",".join(HEAVY_IMPORTS)],
+                                cwd=ROOT, stderr=subprocess.DEVNULL)
+        try:
+            while not os.path.exists(socket_path):
+                time.sleep(0.01)
+            time.sleep(0.2)
+            trigger_command = [sys.executable, "-S", TRIGGER_SCRIPT, "--socket", socket_path, "--"] + job_command
+            report("warm", *fire(trigger_command, args.fires, pool.pid))
+        finally:
+            pool.terminate()
+            pool.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Measures the overhead the 'pycron.run' wrapper adds to a job: the wall time of '/bin/true' run
+straight and through the wrapper, started like the recorded crontab entries start it
+
+    python benchmarks/run_overhead_bench.py [--runs 50]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from python_crontab.run_log import read_runs  # noqa: E402
+
+RUN_SCRIPT = os.path.join(ROOT, "pycron", "run.py")
+
+
+def time_run(commands: List[str], runs: int) -> List[float]:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(commands, stdout=subprocess.DEVNULL, check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        log_path = os.path.join(log_dir, "runs.log")
+        scenarios: Dict[str, List[str]] = {
+            "/bin/true": ["/bin/true"],
+            "python -S -c pass": [sys.executable, "-S", "-c", "pass"],
+            "wrapped /bin/true": [sys.executable, "-S", RUN_SCRIPT, "--log", log_path, "--", "/bin/true"],
+        }
+        medians = {}
+        for name, commands in scenarios.items():
+            timings = time_run(commands, args.runs)
+            medians[name] = statistics.median(timings)
+            print(f"{name:>18}: min {min(timings):6.1f} ms  median {medians[name]:6.1f} ms  "
+                  f"max {max(timings):6.1f} ms")
+        print(f"\nwrapper overhead (median): {medians['wrapped /bin/true'] - medians['/bin/true']:.1f} ms, "
+              f"of which {medians['wrapped /bin/true'] - medians['python -S -c pass'] - medians['/bin/true']:.1f} ms "
+              f"beyond the interpreter startup")
+        print(f"records written: {len(read_runs(log_path))}, log size: {os.path.getsize(log_path)} bytes")
+
+
+if __name__ == "__main__":
+    main()
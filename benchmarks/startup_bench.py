@@ -0,0 +1,58 @@
+"""
+Measures the cli startup: the wall time of a '--help' run and of a no-op run (no command switch),
+plus the slowest imports of the no-op run as reported by '-X importtime'
+
+    python benchmarks/startup_bench.py [--runs 20]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS: Dict[str, List[str]] = {
+    "python -c pass": [sys.executable, "-c", "pass"],
+    "--help": [sys.executable, "-m", "pycron.cli", "--help"],
+    "no-op": [sys.executable, "-m", "pycron.cli", "--py", sys.executable],
+}
+
+
+def time_run(commands: List[str], runs: int) -> List[float]:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(commands, cwd=ROOT, stdout=subprocess.DEVNULL, check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def slowest_imports(commands: List[str], top: int = 8) -> List[str]:
+    completed = subprocess.run([commands[0], "-X", "importtime"] + commands[1:], cwd=ROOT,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, encoding="utf-8", check=True)
+    imports = []
+    for line in completed.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line and "cumulative" not in line:
+            _, cumulative, module = line.split("|")
+            imports.append((int(cumulative), module.rstrip()))
+    return [f"{cumulative / 1000:7.2f} ms {module}" for cumulative, module in sorted(imports, reverse=True)[:top]]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    for name, commands in SCENARIOS.items():
+        timings = time_run(commands, args.runs)
+        print(f"{name:>16}: min {min(timings):6.1f} ms  median {statistics.median(timings):6.1f} ms  "
+              f"max {max(timings):6.1f} ms")
+    print("\nslowest imports of the no-op run (cumulative):")
+    print("\n".join(slowest_imports(SCENARIOS["no-op"])))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Measures '--stats' over a large run log: writes RECORDS synthetic run records spread over JOBS jobs
+and DAYS days, then times reading the log and aggregating the stats of the whole log and of the
+last 24 hours, which skips the older records without unpacking them
+
+    python benchmarks/stats_bench.py [--records 2000000] [--jobs 500] [--days 30]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from python_crontab.run_log import read_run_columns  # noqa: E402
+from python_crontab.run_record import FLAG_SKIPPED, RUN_RECORD  # noqa: E402
+from python_crontab.run_stats import collect_stats  # noqa: E402
+
+
+def write_log(path: str, records: int, jobs: int, days: int) -> None:
+    random_gen = random.Random(0)
+    now = time.time()
+    start = now - days * 24 * 60 * 60
+    step = (now - start) / records
+    with open(path, "wb") as log:
+        chunk = bytearray()
+        for index in range(records):
+            duration = random_gen.lognormvariate(0, 1)
+            flags = FLAG_SKIPPED if random_gen.random() < 0.01 else 0
+            exit_code = 1 if random_gen.random() < 0.02 else 0
+            chunk += RUN_RECORD.pack(start + index * step, duration, duration / 2, 0.01,
+                                     random_gen.randrange(10_000, 500_000), exit_code, index, index % jobs, flags)
+            if len(chunk) >= 1 << 20:
+                log.write(chunk)
+                chunk.clear()
+        log.write(chunk)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=2_000_000)
+    parser.add_argument("--jobs", type=int, default=500)
+    parser.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        log_path = os.path.join(log_dir, "runs.log")
+        write_log(log_path, args.records, args.jobs, args.days)
+        print(f"run log: {args.records} records, {os.path.getsize(log_path) / 2 ** 20:.1f} MiB")
+        for window, since in (("all", None), ("24h", time.time() - 24 * 60 * 60)):
+            start = time.perf_counter()
+            runs = read_run_columns(log_path, since)
+            read_time = time.perf_counter() - start
+            stats = collect_stats(runs, {})
+            total_time = time.perf_counter() - start
+            print(f"{window:>4}: {len(runs.job_id):>9} records read in {read_time:6.2f} s, "
+                  f"{len(stats)} jobs aggregated in {total_time - read_time:6.2f} s, total {total_time:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
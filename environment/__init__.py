@@ -1,4 +1,34 @@
 import os
-from typing import Final
+from typing import Final, Optional
 
 USER: Final[str] = os.getenv('USER', 'unknown')
+
+# Crontab storage: 'crontab' goes through the crontab command, 'spool' reads and writes the spool file directly
+CRON_BACKEND: Final[str] = os.getenv('PYCRON_BACKEND', 'crontab')
+CRON_SPOOL_DIR: Final[str] = os.getenv('PYCRON_SPOOL_DIR', '/var/spool/cron/crontabs')
+CRON_SPOOL_FSYNC: Final[bool] = os.getenv('PYCRON_SPOOL_FSYNC', '1') != '0'
+
+# Seconds a crontab related command may run before being killed
+CMD_TIMEOUT: Final[float] = float(os.getenv('PYCRON_CMD_TIMEOUT', '30'))
+
+# Profiles every cli call, writing the JSON timings to this file, or to stderr with '-'
+PROFILE: Final[Optional[str]] = os.getenv('PYCRON_PROFILE') or None
+# Dumps the cProfile stats of the profiled calls to this file
+PROFILE_DUMP: Final[Optional[str]] = os.getenv('PYCRON_PROFILE_DUMP') or None
+
+# The crontabs replaced by the pycron commits are kept on this directory, one subdirectory per user,
+# up to PYCRON_SNAPSHOT_KEEP of them per user. 0 keeps no snapshot
+SNAPSHOT_DIR: Final[str] = os.getenv('PYCRON_SNAPSHOT_DIR') or os.path.join(os.path.expanduser('~'), '.pycron',
+                                                                           'snapshots')
+SNAPSHOT_KEEP: Final[int] = int(os.getenv('PYCRON_SNAPSHOT_KEEP', '100'))
+
+# The parsed crontabs are cached on this directory, so the commands which only read the crontab skip
+# listing and parsing it while it does not change. PYCRON_TABLE_CACHE=0 turns the cache off
+TABLE_CACHE: Final[bool] = os.getenv('PYCRON_TABLE_CACHE', '1') != '0'
+TABLE_CACHE_DIR: Final[str] = os.getenv('PYCRON_TABLE_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.pycron',
+                                                                                 'tables')
+
+# What the interpreters answered when validating the pycron entries ('--audit', '--apply') is memoized on
+# this file, until the interpreter, module path or module changes
+VALIDATION_CACHE: Final[str] = os.getenv('PYCRON_VALIDATION_CACHE') or os.path.join(os.path.expanduser('~'),
+                                                                                   '.pycron', 'validation')
@@ -1,25 +1,105 @@
-class MinOutOfRangeException(Exception):
+class NoCronEntryFound(Exception):
     """
     Exception to crontab minutes range
     """
 
     def __str__(self) -> str:
-        return "The minutes field must be encompassed from 0 up to 59"
+        return "The specified cron entry was not found"
 
 
-class NoCronEntryFound(Exception):
+class NoPyModuleFound(Exception):
     """
-    Exception to crontab minutes range
+    Exception when Python module is not found
     """
 
     def __str__(self) -> str:
-        return "The specified cron entry was not found"
+        return "When --module switch specified, the python module path and python module name should be determined"
 
 
-class NoPyModuleFound(Exception):
+class InvalidManifest(Exception):
     """
-    Exception when Python module is not found
+    Exception when the batch manifest file cannot be understood
     """
 
+    def __init__(self, reason: str = ""):
+        super().__init__(reason)
+        self.reason = reason
+
     def __str__(self) -> str:
-        return "When --module switch specified, the python module path and python module name should be determined"
+        return f"Invalid manifest file: {self.reason}"
+
+
+class InvalidCronBackend(Exception):
+    """
+    Exception when the configured crontab storage backend does not exist
+    """
+
+    def __init__(self, backend: str = ""):
+        super().__init__(backend)
+        self.backend = backend
+
+    def __str__(self) -> str:
+        return f"Unknown crontab backend '{self.backend}'. Use 'crontab' or 'spool'"
+
+
+class BashCmdFailed(Exception):
+    """
+    Exception when a command run through bash exits with an error or does not finish in time
+    """
+
+    def __init__(self, commands, return_code=None, stderr: str = "", elapsed: float = 0.0, timed_out: bool = False):
+        super().__init__(commands, return_code)
+        self.commands = list(commands)
+        self.return_code = return_code
+        self.stderr = stderr
+        self.elapsed = elapsed
+        self.timed_out = timed_out
+
+    def __str__(self) -> str:
+        command = " ".join(self.commands)
+        if self.timed_out:
+            return f"'{command}' did not finish after {self.elapsed:.1f}s"
+        details = f": {self.stderr.strip()}" if self.stderr.strip() else ""
+        return f"'{command}' failed with exit code {self.return_code}{details}"
+
+
+class InvalidCronSchedule(Exception):
+    """
+    Exception when a cron schedule expression cannot be understood
+    """
+
+    def __init__(self, expression: str = "", reason: str = ""):
+        super().__init__(expression, reason)
+        self.expression = expression
+        self.reason = reason
+
+    def __str__(self) -> str:
+        return f"Invalid cron schedule '{self.expression}': {self.reason}"
+
+
+class CrontabConflict(Exception):
+    """
+    Exception when the crontab keeps being changed by some other process between reading and committing it
+    """
+
+    def __init__(self, user: str = "", attempts: int = 0):
+        super().__init__(user, attempts)
+        self.user = user
+        self.attempts = attempts
+
+    def __str__(self) -> str:
+        return (f"The {self.user} user crontab changed while being updated, {self.attempts} times in a row. "
+                f"Nothing was written, run the command again")
+
+
+class DaemonError(Exception):
+    """
+    Exception when the pycron daemon fails a request, or goes away in the middle of it
+    """
+
+    def __init__(self, message: str = ""):
+        super().__init__(message)
+        self.message = message
+
+    def __str__(self) -> str:
+        return f"The pycron daemon failed the request: {self.message}"
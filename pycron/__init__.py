@@ -0,0 +1,8 @@
+"""
+The pycron cli and daemons, along with the scripts the crontab entries call by their path on every fire:
+the 'run' wrapper, the warm 'trigger' and the sub-minute 'dispatch'. Those scripts and the python_crontab
+modules they import (run_record, run_guard, run_class, pool_protocol and dispatch_table) run under the
+job interpreter, which may be as old as python 3.8, and must stay cheap to start. So they only import
+builtin modules, not even 'typing', which alone would double the wrapper start time, and they start with
+'from __future__ import annotations' to write their annotations with the builtin generics
+"""
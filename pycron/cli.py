@@ -1,10 +1,18 @@
 # Command line for crontab entries
 import argparse
+import time
+from typing import List, Optional
 
-from python_crontab.cron_argparser import MainMediatorFuncs, UpdateMediatorFuncs
+from environment import CRON_BACKEND, CRON_SPOOL_DIR, PROFILE, PROFILE_DUMP
+from python_crontab.run_guard import OVERLAP_MODES
+from python_crontab.run_record import default_run_log
+from python_crontab.cron_argparser import parse_users, parse_window, selected_command, validate_args
 from python_crontab.pycron_enum import SubPyCron, PyCron
 
-args_tuple = ("[int, str]", "[int, str, str]")
+args_tuple = ("[int|schedule, str]", "[int|schedule, str, str]")
+schedule_help = """The interval may also be a quoted cron schedule such as '0 9 * * mon-fri' or '@hourly', 
+or a sub-minute interval dividing the minute such as '10s', launched by a single per minute dispatcher entry 
+($PYCRON_DISPATCH_DIR or ~/.pycron/dispatch holds the jobs)."""
 
 parser = argparse.ArgumentParser(
     prog="pycron.cli",
@@ -16,38 +24,33 @@ parser = argparse.ArgumentParser(
 group = parser.add_mutually_exclusive_group()
 
 parser.add_argument(PyCron.PY.build_args(),
-                    action=MainMediatorFuncs,
                     type=str,
-                    required=True,
-                    help="path to python interpreter")
+                    help="""path to python interpreter, required by the commands which change entries. 
+                    '--list' lists the entries running with it""")
 
 parser.add_argument(PyCron.MODULE.build_args(),
                     action="store_true",
                     help="Changes the CRUD switches to accept python module")
 
 group.add_argument(PyCron.INIT.build_args(),
-                   action=MainMediatorFuncs,
                    nargs="*",
                    metavar=args_tuple,
                    help=f""" Initialize the cron script with an entry to crontab file with 
-                    specified interval in minutes and path to python script [module].""")
+                    specified interval in minutes and path to python script [module]. {schedule_help}""")
 
 group.add_argument(PyCron.INSERT.build_args(),
-                   action=MainMediatorFuncs,
                    nargs="*",
                    metavar=args_tuple,
                    help=f""" Inserts a new entry at crontab file with  
-                    specified interval in minutes and path to python script [module].""")
+                    specified interval in minutes and path to python script [module]. {schedule_help}""")
 
 group.add_argument(PyCron.DELETE.build_args(),
-                   action=MainMediatorFuncs,
                    nargs="*",
                    metavar=args_tuple,
                    help=f""" Removes an entry from crontab file with 
-                    specified interval in minutes and path to python script [module].""")
+                    specified interval in minutes and path to python script [module]. {schedule_help}""")
 
 group.add_argument(PyCron.UPDATE.build_args(),
-                   action=UpdateMediatorFuncs,
                    nargs="*",
                    metavar=(f"[\"{SubPyCron.OLD.build_args()} int str {SubPyCron.NEW.build_args()} int str\"]",
                             f"[\"{SubPyCron.OLD.build_args()} int str str {SubPyCron.NEW.build_args()} int str str\"]"),
@@ -55,6 +58,236 @@ group.add_argument(PyCron.UPDATE.build_args(),
                    The arguments must be in the following pattern: 
                    \"--old number path/to/python/(script[module]) [python module name]\"
                    \"--new number path/to/python/(script[module]) [python module name]\". 
-                   The double quotation around the arguments is required""")
+                   The double quotation around the arguments is required. 
+                   A cron schedule is given quoted inside them: \"--old '0 9 * * *' path/to/script\".""")
 
-parser.parse_args()
+group.add_argument(PyCron.APPLY.build_args(),
+                   type=str,
+                   metavar="manifest.(json|toml)",
+                   help="""Applies every insert, delete and update operation listed in a JSON or TOML 
+                   manifest reading and writing the crontab file only once""")
+
+group.add_argument(PyCron.SIMULATE.build_args(),
+                   type=int,
+                   metavar="HOURS",
+                   help="""Expands every crontab entry into its fire times over the next HOURS hours and 
+                   reports how many jobs start on each minute, the peak and which jobs collide""")
+
+group.add_argument(PyCron.REBALANCE.build_args(),
+                   action="store_const",
+                   const=True,
+                   help="""Moves the minute offset of every pycron '*/N' entry so the peak of jobs 
+                   starting on the same minute is as low as possible""")
+
+group.add_argument(PyCron.STATUS.build_args(),
+                   action="store_const",
+                   const=True,
+                   help="""Reports how the entries built with '--record' or '--overlap' ran: runs, failures, 
+                   fires skipped or queued by the overlap guard and the last run""")
+
+group.add_argument(PyCron.STATS.build_args(),
+                   nargs="?",
+                   type=parse_window,
+                   const=parse_window("24h"),
+                   metavar="WINDOW",
+                   help="""Reports, per job built with '--record' or '--overlap', the runs, failure rate, 
+                   p50/p95/p99 and max duration and max rss over the last WINDOW (30m, 24h, 7d, 2w or all, 
+                   24h by default)""")
+
+group.add_argument(PyCron.HISTORY.build_args(),
+                   action="store_const",
+                   const=True,
+                   help="""Lists the snapshots of the crontabs replaced by the pycron commits, most recent first 
+                   ($PYCRON_SNAPSHOT_DIR, ~/.pycron/snapshots by default, keeping $PYCRON_SNAPSHOT_KEEP or 100)""")
+
+group.add_argument(PyCron.DIFF.build_args(),
+                   type=int,
+                   metavar="N",
+                   help="Shows what changed on the crontab since the snapshot N of '--history'")
+
+group.add_argument(PyCron.ROLLBACK.build_args(),
+                   type=int,
+                   metavar="N",
+                   help="""Restores the snapshot N of '--history' in a single write. The replaced crontab is 
+                   snapshot too, so the rollback can be rolled back""")
+
+group.add_argument(PyCron.LIST.build_args(),
+                   action="store_const",
+                   const=True,
+                   help="""Lists the entries built by pycron, telling the script entries from the module ones, 
+                   with their interpreter, path and wrapper. Filtered by '--py', '--path', '--schedule' and 
+                   '--match', the entries have to match every filter given""")
+
+group.add_argument(PyCron.AUDIT.build_args(),
+                   action="store_const",
+                   const=True,
+                   help="""Reports the entries built by pycron which cron would fail to run: a missing or not 
+                   executable interpreter, a missing script or module path, or a module the interpreter can not 
+                   import from its path. Filtered as '--list'. The interpreter answers are memoized until the 
+                   interpreter or the module changes ($PYCRON_VALIDATION_CACHE or ~/.pycron/validation)""")
+
+group.add_argument(PyCron.DISPATCH.build_args(),
+                   nargs="?",
+                   type=parse_window,
+                   const=parse_window("24h"),
+                   metavar="WINDOW",
+                   help="""Reports, per sub-minute job, how many times the dispatcher launched it over the last 
+                   WINDOW (30m, 24h, 7d, 2w or all, 24h by default) and the mean and max drift of the launches 
+                   from their offset on the minute""")
+
+group.add_argument(PyCron.CLASSES.build_args(),
+                   nargs="?",
+                   type=parse_window,
+                   const=parse_window("24h"),
+                   metavar="WINDOW",
+                   help="""Reports, per resource class, the jobs holding a slot now and, over the last WINDOW 
+                   (30m, 24h, 7d, 2w or all, 24h by default), the launches, how many found no free slot and 
+                   the mean, p95 and max wait for a slot. The waits are read from the wait log along with the 
+                   '--run-log'""")
+
+parser.add_argument(PyCron.PATH.build_args(),
+                    metavar="PATH",
+                    help="Lists the entries running the script or module path PATH, or anything under PATH")
+
+parser.add_argument(PyCron.SCHEDULE.build_args(),
+                    metavar="int|schedule",
+                    help="Lists the entries with this interval in minutes or cron schedule, as given to '--insert'")
+
+parser.add_argument(PyCron.MATCH.build_args(),
+                    metavar="REGEX",
+                    help="Lists the entries whose crontab line matches the regular expression REGEX")
+
+parser.add_argument(PyCron.FORMAT.build_args(),
+                    choices=("table", "json", "csv", "prometheus"),
+                    default="table",
+                    help="""The '--stats' and '--classes' output: a table, JSON or the Prometheus textfile collector 
+                    format. '--list' takes a table, JSON or CSV, '--audit', '--dispatch', '--history' and the 
+                    '--users' report a table or JSON""")
+
+parser.add_argument(PyCron.OUTPUT.build_args(),
+                    metavar="FILE",
+                    help="""Writes the '--stats', '--classes' or '--dispatch' output atomically to FILE instead of 
+                    printing it, as the textfile collector expects (e.g. /var/lib/node_exporter/pycron.prom)""")
+
+parser.add_argument(PyCron.SPREAD.build_args(),
+                    action="store_true",
+                    help="""Gives the '*/N' entries inserted by '--insert' and '--apply' the minute offset 
+                    ('3-59/10') which keeps the jobs starting on the same minute fewest""")
+
+parser.add_argument(PyCron.RECORD.build_args(),
+                    action="store_true",
+                    help="""Runs the entries built by the commands through the 'pycron.run' wrapper, which 
+                    appends the start, duration, exit code, cpu time and max rss of every run to the run log 
+                    ($PYCRON_RUN_LOG or ~/.pycron/runs.log)""")
+
+parser.add_argument(PyCron.OVERLAP.build_args(),
+                    choices=OVERLAP_MODES,
+                    help="""Guards the entries built by the commands with a lock per job, so a fire of a job 
+                    still running is skipped, or queued behind it with at most one fire waiting. 
+                    The guarded entries run through the 'pycron.run' wrapper and are recorded""")
+
+parser.add_argument(PyCron.CLASS.build_args(),
+                    dest="resource_class",
+                    metavar="NAME",
+                    help="""Runs the jobs of the entries built by the commands in the resource class NAME, which 
+                    caps how many of its jobs run at once on the host, the others waiting in line for a slot, 
+                    and may set their nice, ionice and cpus. The classes are defined on $PYCRON_CLASSES or 
+                    ~/.pycron/classes, a class per line: 'heavy max=2 nice=10 ionice=idle cpus=0-3'. 
+                    The classed entries run through the 'pycron.run' wrapper and are recorded""")
+
+parser.add_argument(PyCron.WARM.build_args(),
+                    action="store_true",
+                    help="""Hands the jobs of the entries built by the commands over to the warm worker pool 
+                    ('python -m pycron.pool'), so they skip the interpreter startup and the preloaded imports. 
+                    The jobs run cold when the pool is not running. Can not be combined with '--record', 
+                    '--overlap' or '--class'""")
+
+parser.add_argument(PyCron.RUN_LOG.build_args(),
+                    default=default_run_log(),
+                    help="""The run log read by '--status' and '--stats' ($PYCRON_RUN_LOG or ~/.pycron/runs.log). 
+                    '--classes' reads the waits from the '.waits' file along with it""")
+
+users_group = parser.add_mutually_exclusive_group()
+
+users_group.add_argument(PyCron.USERS.build_args(),
+                         type=parse_users,
+                         metavar="USER,...",
+                         help="""Runs the command on the crontab of each of the given users, in parallel. Other 
+                         users than the invoking one require privileges, for 'crontab -u' or the spool files""")
+
+users_group.add_argument(PyCron.ALL_USERS.build_args(),
+                         action="store_true",
+                         help="Runs the command on the crontab of every user with a file on the cron spool directory")
+
+parser.add_argument(PyCron.MAX_PARALLEL.build_args(),
+                    type=int,
+                    default=8,
+                    metavar="N",
+                    help="""How many crontabs '--users' and '--all-users' change at once, and how many paths and 
+                    interpreters '--audit' and '--apply' check at once (8 by default)""")
+
+parser.add_argument(PyCron.NO_VALIDATE.build_args(),
+                    action="store_true",
+                    help="""Applies a manifest without checking the entries it inserts and updates can run. 
+                    Otherwise '--apply' writes nothing when some entry would fail, as '--audit' reports them""")
+
+parser.add_argument(PyCron.BACKEND.build_args(),
+                    choices=("crontab", "spool"),
+                    default=CRON_BACKEND,
+                    help="""Where the crontab is read from and written to: through the crontab command
+                    or straight from the cron spool file (defaults to $PYCRON_BACKEND or 'crontab')""")
+
+parser.add_argument(PyCron.SPOOL_DIR.build_args(),
+                    default=CRON_SPOOL_DIR,
+                    help="The cron spool directory used by the 'spool' backend")
+
+parser.add_argument(PyCron.NO_DAEMON.build_args(),
+                    action="store_true",
+                    help="""Changes the crontab directly even when the management daemon ('python -m pycron.daemon') 
+                    is running. Otherwise '--init', '--insert', '--delete' and '--update' go through the daemon""")
+
+parser.add_argument(PyCron.PROFILE.build_args(),
+                    nargs="?",
+                    const="-",
+                    default=PROFILE,
+                    metavar="FILE",
+                    help="""Times each phase of the call (argument parsing, imports, package check, crontab read, 
+                    parse, render and write) and each command run, and writes them as JSON to FILE, or to 
+                    stderr without FILE (defaults to $PYCRON_PROFILE)""")
+
+parser.add_argument(PyCron.PROFILE_DUMP.build_args(),
+                    default=PROFILE_DUMP,
+                    metavar="FILE",
+                    help="""Also runs the profiled call under cProfile and dumps its stats to FILE, to be read 
+                    with 'python -m pstats' (defaults to $PYCRON_PROFILE_DUMP)""")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    started = time.perf_counter()
+    namespace = parser.parse_args(argv)
+    validate_args(parser, namespace)
+    if selected_command(namespace) is None:
+        return
+
+    if namespace.profile is None:
+        # The cron managers are only imported when there is some command to run
+        from python_crontab.commands import build_command
+        build_command(namespace).execute()
+        return
+
+    from python_crontab.profiling import profiling
+    with profiling(namespace.profile, namespace.profile_dump, started) as profile:
+        profile.add_phase("parse_args", started, time.perf_counter())
+        with profile.phase("import"):
+            from python_crontab.commands import build_command
+        from utilities.bash_run import executor
+        executor.on_command = profile.add_command
+        try:
+            with profile.phase("command"):
+                build_command(namespace).execute()
+        finally:
+            executor.on_command = None
+
+
+if __name__ == "__main__":
+    main()
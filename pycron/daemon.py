@@ -0,0 +1,296 @@
+# Management daemon keeping the parsed crontabs in memory for the cli:
+#   python -m pycron.daemon [--socket path] [--backend crontab|spool] [--spool-dir dir]
+#                           [--commit-interval seconds] [--reload-interval seconds]
+# While it runs, the cli '--init', '--insert', '--delete' and '--update' changes go through it
+import argparse
+import asyncio
+import os
+import random
+import signal
+import sys
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from environment import CRON_BACKEND, CRON_SPOOL_DIR
+from exceptions import CrontabConflict
+from python_crontab.build_py_cron import BuildPyCronScript
+from python_crontab.cron_table import CronTable
+from python_crontab.daemon_protocol import OP_DELETE, OP_INSERT, OP_LIST, OP_OPEN, OP_UPDATE, PROTOCOL_VERSION, \
+    DaemonConnection, Message, decode, default_daemon_socket, encode
+from python_crontab.interfaces.icron_backend import ICronBackend
+from python_crontab.table_cache import Signature
+from utilities import crontab_digest, lines_digest
+from utilities.cron_backend import SpoolFileBackend, make_cron_backend
+from utilities.cron_script_manager import COMMIT_ATTEMPTS, COMMIT_BACKOFF
+
+
+async def _in_thread(function: Callable[..., Any], *args: Any) -> Any:
+    """As asyncio.to_thread, which python 3.8 lacks: runs the blocking call on the default executor"""
+    return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+
+class _Change:
+    __slots__ = ("op", "args", "changed", "attempts", "committed")
+
+    def __init__(self, op: str, args: Tuple[str, ...], committed: "asyncio.Future[bool]"):
+        self.op = op
+        self.args = args
+        # If the change did something on the crontab held in memory
+        self.changed = False
+        self.attempts = 0
+        # Set to if the commit of the change wrote the crontab
+        self.committed = committed
+
+
+class HeldCrontab:
+    def __init__(self, backend: ICronBackend):
+        """
+        A user crontab held parsed in memory, with the changes applied since its last commit
+        @param backend: the storage the crontab is read from and committed to
+        """
+        self.backend = backend
+        self.table = CronTable()
+        self.digest: Optional[str] = None
+        self.exists = False
+        self.loaded = False
+        self.signature: Optional[Signature] = None
+        # Applied to the table in memory, not committed yet
+        self.pending: List[_Change] = []
+        self.commit_task: Optional[asyncio.Task] = None
+        # Held while the crontab is read or committed
+        self.lock = asyncio.Lock()
+
+    def apply(self, change: _Change) -> None:
+        if change.op == OP_INSERT:
+            change.changed = self.table.add(*change.args)
+        elif change.op == OP_DELETE:
+            change.changed = self.table.remove(*change.args)
+        else:
+            change.changed = self.table.replace(*change.args)
+
+
+class ManagementDaemon:
+    def __init__(self, socket_path: str, backend: str, spool_dir: str, commit_interval: float, reload_interval: float):
+        """
+        Serves the crontab changes of the cli over a Unix socket, on an asyncio loop. Each crontab is read and
+        parsed once, and every change runs over the table in memory. The changes are committed in groups,
+        each one answered once committed: the changes arriving within 'commit_interval', or while the
+        previous commit writes the crontab, go on a single write. The commits check the crontab did not change
+        since it was read, as the cli does, and a crontab changed by someone else is read again, with the
+        pending changes applied again over it
+        @param socket_path: the Unix socket the cli connects to
+        @param backend: the backend name, 'crontab' or 'spool'
+        @param spool_dir: the cron spool directory used by the 'spool' backend
+        @param commit_interval: how long, in seconds, a change waits for others to be committed with. Even
+        without waiting, the changes arriving during a commit are grouped on the next one
+        @param reload_interval: how often, in seconds, the crontabs are checked for changes made by someone
+        else. The crontabs with a signature, as the spool files, are also checked on every request
+        """
+        self.socket_path = socket_path
+        self.backend = backend
+        self.spool_dir = spool_dir
+        self.commit_interval = commit_interval
+        self.reload_interval = reload_interval
+        self.crontabs: Dict[str, HeldCrontab] = {}
+
+    def _log(self, message: str) -> None:
+        print(f"pycron.daemon: {message}", file=sys.stderr, flush=True)
+
+    async def _reload(self, held: HeldCrontab, force: bool = False) -> None:
+        """
+        Reads the crontab again, parsing it only when it changed, and applies the pending changes over it.
+        Run under the crontab lock
+        @param force: parses the crontab even when it did not change, dropping the table in memory
+        """
+        signature = held.backend.signature()
+        crontab = await _in_thread(held.backend.read)
+        digest = crontab_digest(crontab)
+        held.signature = signature
+        if held.loaded and digest == held.digest and not force:
+            return
+        table = await _in_thread(CronTable.parse, crontab or "")
+        if held.loaded:
+            self._log(f"reloaded the {held.backend.user} crontab, {len(held.pending)} pending changes applied again")
+        held.table, held.digest, held.exists, held.loaded = table, digest, crontab is not None, True
+        for change in held.pending:
+            held.apply(change)
+
+    async def _refresh(self, held: HeldCrontab) -> None:
+        """
+        Reads the crontab again unless its signature tells it did not change
+        """
+        async with held.lock:
+            if held.loaded and held.signature is not None and held.signature == held.backend.signature():
+                return
+            await self._reload(held)
+
+    async def _held(self, user: str) -> HeldCrontab:
+        held = self.crontabs.get(user)
+        if held is None:
+            held = self.crontabs[user] = HeldCrontab(make_cron_backend(self.backend, user, self.spool_dir))
+        # A crontab without a signature can not tell a change without being listed, left to the periodic reload
+        if not held.loaded or held.backend.signature() is not None:
+            await self._refresh(held)
+        return held
+
+    async def _commit(self, held: HeldCrontab) -> None:
+        await asyncio.sleep(self.commit_interval)
+        async with held.lock:
+            held.commit_task = None
+            committing = list(held.pending)
+            try:
+                if not held.loaded:
+                    await self._reload(held)
+                for attempt in range(COMMIT_ATTEMPTS):
+                    # The changes arriving while the crontab is written are left to the next commit
+                    committing = list(held.pending)
+                    for change in committing:
+                        change.attempts = attempt + 1
+                    # Digested from the lines, the rendered crontab loses its last empty line to 'crontab_digest'
+                    digest = lines_digest(line.raw for line in held.table.lines())
+                    if digest == held.digest:
+                        written = False
+                        break
+                    crontab = held.table.render()
+                    if await _in_thread(held.backend.write_if_unchanged, crontab, held.digest):
+                        held.digest, held.exists, written = digest, True, True
+                        # Read once more by the next refresh, a stat can not tell the write from a later one
+                        held.signature = None
+                        break
+                    await asyncio.sleep(COMMIT_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+                    await self._reload(held)
+                else:
+                    raise CrontabConflict(held.backend.user, COMMIT_ATTEMPTS)
+            except Exception as e:
+                self._log(f"{len(committing)} changes to the {held.backend.user} crontab failed: {e}")
+                for change in committing:
+                    change.committed.set_exception(e)
+                # Nothing of the failed changes is kept, the table goes back to the crontab as stored
+                del held.pending[:len(committing)]
+                try:
+                    await self._reload(held, force=True)
+                except Exception:
+                    held.loaded = False
+                return
+            del held.pending[:len(committing)]
+            if written:
+                self._log(f"committed {len(committing)} changes to the {held.backend.user} crontab")
+            for change in committing:
+                change.committed.set_result(written)
+
+    async def _change(self, held: HeldCrontab, op: str, args: Tuple[str, ...]) -> Message:
+        change = _Change(op, args, asyncio.get_running_loop().create_future())
+        held.apply(change)
+        if not change.changed:
+            return {"ok": True, "changed": False, "written": False, "attempts": 0}
+        held.pending.append(change)
+        if held.commit_task is None:
+            held.commit_task = asyncio.create_task(self._commit(held))
+        written = await change.committed
+        # A crontab changed by someone else may have changed what the change did
+        return {"ok": True, "changed": change.changed, "written": written, "attempts": change.attempts}
+
+    async def _dispatch(self, request: Message) -> Message:
+        op = request.get("op")
+        if op == OP_OPEN:
+            if request.get("version") != PROTOCOL_VERSION:
+                return {"ok": False, "declined": "protocol version"}
+            if request.get("backend") != self.backend or (
+                    self.backend == SpoolFileBackend.name and request.get("spool_dir") != self.spool_dir):
+                return {"ok": False, "declined": "the daemon serves another backend"}
+        held = await self._held(str(request["user"]))
+        if op == OP_OPEN:
+            return {"ok": True, "exists": held.exists or bool(held.pending)}
+        if op == OP_LIST:
+            managed = bool(request.get("managed"))
+            return {"ok": True, "entries": [entry.raw for entry in held.table
+                                            if not managed or BuildPyCronScript.is_managed(entry.command)]}
+        if op in (OP_INSERT, OP_DELETE):
+            return await self._change(held, op, (str(request["entry"]),))
+        if op == OP_UPDATE:
+            return await self._change(held, op, (str(request["old"]), str(request["new"])))
+        return {"ok": False, "error": f"unknown request '{op}'"}
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    reply = await self._dispatch(decode(line))
+                except (KeyError, ValueError) as e:
+                    reply = {"ok": False, "error": f"bad request: {e}"}
+                except Exception as e:
+                    reply = {"ok": False, "error": str(e)}
+                writer.write(encode(reply))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _reload_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            for held in list(self.crontabs.values()):
+                try:
+                    await self._refresh(held)
+                except Exception as e:
+                    self._log(f"could not read the {held.backend.user} crontab: {e}")
+
+    def _check_not_running(self) -> None:
+        connection = DaemonConnection.connect(self.socket_path)
+        if connection is not None:
+            connection.close()
+            raise SystemExit(f"pycron.daemon: a daemon is already listening on {self.socket_path}")
+        if os.path.exists(self.socket_path):
+            # Left behind by a daemon which died
+            os.unlink(self.socket_path)
+
+    async def serve(self) -> None:
+        """
+        Serves the cli until terminated, then commits the pending changes
+        """
+        self._check_not_running()
+        os.makedirs(os.path.dirname(self.socket_path) or ".", exist_ok=True)
+        server = await asyncio.start_unix_server(self._serve_client, path=self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for handled in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(handled, stopping.set)
+        reload_task = asyncio.create_task(self._reload_loop())
+        self._log(f"serving the '{self.backend}' crontabs on {self.socket_path}")
+        try:
+            await stopping.wait()
+        finally:
+            server.close()
+            reload_task.cancel()
+            commits = [held.commit_task for held in self.crontabs.values() if held.commit_task is not None]
+            await asyncio.gather(*commits, return_exceptions=True)
+            os.unlink(self.socket_path)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="pycron.daemon",
+                                     description="Keeps the crontabs parsed in memory and serves the cli changes")
+    parser.add_argument("--socket", default=default_daemon_socket(),
+                        help="the Unix socket path ($PYCRON_DAEMON_SOCKET or ~/.pycron/daemon.sock)")
+    parser.add_argument("--backend", choices=("crontab", "spool"), default=CRON_BACKEND,
+                        help="where the crontabs are read from and written to (defaults to $PYCRON_BACKEND or 'crontab')")
+    parser.add_argument("--spool-dir", default=CRON_SPOOL_DIR, help="the cron spool directory used by the 'spool' backend")
+    parser.add_argument("--commit-interval", type=float, default=0.0,
+                        help="""seconds a change waits to be committed along with the ones arriving meanwhile. The 
+                        changes arriving during a commit are always committed together on the next one (0)""")
+    parser.add_argument("--reload-interval", type=float, default=5.0,
+                        help="how often, in seconds, the crontabs are checked for changes made by someone else (5)")
+    namespace = parser.parse_args(argv)
+    if namespace.commit_interval < 0 or namespace.reload_interval <= 0:
+        parser.error("--commit-interval must not be negative and --reload-interval must be positive")
+    daemon = ManagementDaemon(namespace.socket, namespace.backend, namespace.spool_dir, namespace.commit_interval,
+                              namespace.reload_interval)
+    asyncio.run(daemon.serve())
+
+
+if __name__ == "__main__":
+    main()
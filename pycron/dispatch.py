@@ -0,0 +1,101 @@
+# Launches the sub-minute jobs at their offsets within the current minute, then exits:
+#   python -m pycron.dispatch --jobs path [--drift-log path]
+# A single '* * * * *' crontab entry runs it by its path every minute, so it must stay cheap to start:
+# besides the jobs file reader and the drift writer, it only imports builtin modules (not even 'typing')
+from __future__ import annotations
+
+import heapq
+import os
+import sys
+import time
+
+if not __package__:
+    # Run by its path from the crontab entry: the packages live on the repository root
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from python_crontab.dispatch_table import append_drift, dispatch_job_id, drift_log_path, read_jobs
+
+USAGE = "usage: python -m pycron.dispatch --jobs path [--drift-log path]"
+
+# The launches further behind than this, as when the dispatcher starts late on the minute, are skipped
+# instead of being launched all at once
+LATE_LIMIT = 1.0
+
+_OPTIONS = ("--jobs", "--drift-log")
+
+
+def _parse_args(args: list[str]) -> dict[str, str]:
+    options = {}
+    while len(args) > 1 and args[0] in _OPTIONS:
+        options[args[0]] = args[1]
+        args = args[2:]
+    if args or "--jobs" not in options:
+        raise SystemExit(USAGE)
+    return options
+
+
+def _reap() -> None:
+    """Collects the launched jobs which finished, so they do not linger as zombies until the minute ends"""
+    try:
+        while os.waitpid(-1, os.WNOHANG)[0] > 0:
+            pass
+    except ChildProcessError:
+        pass
+
+
+def _launch(command: str) -> None:
+    # As cron runs the entries: through the shell, on a session of its own
+    os.posix_spawn("/bin/sh", ["/bin/sh", "-c", command], os.environ, setsid=True)
+
+
+def dispatch(jobs: list[tuple[int, str]]) -> list[tuple]:
+    """
+    Launches every job at each of its offsets left on the minute, sleeping on the monotonic clock, which
+    wall clock steps do not move
+    :param jobs: the interval in seconds and the command of every job
+    :return: the drift records of the jobs
+    """
+    started = time.monotonic()
+    wall = time.time()
+    minute = wall - wall % 60
+    elapsed = wall - minute
+    launches = []
+    for position, (seconds, _) in enumerate(jobs):
+        for offset in range(0, 60, seconds):
+            if offset >= elapsed - LATE_LIMIT:
+                launches.append((started + offset - elapsed, position))
+    heapq.heapify(launches)
+
+    drifts: dict[int, list[float]] = {}
+    while launches:
+        target, position = heapq.heappop(launches)
+        delay = target - time.monotonic()
+        if delay > 0:
+            _reap()
+            time.sleep(delay)
+        try:
+            _launch(jobs[position][1])
+        except OSError as e:
+            print(f"pycron.dispatch: could not launch '{jobs[position][1]}': {e}", file=sys.stderr)
+            continue
+        drifts.setdefault(position, []).append(time.monotonic() - target)
+    return [(minute, dispatch_job_id(*jobs[position]), len(drift), sum(drift) / len(drift), max(drift))
+            for position, drift in drifts.items()]
+
+
+def main(argv: list[str] | None = None) -> int:
+    options = _parse_args(sys.argv[1:] if argv is None else argv)
+    jobs = read_jobs(options["--jobs"])
+    if not jobs:
+        return 0
+    records = dispatch(jobs)
+    log_path = options.get("--drift-log") or drift_log_path(options["--jobs"])
+    try:
+        append_drift(log_path, records)
+    except OSError as e:
+        print(f"pycron.dispatch: could not record the drift on {log_path}: {e}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
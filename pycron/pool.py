@@ -0,0 +1,209 @@
+# Warm worker pool for the cron jobs built with '--warm':
+#   python -m pycron.pool [--socket path] [--workers N] [--preload module,...]
+# Start it once per user, e.g. from a '@reboot' crontab entry or a user service
+import argparse
+import array
+import atexit
+import importlib
+import os
+import runpy
+import signal
+import socket
+import sys
+import traceback
+from typing import List, NoReturn, Optional, Tuple
+
+from python_crontab.pool_protocol import DECLINED, JOB_MODULE, LENGTH, STARTED, STATUS, JobRequest, \
+    default_pool_socket, recv_exactly, request_length
+
+# Enough for the request of any sane job in a single receive
+_RECEIVE_SIZE = 64 * 1024
+
+
+def _exit_code(exit_request: SystemExit) -> int:
+    """The exit code 'sys.exit(code)' gives on a cold interpreter"""
+    if exit_request.code is None:
+        return 0
+    if isinstance(exit_request.code, int):
+        return exit_request.code
+    print(exit_request.code, file=sys.stderr)
+    return 1
+
+
+def _recv_fds(connection: socket.socket, size: int, max_fds: int) -> Tuple[bytes, List[int]]:
+    """As socket.recv_fds, which python 3.8 lacks"""
+    fds = array.array("i")
+    message, ancillary, _, _ = connection.recvmsg(size, socket.CMSG_LEN(max_fds * fds.itemsize))
+    for level, kind, data in ancillary:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(data[:len(data) - len(data) % fds.itemsize])
+    return message, list(fds)
+
+
+def _exit_status(status: int) -> int:
+    """As os.waitstatus_to_exitcode, which python 3.8 lacks: negative when killed by a signal"""
+    return -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+
+
+def run_job(request: JobRequest, fds: List[int]) -> NoReturn:
+    """
+    Runs the job on a child forked from a warm worker, as 'python script' or 'python -m module'
+    would: on the trigger stdio, working directory and environment, with the job as '__main__'
+    """
+    exit_code = 0
+    try:
+        for std_fd, fd in enumerate(fds):
+            os.dup2(fd, std_fd)
+            os.close(fd)
+        for handled in (signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+            signal.signal(handled, signal.SIG_DFL)
+        os.chdir(request.cwd)
+        os.environ.clear()
+        os.environ.update(request.env)
+        if request.kind == JOB_MODULE:
+            sys.argv = [request.target] + request.args
+            sys.path[0] = request.cwd
+            runpy.run_module(request.target, run_name="__main__", alter_sys=True)
+        else:
+            sys.argv = [request.target] + request.args
+            sys.path[0] = os.path.dirname(os.path.abspath(request.target))
+            runpy.run_path(request.target, run_name="__main__")
+    except SystemExit as e:
+        exit_code = _exit_code(e)
+    except BaseException:
+        traceback.print_exc()
+        exit_code = 1
+    finally:
+        atexit._run_exitfuncs()
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except (OSError, ValueError):
+                pass
+        os._exit(exit_code)
+
+
+class WorkerPool:
+    def __init__(self, socket_path: str, workers: int, preload: List[str]):
+        """
+        A pre-forked pool of warm workers accepting jobs on a Unix socket. Each worker runs its jobs
+        on a child forked from itself, so every job starts from the warm interpreter, with the
+        preloaded modules already imported, and no job leaves anything behind for the next one
+        @param socket_path: the Unix socket the triggers connect to
+        @param workers: how many jobs run at once, the others wait on the socket backlog
+        @param preload: the modules imported once by the pool instead of by every job
+        """
+        self.socket_path = socket_path
+        self.workers = workers
+        self.preload = preload
+        self.listener: Optional[socket.socket] = None
+        self.worker_pids: List[int] = []
+
+    def _listen(self) -> None:
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except OSError:
+            # Left behind by a pool which died
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+        else:
+            raise SystemExit(f"pycron.pool: a pool is already listening on {self.socket_path}")
+        finally:
+            probe.close()
+        os.makedirs(os.path.dirname(self.socket_path) or ".", exist_ok=True)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        self.listener.listen(128)
+
+    def _handle(self, connection: socket.socket) -> None:
+        status = DECLINED
+        message, fds = _recv_fds(connection, _RECEIVE_SIZE, 3)
+        try:
+            if len(message) >= LENGTH.size and len(fds) == 3:
+                message = recv_exactly(connection, request_length(message), message)
+                request = JobRequest.decode(message[LENGTH.size:])
+                if os.path.realpath(request.interpreter) == os.path.realpath(sys.executable):
+                    sys.stdout.flush()
+                    sys.stderr.flush()
+                    pid = os.fork()
+                    if pid == 0:
+                        connection.close()
+                        self.listener.close()
+                        run_job(request, fds)
+                    try:
+                        connection.sendall(STATUS.pack(STARTED))
+                    finally:
+                        status = _exit_status(os.waitpid(pid, 0)[1])
+        except (ValueError, ConnectionError) as e:
+            print(f"pycron.pool: bad request: {e}", file=sys.stderr)
+        finally:
+            for fd in fds:
+                os.close(fd)
+        connection.sendall(STATUS.pack(status))
+
+    def _work(self) -> NoReturn:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        while True:
+            connection, _ = self.listener.accept()
+            with connection:
+                try:
+                    self._handle(connection)
+                except OSError as e:
+                    print(f"pycron.pool: {e}", file=sys.stderr)
+
+    def _spawn_worker(self) -> None:
+        pid = os.fork()
+        if pid == 0:
+            try:
+                self._work()
+            finally:
+                os._exit(1)
+        self.worker_pids.append(pid)
+
+    def serve(self) -> None:
+        """
+        Preloads the modules, forks the workers and replaces the ones which die until terminated
+        """
+        for module in self.preload:
+            importlib.import_module(module)
+        self._listen()
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        try:
+            for _ in range(self.workers):
+                self._spawn_worker()
+            print(f"pycron.pool: {self.workers} workers listening on {self.socket_path}", file=sys.stderr)
+            while True:
+                pid, _ = os.wait()
+                if pid in self.worker_pids:
+                    self.worker_pids.remove(pid)
+                    self._spawn_worker()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for pid in self.worker_pids:
+                os.kill(pid, signal.SIGTERM)
+            for pid in self.worker_pids:
+                os.waitpid(pid, 0)
+            self.listener.close()
+            os.unlink(self.socket_path)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="pycron.pool",
+                                     description="Runs the cron jobs built with '--warm' on pre-forked warm workers")
+    parser.add_argument("--socket", default=default_pool_socket(),
+                        help="the Unix socket path ($PYCRON_POOL_SOCKET or ~/.pycron/pool.sock)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="how many jobs run at once")
+    parser.add_argument("--preload", default="",
+                        help="comma separated modules imported once by the pool, typically the heavy imports of the jobs")
+    namespace = parser.parse_args(argv)
+    if namespace.workers < 1:
+        parser.error("--workers must be at least 1")
+    WorkerPool(namespace.socket, namespace.workers, [module for module in namespace.preload.split(",") if module]).serve()
+
+
+if __name__ == "__main__":
+    main()
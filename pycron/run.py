@@ -0,0 +1,158 @@
+# Wraps a cron job, recording how it ran on the run log:
+#   python -m pycron.run [--log path] [--cwd path] [--overlap skip|queue] [--class name] -- command [args...]
+# The recorded crontab entries call this file by its path, so it must stay cheap to start: besides the
+# run record writer, the overlap guard and the resource classes, it only imports builtin modules (not even 'typing')
+from __future__ import annotations
+
+import os
+import sys
+import time
+
+if not __package__:
+    # Run by its path from the crontab entries: the packages live on the repository root
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from python_crontab.run_class import ClassSlot, ResourceClass, append_wait, class_id, read_classes, wait_log_path
+from python_crontab.run_guard import OVERLAP_MODES, JobGuard
+from python_crontab.run_record import FLAG_QUEUED, FLAG_SKIPPED, append_run, default_run_log, job_id
+
+USAGE = ("usage: python -m pycron.run [--log path] [--cwd path] [--overlap skip|queue] [--class name] "
+         "-- command [args...]")
+
+# The exit code of a shell which could not find the command
+COMMAND_NOT_FOUND = 127
+
+_OPTIONS = ("--log", "--cwd", "--overlap", "--class")
+
+
+def _parse_args(args: list[str]) -> tuple[dict[str, str], list[str]]:
+    """
+    Parsed by hand, as importing argparse would cost more than the rest of the wrapper
+    :return: the given options, by name, and the job command
+    """
+    options = {}
+    while len(args) > 1 and args[0] in _OPTIONS:
+        options[args[0]] = args[1]
+        args = args[2:]
+    if not args or args[0] != "--" or len(args) < 2:
+        raise SystemExit(USAGE)
+    if options.get("--overlap", OVERLAP_MODES[0]) not in OVERLAP_MODES:
+        raise SystemExit(USAGE)
+    return options, args[1:]
+
+
+def _record(log_path: str, fields: tuple) -> None:
+    try:
+        append_run(log_path, fields)
+    except OSError as e:
+        # The job already ran, losing its record must not turn it into a failure
+        print(f"pycron.run: could not record the run on {log_path}: {e}", file=sys.stderr)
+
+
+def _resource_class(name: str) -> ResourceClass | None:
+    """
+    :return: the class of the job, None when the classes file lost it, so the job runs unbounded
+    """
+    try:
+        resource_class = read_classes().get(name)
+    except (OSError, ValueError) as e:
+        print(f"pycron.run: could not read the classes file: {e}", file=sys.stderr)
+        return None
+    if resource_class is None:
+        print(f"pycron.run: the class {name} is not defined, the job runs out of any class", file=sys.stderr)
+    return resource_class
+
+
+def _admit(resource_class: ResourceClass, log_path: str, command_id: int) -> ClassSlot | None:
+    """
+    Waits for a slot of the class, recording the wait, then applies the class priority and cpus
+    :return: the held slot, None when the slot directory is not usable, so the job runs unbounded
+    """
+    queued = time.time()
+    try:
+        slot = ClassSlot(resource_class)
+        slot.acquire()
+    except OSError as e:
+        print(f"pycron.run: could not take a slot of the class {resource_class.name}: {e}", file=sys.stderr)
+        return None
+    try:
+        append_wait(wait_log_path(log_path), (queued, slot.waited, command_id, class_id(resource_class.name)))
+    except OSError as e:
+        print(f"pycron.run: could not record the wait on {wait_log_path(log_path)}: {e}", file=sys.stderr)
+    try:
+        resource_class.apply()
+    except OSError as e:
+        print(f"pycron.run: could not apply the class {resource_class.name}: {e}", file=sys.stderr)
+    return slot
+
+
+def run(command: list[str], log_path: str, cwd: str | None = None, overlap: str | None = None,
+        class_name: str | None = None) -> int:
+    """
+    Spawns the job, waits for it collecting its resource usage and appends the run record
+    :param command: the job command line
+    :param log_path: the run log path
+    :param cwd: the working directory of the job
+    :param overlap: what happens when the job is still running from a previous fire, 'skip' or 'queue'.
+    Without it the job always runs
+    :param class_name: the resource class the job waits a slot of, and runs under
+    :return: the job exit code, negative when it was killed by a signal
+    """
+    plain_command = " ".join(command)
+    if cwd is not None:
+        plain_command = f"cd {cwd} && {plain_command}"
+    command_id = job_id(plain_command)
+
+    guard = JobGuard(command_id, overlap) if overlap is not None else None
+    if guard is not None and not guard.acquire():
+        _record(log_path, (time.time(), 0.0, 0.0, 0.0, 0, 0, 0, command_id, FLAG_SKIPPED))
+        return 0
+
+    resource_class = _resource_class(class_name) if class_name is not None else None
+    slot = _admit(resource_class, log_path, command_id) if resource_class is not None else None
+    if resource_class is not None:
+        ionice = resource_class.ionice_command()
+        if ionice is None:
+            print(f"pycron.run: ionice is not installed, the job runs without the io priority of the class "
+                  f"{resource_class.name}", file=sys.stderr)
+        command = (ionice or []) + command
+
+    started = time.time()
+    start = time.perf_counter()
+    pid = 0
+    user_cpu = system_cpu = 0.0
+    max_rss_kib = 0
+    try:
+        if cwd is not None:
+            os.chdir(cwd)
+        pid = os.posix_spawnp(command[0], command, os.environ)
+    except OSError as e:
+        print(f"pycron.run: {command[0]}: {e.strerror}", file=sys.stderr)
+        exit_code = COMMAND_NOT_FOUND
+    else:
+        _, status, usage = os.wait4(pid, 0)
+        # As os.waitstatus_to_exitcode, which python 3.8 lacks
+        exit_code = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+        user_cpu, system_cpu, max_rss_kib = usage.ru_utime, usage.ru_stime, usage.ru_maxrss
+    duration = time.perf_counter() - start
+
+    if slot is not None:
+        slot.release()
+    flags = 0
+    if guard is not None:
+        guard.release()
+        flags = FLAG_QUEUED if guard.waited else 0
+    _record(log_path, (started, duration, user_cpu, system_cpu, max_rss_kib, exit_code, pid, command_id, flags))
+    return exit_code
+
+
+def main(argv: list[str] | None = None) -> int:
+    options, command = _parse_args(sys.argv[1:] if argv is None else argv)
+    exit_code = run(command, options.get("--log") or default_run_log(), options.get("--cwd"),
+                    options.get("--overlap"), options.get("--class"))
+    # Killed jobs exit like they do on the shell
+    return exit_code if exit_code >= 0 else 128 - exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
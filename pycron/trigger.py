@@ -0,0 +1,89 @@
+# Hands a cron job over to the warm 'pycron.pool' daemon, running it cold when the pool is not there:
+#   python -m pycron.trigger [--socket path] [--cwd path] -- interpreter (script | -m module) [args...]
+# The warm crontab entries call this file by its path on every fire, so it must stay cheap to start:
+# besides the pool protocol, it only imports builtin modules (the low level '_socket' included)
+from __future__ import annotations
+
+import os
+import struct
+import sys
+from _socket import AF_UNIX, SCM_RIGHTS, SOCK_STREAM, SOL_SOCKET, socket
+
+if not __package__:
+    # Run by its path from the crontab entries: the packages live on the repository root
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from python_crontab.pool_protocol import (JOB_MODULE, JOB_SCRIPT, STARTED, STATUS, JobRequest, default_pool_socket,
+                                          recv_exactly)
+
+USAGE = "usage: python -m pycron.trigger [--socket path] [--cwd path] -- interpreter (script | -m module) [args...]"
+
+_OPTIONS = ("--socket", "--cwd")
+
+
+def _parse_args(args: list[str]) -> tuple[dict[str, str], list[str]]:
+    options = {}
+    while len(args) > 1 and args[0] in _OPTIONS:
+        options[args[0]] = args[1]
+        args = args[2:]
+    if not args or args[0] != "--" or len(args) < 3:
+        raise SystemExit(USAGE)
+    return options, args[1:]
+
+
+def job_request(command: list[str], cwd: str) -> JobRequest | None:
+    """
+    :return: the request of a 'python script' or 'python -m module' command, or None for the
+    commands which pass options to the interpreter, as the pool could not honour them
+    """
+    if command[1] == "-m" and len(command) > 2:
+        return JobRequest(command[0], JOB_MODULE, command[2], command[3:], cwd, dict(os.environ))
+    if not command[1].startswith("-"):
+        return JobRequest(command[0], JOB_SCRIPT, command[1], command[2:], cwd, dict(os.environ))
+    return None
+
+
+def trigger(request: JobRequest, socket_path: str) -> int | None:
+    """
+    Sends the job to the pool along with the trigger stdin, stdout and stderr, and waits for it
+    :return: the job exit code, or None when the pool is not running or declined the job
+    """
+    client = socket(AF_UNIX, SOCK_STREAM)
+    try:
+        try:
+            client.connect(socket_path)
+            message = request.encode()
+            sent = client.sendmsg([message], [(SOL_SOCKET, SCM_RIGHTS, struct.pack("3i", 0, 1, 2))])
+            if sent < len(message):
+                client.sendall(message[sent:])
+            if STATUS.unpack(recv_exactly(client, STATUS.size))[0] != STARTED:
+                return None
+        except OSError:
+            # The pool did not start the job, it is run cold
+            return None
+        try:
+            return STATUS.unpack(recv_exactly(client, STATUS.size))[0]
+        except OSError as e:
+            # The job may have run already, running it again cold could run it twice
+            print(f"pycron.trigger: lost the pool while the job ran: {e}", file=sys.stderr)
+            return 1
+    finally:
+        client.close()
+
+
+def main(argv: list[str] | None = None) -> int:
+    options, command = _parse_args(sys.argv[1:] if argv is None else argv)
+    cwd = options.get("--cwd")
+    if cwd is not None:
+        os.chdir(cwd)
+    request = job_request(command, os.getcwd())
+    status = trigger(request, options.get("--socket") or default_pool_socket()) if request is not None else None
+    if status is None:
+        # Cold start: the trigger process becomes the job
+        os.execvp(command[0], command)
+    # Killed jobs exit like they do on the shell
+    return status if status >= 0 else 128 - status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
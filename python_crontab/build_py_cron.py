@@ -1,8 +1,40 @@
-from typing import NoReturn
+import os
+from typing import Dict, NamedTuple, NoReturn, Optional
 
 from python_crontab.interfaces.icron_entry import IPyCronEntry
+from python_crontab.run_guard import OVERLAP_MODES
 from utilities import check_source_existence
 
+# Every command built by pycron is wrapped by this prefix and suffix
+PYCRON_COMMAND_PREFIX = "export DISPLAY=':0';"
+PYCRON_COMMAND_SUFFIX = ">/dev/null 2>&1"
+
+# The recorded and warm entries call the run wrapper and the pool trigger by their path, and the
+# sub-minute jobs call their dispatcher the same way, as cron does not start them on the repository root
+_PYCRON_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pycron")
+PYCRON_RUN_SCRIPT = os.path.join(_PYCRON_DIR, "run.py")
+PYCRON_TRIGGER_SCRIPT = os.path.join(_PYCRON_DIR, "trigger.py")
+PYCRON_DISPATCH_SCRIPT = os.path.join(_PYCRON_DIR, "dispatch.py")
+
+
+def is_pycron_script(path: str, script: str) -> bool:
+    """
+    Checks if an entry calls one of the pycron scripts, told by the package and file name, as the
+    entries built from other checkouts call them from elsewhere
+    :param path: the script path on the entry
+    :param script: PYCRON_RUN_SCRIPT, PYCRON_TRIGGER_SCRIPT or PYCRON_DISPATCH_SCRIPT
+    """
+    return path.split(os.sep)[-2:] == script.split(os.sep)[-2:]
+
+
+class WrappedCommand(NamedTuple):
+    # The 'pycron.run' or 'pycron.trigger' script the job runs through, None when it runs straight from cron
+    wrapper: Optional[str]
+    # The wrapper options, such as '--cwd'
+    options: Dict[str, str]
+    # The job command, without the wrapper
+    command: str
+
 
 class BuildPyCronScript(IPyCronEntry):
     """
@@ -12,15 +44,90 @@ class BuildPyCronScript(IPyCronEntry):
 
     def __init__(self):
         super(BuildPyCronScript, self).__init__()
+        # If the built entries run through the 'pycron.run' wrapper, which records every run
+        self.record = False
+        # What the wrapper does when the job fires while still running: 'skip', 'queue' or
+        # None to let them overlap. Guarded entries are recorded too
+        self.overlap: Optional[str] = None
+        # The resource class the jobs of the built entries wait a slot of and run under, see
+        # 'python_crontab.run_class'. Classed entries run through the wrapper and are recorded too
+        self.resource_class: Optional[str] = None
+        # If the built entries hand the job over to the warm 'pycron.pool' workers through
+        # the 'pycron.trigger' client, which runs it cold when the pool is not running
+        self.warm = False
 
     def set_py_interpreter(self, py_interpreter: str) -> NoReturn:
         check_source_existence(py_interpreter)
         super().set_py_interpreter(py_interpreter)
 
+    @staticmethod
+    def is_managed(command: str) -> bool:
+        """
+        Checks if a crontab command was built by pycron
+        :param command: the normalized command of a crontab entry
+        """
+        return command.startswith(PYCRON_COMMAND_PREFIX) and command.endswith(PYCRON_COMMAND_SUFFIX)
+
+    @staticmethod
+    def split_command(command: str) -> Optional[WrappedCommand]:
+        """
+        Takes apart the command of an entry built by pycron, as '_wrapped' puts it together
+        :param command: the normalized command of a crontab entry
+        :return: the wrapper, its options and the job command, or None when pycron did not build the entry
+        """
+        if not BuildPyCronScript.is_managed(command):
+            return None
+        command = command[len(PYCRON_COMMAND_PREFIX):-len(PYCRON_COMMAND_SUFFIX)].strip()
+        wrapper, separator, job_command = command.partition(" -- ")
+        # interpreter -S wrapper [--option value]... -- job command
+        wrapper_args = wrapper.split()
+        if separator and len(wrapper_args) > 2 and wrapper_args[1] == "-S" and (
+                is_pycron_script(wrapper_args[2], PYCRON_RUN_SCRIPT) or
+                is_pycron_script(wrapper_args[2], PYCRON_TRIGGER_SCRIPT)):
+            return WrappedCommand(wrapper_args[2], dict(zip(wrapper_args[3::2], wrapper_args[4::2])), job_command)
+        return WrappedCommand(None, {}, command)
+
+    @staticmethod
+    def unwrapped_command(command: str) -> Optional[str]:
+        """
+        Finds the job command of an entry built to run through the 'pycron.run' wrapper
+        :param command: the normalized command of a crontab entry
+        :return: the job command as it would be written without the wrapper, which is what
+        identifies the job on the run log, or None when the entry does not run through the wrapper
+        """
+        wrapped = BuildPyCronScript.split_command(command)
+        if wrapped is None or wrapped.wrapper is None or not is_pycron_script(wrapped.wrapper, PYCRON_RUN_SCRIPT):
+            return None
+        cwd = wrapped.options.get("--cwd")
+        return f"cd {cwd} && {wrapped.command}" if cwd is not None else wrapped.command
+
+    def _wrapped(self, command: str, cwd: Optional[str] = None) -> str:
+        """
+        Wraps the job command with the run wrapper when recording, guarding overlaps or classed, or with
+        the pool trigger when warm. Both start without the site module ('-S') to keep their
+        overhead low
+        """
+        cwd_option = f" --cwd {cwd}" if cwd is not None else ""
+        if self.warm:
+            if self.record or self.overlap is not None or self.resource_class is not None:
+                raise ValueError("the warm entries can not be recorded, guarded nor classed, the pool runs their jobs")
+            return f"{self.py_interpreter} -S {PYCRON_TRIGGER_SCRIPT}{cwd_option} -- {command}"
+        if not self.record and self.overlap is None and self.resource_class is None:
+            return command if cwd is None else f"cd {cwd} && {command}"
+        if self.overlap is not None and self.overlap not in OVERLAP_MODES:
+            raise ValueError(f"the overlap mode must be one of {', '.join(OVERLAP_MODES)}")
+        overlap_option = f" --overlap {self.overlap}" if self.overlap is not None else ""
+        class_option = f" --class {self.resource_class}" if self.resource_class is not None else ""
+        return f"{self.py_interpreter} -S {PYCRON_RUN_SCRIPT}{cwd_option}{overlap_option}{class_option} -- {command}"
+
     def build_cron_script(self) -> str:
-        return f"*/{self.interval} * * * * export DISPLAY=':0'; {self.py_interpreter} {self.script} >/dev/null 2>&1".strip()
+        command = self._wrapped(f"{self.py_interpreter} {self.script}")
+        return f"{self.schedule.expression} {PYCRON_COMMAND_PREFIX} {command} {PYCRON_COMMAND_SUFFIX}".strip()
 
 
 class BuildPyModuleCronScript(BuildPyCronScript):
     def build_cron_script(self) -> str:
-        return f"*/{self.interval} * * * * export DISPLAY=':0'; {self.script} >/dev/null 2>&1".strip()
+        # The module script is 'cd module/path && python -m module'
+        cd_command, _, command = self.script.partition(" && ")
+        command = self._wrapped(command, cd_command[len("cd "):]) if command else self.script
+        return f"{self.schedule.expression} {PYCRON_COMMAND_PREFIX} {command} {PYCRON_COMMAND_SUFFIX}".strip()
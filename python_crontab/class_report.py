@@ -0,0 +1,137 @@
+import json
+import math
+from typing import Dict, List, NamedTuple, Optional
+
+from python_crontab.run_class import WAIT_RECORD, ClassSlot, ResourceClass, class_id
+from python_crontab.run_stats import label_value
+
+
+class ClassWaits(NamedTuple):
+    """
+    How the jobs of a resource class waited for a slot over the report window, in seconds, None without launches
+    """
+    class_id: int
+    # The class name and settings, empty when the class is no longer on the classes file
+    name: str
+    settings: str
+    # The slots held when the report was taken, None when they could not be probed
+    running: Optional[int]
+    launches: int
+    # The launches which found no free slot
+    queued: int
+    mean_wait: Optional[float]
+    p95_wait: Optional[float]
+    max_wait: Optional[float]
+    total_wait: float
+
+    @property
+    def label(self) -> str:
+        return self.name or f"class {self.class_id:08x}"
+
+
+def read_waits(log_path: str, since: Optional[float] = None) -> List[tuple]:
+    """
+    :param since: the oldest queue time to read, None for the whole log
+    :return: the wait records, in the WAIT_RECORD order, none when the log is missing
+    """
+    try:
+        with open(log_path, "rb") as log_file:
+            data = log_file.read()
+    except FileNotFoundError:
+        return []
+    # A record half written by a wrapper killed in between is dropped
+    data = data[:len(data) - len(data) % WAIT_RECORD.size]
+    return [record for record in WAIT_RECORD.iter_unpack(data) if since is None or record[0] >= since]
+
+
+def _running(resource_class: ResourceClass, slot_dir: Optional[str]) -> Optional[int]:
+    try:
+        return ClassSlot(resource_class, slot_dir).running()
+    except OSError:
+        return None
+
+
+def collect_waits(records: List[tuple], classes: Dict[str, ResourceClass],
+                  slot_dir: Optional[str] = None) -> List[ClassWaits]:
+    """
+    Aggregates the wait records per class, sorting the waits of each class once
+    :param classes: the classes file, its classes are reported even without launches
+    :param slot_dir: the slot directory the running jobs are probed on
+    :return: the waits of the classes in the classes file order, then the classes of the records which match none
+    """
+    defined = {class_id(name): resource_class for name, resource_class in classes.items()}
+    waits: Dict[int, List[float]] = {class_key: [] for class_key in defined}
+    for _, waited, _, class_key in records:
+        waits.setdefault(class_key, []).append(waited)
+    reports = []
+    for class_key, class_waits in waits.items():
+        class_waits.sort()
+        resource_class = defined.get(class_key)
+        launches = len(class_waits)
+        reports.append(ClassWaits(
+            class_key,
+            resource_class.name if resource_class is not None else "",
+            resource_class.settings() if resource_class is not None else "",
+            _running(resource_class, slot_dir) if resource_class is not None else None,
+            launches,
+            sum(waited > 0 for waited in class_waits),
+            math.fsum(class_waits) / launches if launches else None,
+            class_waits[max(0, math.ceil(0.95 * launches) - 1)] if launches else None,
+            class_waits[-1] if launches else None,
+            math.fsum(class_waits)))
+    return reports
+
+
+def _seconds(value: Optional[float]) -> str:
+    return f"{value:.3f}" if value is not None else "-"
+
+
+def classes_table(reports: List[ClassWaits]) -> str:
+    if not reports:
+        return "No resource class defined and no recorded wait, see '--class'"
+    lines = [f"{'running':>7} {'launches':>8} {'queued':>6} {'mean s':>8} {'p95 s':>8} {'max s':>8}  class"]
+    for report in reports:
+        running = str(report.running) if report.running is not None else "-"
+        lines.append(f"{running:>7} {report.launches:>8} {report.queued:>6} {_seconds(report.mean_wait):>8} "
+                     f"{_seconds(report.p95_wait):>8} {_seconds(report.max_wait):>8}  "
+                     f"{' '.join(filter(None, (report.label, report.settings)))}")
+    return "\n".join(lines)
+
+
+def classes_json(reports: List[ClassWaits], since: Optional[float], until: float) -> str:
+    return json.dumps({
+        "since": since,
+        "until": until,
+        "classes": [{
+            "class_id": f"{report.class_id:08x}",
+            "name": report.name,
+            "settings": report.settings,
+            "running": report.running,
+            "launches": report.launches,
+            "queued": report.queued,
+            "wait_seconds": {"mean": report.mean_wait, "p95": report.p95_wait, "max": report.max_wait},
+        } for report in reports],
+    }, indent=2)
+
+
+def classes_prometheus(reports: List[ClassWaits]) -> str:
+    """
+    Formats the waits for the textfile collector of the node exporter, as the '--stats' ones
+    """
+    labels = {report.class_id: f'class="{label_value(report.label)}"' for report in reports}
+    lines = ["# HELP pycron_class_running Jobs of the class holding a slot",
+             "# TYPE pycron_class_running gauge"]
+    lines.extend(f"pycron_class_running{{{labels[report.class_id]}}} {report.running}"
+                 for report in reports if report.running is not None)
+    lines.extend(("# HELP pycron_class_queued Launches of the class which found no free slot over the window",
+                  "# TYPE pycron_class_queued gauge"))
+    lines.extend(f"pycron_class_queued{{{labels[report.class_id]}}} {report.queued}" for report in reports)
+
+    name = "pycron_class_wait_seconds"
+    lines.extend((f"# HELP {name} Time the jobs of the class waited for a slot", f"# TYPE {name} summary"))
+    for report in reports:
+        if report.p95_wait is not None:
+            lines.append(f'{name}{{{labels[report.class_id]},quantile="0.95"}} {report.p95_wait}')
+        lines.append(f"{name}_sum{{{labels[report.class_id]}}} {report.total_wait}")
+        lines.append(f"{name}_count{{{labels[report.class_id]}}} {report.launches}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,480 @@
+import json
+import math
+import time
+from datetime import datetime
+from abc import ABC, abstractmethod
+from argparse import Namespace
+from functools import partial
+from typing import Callable, Dict, List, NamedTuple, Optional, Type
+
+from environment import USER
+from exceptions import CrontabConflict
+from python_crontab.build_py_cron import BuildPyCronScript, BuildPyModuleCronScript
+from python_crontab.cron_argparser import parse_update_args, selected_command
+from python_crontab.interfaces.icron_backend import ICronBackend
+from python_crontab.manage_pycron import (ManagePyCronScript, ManagePyModuleCronScript, ManagePyCronManifest,
+                                          ManageSubMinuteJobs, HANDLED_ERRORS)
+from python_crontab.pycron_enum import PyCron
+from python_crontab.snapshots import Snapshot
+from utilities import crontab_lines, lines_digest, write_atomically
+from utilities.cron_backend import crontab_users, make_cron_backend
+from utilities.thread_output import ThreadOutput, thread_output
+
+
+class PyCronCommand(ABC):
+    # Printed once the command succeeds, the commands which print a report leave it empty
+    done_message = "Done!"
+
+    def __init__(self, namespace: Namespace, user: str = USER):
+        """
+        A single cli operation, built once the arguments are parsed and run synchronously
+        @param namespace: the parsed cli arguments
+        @param user: the owner of the crontab the command runs on
+        """
+        self.namespace = namespace
+        self.user = user
+        self.successfully_command = False
+
+    def _backend(self) -> ICronBackend:
+        return make_cron_backend(self.namespace.backend, self.user, self.namespace.spool_dir)
+
+    def _manager(self, module: bool, backend: ICronBackend) -> ManagePyCronScript:
+        """
+        Builds the cron manager with the python interpreter from the '--py' switch
+        @param module: if the manager handles python modules instead of scripts
+        @param backend: the crontab storage
+        """
+        if module:
+            manager = ManagePyModuleCronScript(BuildPyModuleCronScript(), backend)
+        else:
+            manager = ManagePyCronScript(BuildPyCronScript(), backend)
+        manager.pycron_builder.set_py_interpreter(self.namespace.py)
+        manager.spread = self.namespace.spread
+        manager.pycron_builder.record = self.namespace.record
+        manager.pycron_builder.overlap = self.namespace.overlap
+        manager.pycron_builder.warm = self.namespace.warm
+        manager.pycron_builder.resource_class = self.namespace.resource_class
+        manager.use_daemon = not self.namespace.no_daemon
+        return manager
+
+    def _emit(self, reports: Dict[str, Callable[[], str]], written: str) -> None:
+        """
+        Prints the report on the '--format' asked for, or writes it atomically to the '--output' file
+        @param reports: builds the report per format, the 'table' one for the formats the command does not take
+        @param written: what the report holds, printed once it is written, such as 'Stats of 3 jobs'
+        """
+        report = reports.get(self.namespace.format, reports["table"])()
+        if self.namespace.output is None:
+            print(report)
+        else:
+            write_atomically(self.namespace.output, report if report.endswith("\n") else report + "\n")
+            print(f"{written} written to {self.namespace.output}")
+
+    def execute(self) -> bool:
+        """
+        Runs the command reporting the known errors as messages
+        @return: if the command succeeded
+        """
+        try:
+            self.run()
+        except HANDLED_ERRORS as e:
+            print(e)
+            return False
+        if self.successfully_command and self.done_message:
+            print(self.done_message)
+        return self.successfully_command
+
+    @abstractmethod
+    def run(self) -> None:
+        raise NotImplementedError
+
+
+class CronEntryCommand(PyCronCommand):
+    """
+    Base of the commands handling a single entry given as [schedule, script] or [schedule, module path, module name]
+    """
+    switch: PyCron
+
+    def run(self) -> None:
+        values = getattr(self.namespace, str(self.switch))
+        manager = self._manager(self.namespace.module, self._backend())
+        if ManageSubMinuteJobs.is_subminute(values):
+            jobs = ManageSubMinuteJobs(manager)
+            self.run_jobs(jobs, values)
+            self.successfully_command = jobs.successfully_command
+            return
+        manager.interval = values[0]
+        manager.set_script(*values[1:])
+        self.run_manager(manager)
+        self.successfully_command = manager.successfully_command
+
+    @abstractmethod
+    def run_manager(self, manager: ManagePyCronScript) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def run_jobs(self, jobs: ManageSubMinuteJobs, values: List[str]) -> None:
+        raise NotImplementedError
+
+
+class InitCommand(CronEntryCommand):
+    switch = PyCron.INIT
+
+    def run_manager(self, manager: ManagePyCronScript) -> None:
+        manager.init_cron()
+
+    def run_jobs(self, jobs: ManageSubMinuteJobs, values: List[str]) -> None:
+        jobs.insert_new_cron(values)
+
+
+class InsertCommand(CronEntryCommand):
+    switch = PyCron.INSERT
+
+    def run_manager(self, manager: ManagePyCronScript) -> None:
+        manager.insert_new_cron()
+
+    def run_jobs(self, jobs: ManageSubMinuteJobs, values: List[str]) -> None:
+        jobs.insert_new_cron(values)
+
+
+class DeleteCommand(CronEntryCommand):
+    switch = PyCron.DELETE
+
+    def run_manager(self, manager: ManagePyCronScript) -> None:
+        manager.remove_cron_entry()
+
+    def run_jobs(self, jobs: ManageSubMinuteJobs, values: List[str]) -> None:
+        jobs.remove_cron_entry(values)
+
+
+class UpdateCommand(PyCronCommand):
+    def run(self) -> None:
+        update_values = parse_update_args(self.namespace.update)
+        manager = self._manager(self.namespace.module, self._backend())
+        if ManageSubMinuteJobs.is_subminute(update_values.old) or ManageSubMinuteJobs.is_subminute(update_values.new):
+            jobs = ManageSubMinuteJobs(manager)
+            jobs.update_cron(update_values.old, update_values.new)
+            self.successfully_command = jobs.successfully_command
+            return
+        manager.set_new_values(update_values.new)
+        manager.set_old_values(update_values.old)
+        manager.update_cron()
+        self.successfully_command = manager.successfully_command
+
+
+class ApplyCommand(PyCronCommand):
+    def run(self) -> None:
+        from python_crontab.entry_validator import EntryValidator
+        backend = self._backend()
+        validator = None if self.namespace.no_validate else EntryValidator(self.namespace.max_parallel)
+        manifest_manager = ManagePyCronManifest(self._manager(False, backend), self._manager(True, backend),
+                                                self.namespace.spread, validator)
+        manifest_manager.apply(self.namespace.apply)
+        self.successfully_command = manifest_manager.successfully_command
+
+
+class SimulateCommand(PyCronCommand):
+    done_message = ""
+
+    def run(self) -> None:
+        from python_crontab.simulate import ScheduleSimulation
+        table = self._backend().read_table().table
+        if table is None:
+            print(f"{self.user} user has no crontab to simulate")
+            return
+        print(ScheduleSimulation(table, self.namespace.simulate).report())
+        self.successfully_command = True
+
+
+class RebalanceCommand(PyCronCommand):
+    done_message = ""
+
+    def run(self) -> None:
+        from python_crontab.placement import MinutePlanner, rebalance
+        backend = self._backend()
+        table, digest = backend.read_table()
+        if table is None:
+            print(f"{self.user} user has no crontab to rebalance")
+            return
+        peak_before = MinutePlanner(table).peak
+        moves = rebalance(table)
+        for old_entry, new_entry in moves:
+            print(f"  {old_entry.schedule} -> {new_entry.schedule}  {new_entry.command}")
+        if moves and not backend.write_if_unchanged(table.render(), digest):
+            raise CrontabConflict(self.user, 1)
+        print(f"Moved {len(moves)} entries, peak of concurrent starts {peak_before} -> {MinutePlanner(table).peak}")
+        self.successfully_command = True
+
+
+class StatusCommand(PyCronCommand):
+    done_message = ""
+
+    def run(self) -> None:
+        from python_crontab.run_log import read_runs
+        from python_crontab.run_status import JobStatus, status_report
+        table = self._backend().read_table().table
+        if table is None:
+            print(f"{self.user} user has no crontab")
+            return
+        print(status_report(JobStatus.collect(table, read_runs(self.namespace.run_log))))
+        self.successfully_command = True
+
+
+class StatsCommand(PyCronCommand):
+    done_message = ""
+
+    def run(self) -> None:
+        from python_crontab.run_log import read_run_columns
+        from python_crontab.run_stats import collect_stats, stats_json, stats_prometheus, stats_table
+        from python_crontab.run_status import wrapped_jobs
+        table = self._backend().read_table().table
+        jobs = wrapped_jobs(table) if table is not None else {}
+        until = time.time()
+        since = until - self.namespace.stats if math.isfinite(self.namespace.stats) else None
+        stats = collect_stats(read_run_columns(self.namespace.run_log, since), jobs)
+        self._emit({"json": lambda: stats_json(stats, since, until), "prometheus": lambda: stats_prometheus(stats),
+                    "table": lambda: stats_table(stats)}, f"Stats of {len(stats)} jobs")
+        self.successfully_command = True
+
+
+class ListCommand(PyCronCommand):
+    done_message = ""
+
+    def run(self) -> None:
+        from python_crontab.entry_query import entries_csv, entries_json, entries_table, load_entry_index
+        index = load_entry_index(self._backend())
+        if index is None:
+            print(f"{self.user} user has no crontab")
+            return
+        entries = index.query(self.namespace.py, self.namespace.path, self.namespace.schedule, self.namespace.match)
+        if self.namespace.format == "json":
+            print(entries_json(entries))
+        elif self.namespace.format == "csv":
+            print(entries_csv(entries))
+        elif not entries:
+            print("No pycron entry matches the filters")
+        else:
+            print(entries_table(entries))
+        self.successfully_command = True
+
+
+class AuditCommand(PyCronCommand):
+    done_message = ""
+
+    def run(self) -> None:
+        from python_crontab.entry_query import load_entry_index
+        from python_crontab.entry_validator import EntryValidator, audit_json, audit_table
+        index = load_entry_index(self._backend())
+        if index is None:
+            print(f"{self.user} user has no crontab")
+            return
+        entries = index.query(self.namespace.py, self.namespace.path, self.namespace.schedule, self.namespace.match)
+        checks = EntryValidator(self.namespace.max_parallel).check(entries)
+        print(audit_json(checks) if self.namespace.format == "json" else audit_table(checks))
+        self.successfully_command = True
+
+
+class DispatchCommand(PyCronCommand):
+    done_message = ""
+
+    def run(self) -> None:
+        from python_crontab.dispatch_report import collect_drift, drift_json, drift_table, read_drift
+        from python_crontab.dispatch_table import drift_log_path, jobs_path, read_jobs
+        jobs_file = jobs_path(self.user)
+        until = time.time()
+        since = until - self.namespace.dispatch if math.isfinite(self.namespace.dispatch) else None
+        drifts = collect_drift(read_drift(drift_log_path(jobs_file), since), read_jobs(jobs_file))
+        self._emit({"json": lambda: drift_json(drifts, since, until), "table": lambda: drift_table(drifts)},
+                   f"Drift of {len(drifts)} jobs")
+        self.successfully_command = True
+
+
+class ClassesCommand(PyCronCommand):
+    done_message = ""
+
+    def run(self) -> None:
+        from python_crontab.class_report import classes_json, classes_prometheus, classes_table, collect_waits, \
+            read_waits
+        from python_crontab.run_class import read_classes, wait_log_path
+        until = time.time()
+        since = until - self.namespace.classes if math.isfinite(self.namespace.classes) else None
+        reports = collect_waits(read_waits(wait_log_path(self.namespace.run_log), since), read_classes())
+        self._emit({"json": lambda: classes_json(reports, since, until),
+                    "prometheus": lambda: classes_prometheus(reports), "table": lambda: classes_table(reports)},
+                   f"Waits of {len(reports)} classes")
+        self.successfully_command = True
+
+
+class SnapshotCommand(PyCronCommand):
+    """
+    Base of the commands over the crontab snapshots
+    """
+    done_message = ""
+
+    def _snapshot(self, backend: ICronBackend, number: int) -> Optional[Snapshot]:
+        """
+        :return: the snapshot with the number on the history, None (telling why) when there is none
+        """
+        if backend.snapshots is None:
+            print("The crontab snapshots are turned off by $PYCRON_SNAPSHOT_KEEP=0")
+            return None
+        snapshot = backend.snapshots.get(number)
+        if snapshot is None:
+            print(f"{self.user} user has no snapshot {number}, see '{PyCron.HISTORY.build_args()}'")
+        return snapshot
+
+    @staticmethod
+    def _current_digest(backend: ICronBackend) -> Optional[str]:
+        cached = backend.cached_table()
+        if cached is not None:
+            return cached.digest
+        with backend.open_crontab() as crontab:
+            return None if crontab is None else lines_digest(crontab_lines(crontab))
+
+    @staticmethod
+    def _taken(snapshot: Snapshot) -> str:
+        return datetime.fromtimestamp(snapshot.taken).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class HistoryCommand(SnapshotCommand):
+    def run(self) -> None:
+        backend = self._backend()
+        snapshots: List[Snapshot] = backend.snapshots.history() if backend.snapshots is not None else []
+        if self.namespace.format == "json":
+            print(json.dumps([snapshot._asdict() for snapshot in snapshots], indent=2))
+        elif not snapshots:
+            print(f"{self.user} user has no crontab snapshot")
+        else:
+            current = self._current_digest(backend)
+            print(f"{'#':>4}  {'taken':<19}  {'lines':>7}  {'size':>9}  digest")
+            for snapshot in snapshots:
+                print(f"{snapshot.number:>4}  {self._taken(snapshot):<19}  {snapshot.lines:>7}  "
+                      f"{backend.snapshots.size(snapshot):>9}  {snapshot.digest[:12]}"
+                      f"{'  (current)' if snapshot.digest == current else ''}")
+        self.successfully_command = True
+
+
+class DiffCommand(SnapshotCommand):
+    def run(self) -> None:
+        import difflib
+        backend = self._backend()
+        snapshot = self._snapshot(backend, self.namespace.diff)
+        if snapshot is None:
+            return
+        with backend.snapshots.open(snapshot) as lines:
+            snapshot_lines = list(lines)
+        table = backend.read_table().table
+        current_lines = [line.raw for line in table.lines()] if table is not None else []
+        diff = difflib.unified_diff(snapshot_lines, current_lines,
+                                    f"snapshot {snapshot.number} ({self._taken(snapshot)})", "current", lineterm="")
+        print("\n".join(diff) or f"The crontab is the same as on snapshot {snapshot.number}")
+        self.successfully_command = True
+
+
+class RollbackCommand(SnapshotCommand):
+    def run(self) -> None:
+        backend = self._backend()
+        snapshot = self._snapshot(backend, self.namespace.rollback)
+        if snapshot is None:
+            return
+        current = self._current_digest(backend)
+        if current == snapshot.digest:
+            print(f"The crontab is already the same as on snapshot {snapshot.number}")
+        else:
+            with backend.snapshots.open(snapshot) as lines:
+                if not backend.write_lines_if_unchanged(lambda: lines, current):
+                    raise CrontabConflict(self.user, 1)
+            print(f"Restored the {snapshot.lines} lines of snapshot {snapshot.number}, taken {self._taken(snapshot)}")
+        self.successfully_command = True
+
+
+COMMANDS: Dict[PyCron, Type[PyCronCommand]] = {
+    PyCron.INIT: InitCommand,
+    PyCron.INSERT: InsertCommand,
+    PyCron.DELETE: DeleteCommand,
+    PyCron.UPDATE: UpdateCommand,
+    PyCron.APPLY: ApplyCommand,
+    PyCron.SIMULATE: SimulateCommand,
+    PyCron.REBALANCE: RebalanceCommand,
+    PyCron.STATUS: StatusCommand,
+    PyCron.STATS: StatsCommand,
+    PyCron.HISTORY: HistoryCommand,
+    PyCron.DIFF: DiffCommand,
+    PyCron.ROLLBACK: RollbackCommand,
+    PyCron.LIST: ListCommand,
+    PyCron.AUDIT: AuditCommand,
+    PyCron.DISPATCH: DispatchCommand,
+    PyCron.CLASSES: ClassesCommand,
+}
+
+
+class UserResult(NamedTuple):
+    user: str
+    succeeded: bool
+    # What the command printed for the user
+    output: str
+    elapsed: float
+
+
+class FanOutCommand(PyCronCommand):
+    done_message = ""
+
+    def __init__(self, namespace: Namespace):
+        """
+        Runs the selected command over the crontab of many users at once, on a bounded thread pool,
+        and reports the outcome per user. Each thread captures what its command prints
+        @param namespace: the parsed cli arguments, with '--users' or '--all-users'
+        """
+        super(FanOutCommand, self).__init__(namespace)
+        self.results: List[UserResult] = []
+
+    def _users(self) -> List[str]:
+        return self.namespace.users if self.namespace.users else crontab_users(self.namespace.spool_dir)
+
+    def _run_for(self, output: ThreadOutput, user: str) -> UserResult:
+        start = time.perf_counter()
+        with output.capture() as captured:
+            try:
+                succeeded = COMMANDS[selected_command(self.namespace)](self.namespace, user).execute()
+            except Exception as e:
+                # A crontab failing on some unexpected way must not stop the others
+                print(f"{type(e).__name__}: {e}")
+                succeeded = False
+        return UserResult(user, succeeded, captured.getvalue().strip(), time.perf_counter() - start)
+
+    def run(self) -> None:
+        from concurrent.futures import ThreadPoolExecutor
+        try:
+            users = self._users()
+        except OSError as e:
+            print(f"Could not list the users with a crontab on {self.namespace.spool_dir}: {e}")
+            return
+        if not users:
+            print("No user to run the command for")
+            return
+        with thread_output() as output, ThreadPoolExecutor(min(self.namespace.max_parallel, len(users))) as pool:
+            self.results = list(pool.map(partial(self._run_for, output), users))
+        print(self.report())
+        self.successfully_command = all(result.succeeded for result in self.results)
+
+    def report(self) -> str:
+        if self.namespace.format == "json":
+            return json.dumps([result._asdict() for result in self.results], indent=2)
+        lines = []
+        for result in self.results:
+            lines.append(f"[{result.user}] {'done' if result.succeeded else 'not done'} in {result.elapsed:.2f} s")
+            lines.extend(f"  {line}" for line in result.output.splitlines())
+        not_done = sum(not result.succeeded for result in self.results)
+        lines.append(f"{len(self.results)} users: {len(self.results) - not_done} done, {not_done} not done")
+        return "\n".join(lines)
+
+
+def build_command(namespace: Namespace) -> PyCronCommand:
+    """
+    Builds the command selected on the command line
+    :param namespace: the parsed cli arguments, with exactly one command switch set
+    :return: the command ready to be executed, over many crontabs with '--users' or '--all-users'
+    """
+    if namespace.users or namespace.all_users:
+        return FanOutCommand(namespace)
+    return COMMANDS[selected_command(namespace)](namespace)
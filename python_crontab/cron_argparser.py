@@ -1,13 +1,33 @@
-from argparse import Action, ArgumentParser, Namespace
-from threading import Thread, Lock
-from typing import Any, Sequence, Text, Optional, List, NamedTuple
+import math
+import re
+import shlex
+from argparse import ArgumentParser, ArgumentTypeError, Namespace
+from typing import List, NamedTuple, Optional
 
-from python_crontab.build_py_cron import BuildPyCronScript, BuildPyModuleCronScript
-from python_crontab.manage_pycron import ManagePyCronScript, ManagePyModuleCronScript
 from python_crontab.pycron_enum import PyCron, SubPyCron
-from utilities import check_attr
 
-global_lock = Lock()
+"""
+Argument helpers for the cli. This module must stay cheap to import: the cron managers
+are only loaded once the arguments are parsed and some command has to run
+"""
+
+# The switches which select the command to run, in the order they are looked up
+COMMAND_SWITCHES = (PyCron.INIT, PyCron.INSERT, PyCron.DELETE, PyCron.UPDATE, PyCron.APPLY, PyCron.SIMULATE,
+                    PyCron.REBALANCE, PyCron.STATUS, PyCron.STATS, PyCron.HISTORY, PyCron.DIFF, PyCron.ROLLBACK,
+                    PyCron.LIST, PyCron.AUDIT, PyCron.DISPATCH, PyCron.CLASSES)
+
+# The commands which build entries and so need the '--py' interpreter
+PY_COMMANDS = (PyCron.INIT, PyCron.INSERT, PyCron.DELETE, PyCron.UPDATE, PyCron.APPLY)
+
+# The filters of '--list' and '--audit', besides the '--py' interpreter
+LIST_FILTERS = (PyCron.PATH, PyCron.SCHEDULE, PyCron.MATCH)
+
+
+# The user names accepted by '--users', which also name the spool files
+_USER_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_.-]*\$?$")
+
+# The units of the stats window
+WINDOW_UNITS = {"m": 60, "h": 60 * 60, "d": 24 * 60 * 60, "w": 7 * 24 * 60 * 60}
 
 
 class UpdateValues(NamedTuple):
@@ -15,9 +35,10 @@ class UpdateValues(NamedTuple):
     new: List[str]
 
 
-def _parse_update_args(update_args: List[str]) -> UpdateValues:
+def parse_update_args(update_args: List[str]) -> UpdateValues:
     """
-    Rearrange the update list of parameters
+    Rearrange the update list of parameters. The values are split as shell words, so a cron
+    schedule may be given quoted: "--old '0 9 * * mon-fri' path/to/script"
     @param update_args: the list came from update namespace object
     @return: restructured namedtuple
     """
@@ -25,110 +46,99 @@ def _parse_update_args(update_args: List[str]) -> UpdateValues:
     new_values = ""
     for update_arg in update_args:
         if SubPyCron.NEW.build_args() in update_arg:
-            new_values = update_arg.split(SubPyCron.NEW.build_args())[1].split()
+            new_values = shlex.split(update_arg.split(SubPyCron.NEW.build_args())[1])
         else:
-            old_values = update_arg.split(SubPyCron.OLD.build_args())[1].split()
+            old_values = shlex.split(update_arg.split(SubPyCron.OLD.build_args())[1])
     return UpdateValues(old=old_values, new=new_values)
 
 
-class BindValues(Action):
+def parse_window(window: str) -> float:
     """
-    Base argument parser class with holds an instance of the manage crontab implementation
+    Parses a stats window such as '30m', '24h', '7d' or 'all'
+    @param window: the window given on the command line
+    @return: the window in seconds, infinite for 'all'
     """
+    if window == "all":
+        return math.inf
+    amount, unit = window[:-1], window[-1:]
+    if unit not in WINDOW_UNITS or not amount.isdigit() or int(amount) == 0:
+        raise ArgumentTypeError(f"'{window}' is not a window such as 30m, 24h, 7d, 2w or all")
+    return int(amount) * WINDOW_UNITS[unit]
 
-    def __init__(self, option_strings: Sequence[Text], dest: Text, **kwargs):
-        super().__init__(option_strings, dest, **kwargs)
-        self.cron_manager: Optional[ManagePyCronScript] = None
-
-    def __call__(self, parser: ArgumentParser, namespace: Namespace, values: Any,
-                 option_string=None) -> None:
-        setattr(namespace, self.dest, values)
 
-        with global_lock:
-            if getattr(namespace, str(PyCron.MODULE)):
-                self.cron_manager = ManagePyModuleCronScript(BuildPyModuleCronScript())
-            else:
-                self.cron_manager = ManagePyCronScript(BuildPyCronScript())
-
-    def end_message(self):
-        if self.cron_manager.successfully_command:
-            print("Done!")
-
-
-class CallMainParserFuncs(BindValues):
+def parse_users(users: str) -> List[str]:
     """
-    Responsible for executing the actions for managing the crontab entries
+    Parses the comma separated '--users' list, keeping the given order without repetitions
+    @param users: the users given on the command line
+    @return: the user names
     """
+    names = list(dict.fromkeys(user.strip() for user in users.split(",") if user.strip()))
+    invalid = [name for name in names if not _USER_NAME.match(name)]
+    if not names or invalid:
+        raise ArgumentTypeError(f"'{users}' is not a comma separated list of user names")
+    return names
 
-    def __call__(self, parser: ArgumentParser, namespace: Namespace, values: List[str],
-                 option_string=None) -> None:
-        BindValues.__call__(self, parser, namespace, values, option_string)
-        self.cron_manager.event.wait()
-
-        self.cron_manager.interval = values[0]
-        self.cron_manager.set_script(*values[1:])
 
-        if getattr(namespace, str(PyCron.INIT)) is not None:
-            self.cron_manager.init_cron()
-        elif getattr(namespace, str(PyCron.INSERT)) is not None:
-            self.cron_manager.insert_new_cron()
-        elif getattr(namespace, str(PyCron.DELETE)) is not None:
-            self.cron_manager.remove_cron_entry()
-        self.end_message()
-
-
-class CallInitFuncs(BindValues):
+def selected_command(namespace: Namespace) -> Optional[PyCron]:
     """
-    Responsible for executing the actions that must be run before any other action
+    Finds which command switch was given on the command line
+    @param namespace: the parsed arguments
+    @return: the command switch or None when no command was asked for
     """
-
-    def __call__(self, parser: ArgumentParser, namespace: Namespace, values: str,
-                 option_string=None) -> None:
-        BindValues.__call__(self, parser, namespace, values, option_string)
-        self.cron_manager.pycron_builder.set_py_interpreter(values)
-        self.cron_manager.event.set()
+    for switch in COMMAND_SWITCHES:
+        if getattr(namespace, str(switch), None) is not None:
+            return switch
+    return None
 
 
-class CallSubParserFuncs(BindValues):
-
-    def __call__(self, parser: ArgumentParser, namespace: Namespace, values: Any, option_string=None) -> None:
-        BindValues.__call__(self, parser, namespace, values, option_string)
-        self.cron_manager.event.wait()
-
-        update_values = _parse_update_args(getattr(namespace, str(PyCron.UPDATE)))
-        self.cron_manager.set_script(*update_values.new[1:])
-
-        self.cron_manager.set_new_values(update_values.new)
-        self.cron_manager.set_old_values(update_values.old)
-        self.cron_manager.update_cron()
-        self.end_message()
-
-
-class MainMediatorFuncs(CallInitFuncs, CallMainParserFuncs):
+def validate_args(parser: ArgumentParser, namespace: Namespace) -> None:
     """
-    Manages the action execution order when parsing arguments of the main parser
+    Checks the arguments of the selected command before anything runs, exiting through the parser on errors
+    @param parser: the parser which produced the namespace
+    @param namespace: the parsed arguments
     """
-
-    def __call__(self, parser: ArgumentParser, namespace: Namespace, values: Any,
-                 option_string=None) -> None:
-        if check_attr(namespace, str(PyCron.PY)) and isinstance(values, str):
-            Thread(target=CallInitFuncs.__call__,
-                   args=(self, parser, namespace, values, option_string)).start()
-        else:
-            Thread(target=CallMainParserFuncs.__call__,
-                   args=(self, parser, namespace, values, option_string)).start()
-
-
-class UpdateMediatorFuncs(CallInitFuncs, CallSubParserFuncs):
-    """
-    Manages the action execution order when parsing arguments of the sub parser
-    """
-
-    def __call__(self, parser: ArgumentParser, namespace: Namespace, values: Any,
-                 option_string=None) -> None:
-        if check_attr(namespace, str(PyCron.PY)) and isinstance(values, str):
-            Thread(target=CallInitFuncs.__call__,
-                   args=(self, parser, namespace, values, option_string)).start()
-        else:
-            Thread(target=CallSubParserFuncs.__call__,
-                   args=(self, parser, namespace, values, option_string)).start()
+    command = selected_command(namespace)
+    if command in PY_COMMANDS and namespace.py is None:
+        parser.error(f"{command.build_args()} requires the {PyCron.PY.build_args()} interpreter")
+    if namespace.warm and (namespace.record or namespace.overlap is not None or namespace.resource_class is not None):
+        parser.error(f"{PyCron.WARM.build_args()} can not be combined with {PyCron.RECORD.build_args()}, "
+                     f"{PyCron.OVERLAP.build_args()} or {PyCron.CLASS.build_args()}: the pool runs the warm jobs, "
+                     f"out of the run wrapper reach")
+    if namespace.resource_class is not None or command is PyCron.CLASSES:
+        from python_crontab.run_class import default_classes_file, read_classes
+        try:
+            classes = read_classes()
+        except (OSError, ValueError) as e:
+            parser.error(f"could not read the classes file {default_classes_file()}: {e}")
+        if namespace.resource_class is not None and namespace.resource_class not in classes:
+            defined = f"defined classes: {', '.join(classes)}" if classes else "no class is defined"
+            parser.error(f"{PyCron.CLASS.build_args()} {namespace.resource_class} is not on the classes file "
+                         f"{default_classes_file()}, {defined}")
+    if command in (PyCron.INIT, PyCron.INSERT, PyCron.DELETE):
+        values = getattr(namespace, str(command))
+        if len(values) != (3 if namespace.module else 2):
+            parser.error(f"{command.build_args()} expects the interval in minutes, in seconds or a quoted cron "
+                         f"schedule and the path to the python script [module path and module name]")
+    elif command is PyCron.UPDATE:
+        update_values = parse_update_args(namespace.update)
+        if not update_values.old or not update_values.new:
+            parser.error(f"{PyCron.UPDATE.build_args()} expects both {SubPyCron.OLD.build_args()} "
+                         f"and {SubPyCron.NEW.build_args()} values")
+    elif command is PyCron.SIMULATE and namespace.simulate <= 0:
+        parser.error(f"{PyCron.SIMULATE.build_args()} expects a positive number of hours")
+    elif command in (PyCron.DIFF, PyCron.ROLLBACK) and getattr(namespace, str(command)) < 1:
+        parser.error(f"{command.build_args()} expects a snapshot number from '{PyCron.HISTORY.build_args()}', 1 or more")
+    if namespace.format == "csv" and command is not PyCron.LIST:
+        parser.error(f"only {PyCron.LIST.build_args()} takes the csv {PyCron.FORMAT.build_args()}")
+    if command not in (PyCron.LIST, PyCron.AUDIT):
+        given = [switch.build_args() for switch in LIST_FILTERS if getattr(namespace, str(switch)) is not None]
+        if given:
+            parser.error(f"{', '.join(given)} only filter the {PyCron.LIST.build_args()} and "
+                         f"{PyCron.AUDIT.build_args()} entries")
+    elif namespace.match is not None:
+        try:
+            re.compile(namespace.match)
+        except re.error as e:
+            parser.error(f"{PyCron.MATCH.build_args()} expects a regular expression: {e}")
+    if namespace.max_parallel < 1:
+        parser.error(f"{PyCron.MAX_PARALLEL.build_args()} expects at least 1")
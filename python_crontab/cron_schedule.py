@@ -0,0 +1,201 @@
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from exceptions import InvalidCronSchedule
+
+_MONTH_NAMES = {name: number for number, name in enumerate(
+    ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"), start=1)}
+_WEEKDAY_NAMES = {name: number for number, name in enumerate(("sun", "mon", "tue", "wed", "thu", "fri", "sat"))}
+
+MACROS: Dict[str, Optional[str]] = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+    "@reboot": None,
+}
+
+# Long enough to reach any 29th of February, as leap years may be 8 years apart
+_MAX_SEARCH_DAYS = 8 * 366
+
+
+class _Field(NamedTuple):
+    name: str
+    low: int
+    high: int
+    names: Dict[str, int]
+
+
+_FIELDS = (_Field("minute", 0, 59, {}),
+           _Field("hour", 0, 23, {}),
+           _Field("day of month", 1, 31, {}),
+           _Field("month", 1, 12, _MONTH_NAMES),
+           _Field("day of week", 0, 7, _WEEKDAY_NAMES))
+
+
+def _field_value(expression: str, field: _Field, value: str) -> int:
+    number = field.names.get(value.lower()) if not value.isdigit() else int(value)
+    if number is None or not field.low <= number <= field.high:
+        raise InvalidCronSchedule(expression, f"the {field.name} field must be encompassed "
+                                              f"from {field.low} up to {field.high}, not '{value}'")
+    return number
+
+
+def _field_mask(expression: str, field: _Field, text: str) -> int:
+    """
+    Compiles a single schedule field (lists, ranges, steps and names) into a bitset
+    where the bit N is set when the value N matches
+    """
+    mask = 0
+    for part in text.split(","):
+        range_part, has_step, step_part = part.partition("/")
+        step = 1
+        if has_step:
+            if not step_part.isdigit() or int(step_part) == 0:
+                raise InvalidCronSchedule(expression, f"invalid step '{step_part}' on the {field.name} field")
+            step = int(step_part)
+
+        if range_part == "*":
+            start, end = field.low, field.high
+        elif "-" in range_part:
+            start, end = (_field_value(expression, field, value) for value in range_part.split("-", 1))
+            if start > end:
+                raise InvalidCronSchedule(expression, f"reversed range '{range_part}' on the {field.name} field")
+        elif range_part:
+            start = _field_value(expression, field, range_part)
+            end = field.high if has_step else start
+        else:
+            raise InvalidCronSchedule(expression, f"empty value on the {field.name} field")
+
+        for value in range(start, end + 1, step):
+            mask |= 1 << value
+    return mask
+
+
+def _next_bit(mask: int, start: int) -> Optional[int]:
+    """
+    :return: the position of the lowest bit set on the mask at or above start
+    """
+    remaining = mask >> start
+    return (remaining & -remaining).bit_length() - 1 + start if remaining else None
+
+
+class CronSchedule(NamedTuple):
+    """
+    A cron schedule compiled to one bitset per field, so matching a point in time is a few bit tests
+    """
+    expression: str
+    minutes: int
+    hours: int
+    days: int
+    months: int
+    weekdays: int
+    # A field starting with '*' does not restrict the day: day of month and day of week are
+    # only combined with 'or' when both of them are restricted
+    day_any: bool
+    weekday_any: bool
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def parse(expression: str) -> "CronSchedule":
+        """
+        Compiles a five field schedule ("*/10 8-18 * * mon-fri") or a macro ("@hourly")
+        :param expression: the cron schedule expression
+        :return: the compiled schedule
+        """
+        fields_text = " ".join(expression.split())
+        if fields_text.startswith("@"):
+            if fields_text.lower() not in MACROS:
+                raise InvalidCronSchedule(expression, f"unknown macro, use one of {', '.join(MACROS)}")
+            if MACROS[fields_text.lower()] is None:
+                # Only fires when cron starts, so it matches no point in time
+                return CronSchedule(fields_text.lower(), 0, 0, 0, 0, 0, False, False)
+            fields_text = MACROS[fields_text.lower()]
+
+        fields = fields_text.split()
+        if len(fields) != len(_FIELDS):
+            raise InvalidCronSchedule(expression, "a schedule must have 5 fields: minute hour day month weekday")
+        minutes, hours, days, months, weekdays = (_field_mask(expression, field, text)
+                                                  for field, text in zip(_FIELDS, fields))
+        if weekdays & (1 << 7):
+            # Both 0 and 7 are sunday
+            weekdays = (weekdays | 1) & ~(1 << 7)
+        return CronSchedule(" ".join(expression.split()), minutes, hours, days, months, weekdays,
+                            fields[2].startswith("*"), fields[4].startswith("*"))
+
+    @staticmethod
+    def every(minutes: str) -> "CronSchedule":
+        """
+        Builds the '*/N * * * *' schedule of the interval based entries
+        :param minutes: the interval in minutes, from 1 up to 59
+        """
+        if not str(minutes).strip().isdigit() or not 1 <= int(minutes) <= 59:
+            raise InvalidCronSchedule(f"*/{minutes}", "the interval must be encompassed from 1 up to 59 minutes")
+        return CronSchedule.parse(f"*/{int(minutes)} * * * *")
+
+    @staticmethod
+    def from_spec(spec: str) -> "CronSchedule":
+        """
+        Builds a schedule from the cli and manifest values: a bare number is an interval
+        in minutes, anything else a cron expression or macro
+        """
+        spec = str(spec).strip()
+        return CronSchedule.every(spec) if spec.isdigit() else CronSchedule.parse(spec)
+
+    @property
+    def is_time_based(self) -> bool:
+        """If the schedule fires at some point in time, which is not the case of '@reboot'"""
+        return self.minutes != 0
+
+    @property
+    def time_key(self) -> Tuple[int, int, int, int, bool, bool]:
+        """Every field but the minutes: schedules sharing it fire on the same hours"""
+        return self.hours, self.days, self.months, self.weekdays, self.day_any, self.weekday_any
+
+    def day_matches(self, moment: datetime) -> bool:
+        if not self.months >> moment.month & 1:
+            return False
+        day = self.days >> moment.day & 1
+        weekday = self.weekdays >> (moment.weekday() + 1) % 7 & 1
+        if self.day_any or self.weekday_any:
+            return bool(day and weekday)
+        return bool(day or weekday)
+
+    def hour_matches(self, moment: datetime) -> bool:
+        return bool(self.hours >> moment.hour & 1) and self.day_matches(moment)
+
+    def matches(self, moment: datetime) -> bool:
+        """
+        :return: if the schedule fires on the minute of the given moment
+        """
+        return bool(self.minutes >> moment.minute & 1) and self.hour_matches(moment)
+
+    def next_fire(self, after: datetime) -> Optional[datetime]:
+        """
+        Finds the first minute strictly after the given moment when the schedule fires. Whole days
+        are skipped with the day bitsets and the hour and minute are found with bit scans
+        :param after: the moment to search from
+        :return: the next fire time or None when the schedule never fires
+        """
+        if not self.is_time_based:
+            return None
+        moment = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        for _ in range(_MAX_SEARCH_DAYS):
+            if not self.months >> moment.month & 1:
+                # Skips the whole month
+                moment = moment.replace(day=1, hour=0, minute=0) + timedelta(days=31)
+                moment = moment.replace(day=1)
+                continue
+            if self.day_matches(moment):
+                hour = _next_bit(self.hours, moment.hour)
+                while hour is not None:
+                    minute = _next_bit(self.minutes, moment.minute if hour == moment.hour else 0)
+                    if minute is not None:
+                        return moment.replace(hour=hour, minute=minute)
+                    hour = _next_bit(self.hours, hour + 1)
+            moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+        return None
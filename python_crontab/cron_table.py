@@ -0,0 +1,246 @@
+import re
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+EnvAssignments = Tuple[Tuple[str, str], ...]
+EntryKey = Tuple[str, str]
+
+_ENV_PATTERN = re.compile(r"^([A-Za-z_][A-Za-z0-9_]*)\s*=\s*(.*)$")
+_MINUTE_FIELD = re.compile(r"^[0-9*/,\-]+$")
+_SCHEDULE_FIELD = re.compile(r"^[0-9A-Za-z*/,\-]+$")
+_MACRO_ALIASES = {"@annually": "@yearly", "@midnight": "@daily"}
+
+
+class CronComment(NamedTuple):
+    """
+    A line kept verbatim on the crontab: comments, blank lines and anything cron would not parse
+    """
+    raw: str
+
+
+class CronEnv(NamedTuple):
+    """
+    An environment assignment line (NAME=value) affecting the entries below it
+    """
+    name: str
+    value: str
+    raw: str
+
+
+class CronEntry(NamedTuple):
+    """
+    A scheduled command line. The schedule and the command are whitespace normalized
+    so they can be used as lookup keys; the raw line is kept for rendering
+    """
+    schedule: str
+    command: str
+    raw: str
+    comments: Tuple[str, ...] = ()
+    env: EnvAssignments = ()
+
+    @property
+    def key(self) -> EntryKey:
+        return self.schedule, self.command
+
+    def __str__(self) -> str:
+        return f"{self.schedule} {self.command}"
+
+
+CronLine = Union[CronEntry, CronEnv, CronComment]
+
+
+def normalize_command(command: str) -> str:
+    return " ".join(command.split())
+
+
+def normalize_schedule(fields: Iterable[str]) -> str:
+    schedule = " ".join(fields)
+    return _MACRO_ALIASES.get(schedule.lower(), schedule.lower()) if schedule.startswith("@") else schedule
+
+
+def parse_line(raw: str, comments: Tuple[str, ...] = (), env: EnvAssignments = ()) -> CronLine:
+    """
+    Parses a single crontab line into its typed representation
+    :param raw: the crontab line, without the line break
+    :param comments: the comment block right above the line, attached to entries
+    :param env: the environment assignments in effect for the line, attached to entries
+    :return: the typed crontab line
+    """
+    text = raw.strip()
+    if not text or text.startswith("#"):
+        return CronComment(raw)
+
+    if text.startswith("@"):
+        tokens = text.split(None, 1)
+        if len(tokens) == 2:
+            return CronEntry(normalize_schedule(tokens[:1]), normalize_command(tokens[1]), raw, comments, env)
+    else:
+        tokens = text.split(None, 5)
+        if len(tokens) == 6 and _MINUTE_FIELD.match(tokens[0]) and all(
+                _SCHEDULE_FIELD.match(field) for field in tokens[1:5]):
+            return CronEntry(normalize_schedule(tokens[:5]), normalize_command(tokens[5]), raw, comments, env)
+
+    env_match = _ENV_PATTERN.match(text)
+    if env_match:
+        name, value = env_match.groups()
+        return CronEnv(name, value.strip().strip("\"'"), raw)
+    return CronComment(raw)
+
+
+def parse_entry(raw: str) -> CronEntry:
+    """
+    Parses a crontab line which must be a scheduled command
+    :param raw: the crontab entry
+    :return: the parsed entry
+    """
+    line = parse_line(raw)
+    if not isinstance(line, CronEntry):
+        raise ValueError(f"'{raw}' is not a cron entry")
+    return line
+
+
+class CronTable:
+    def __init__(self, lines: Iterable[str] = ()):
+        """
+        Parsed crontab kept in its original order. Every line gets a stable id on an insertion ordered
+        dict, and the entries are indexed by (schedule, command) and by command, so looking up,
+        adding, removing and replacing an entry do not scan the table
+        @param lines: the crontab lines, as read from 'crontab -l'
+        """
+        self._lines: Dict[int, CronLine] = {}
+        self._entries: Dict[EntryKey, Dict[int, None]] = {}
+        self._commands: Dict[str, Dict[int, None]] = {}
+        self._next_id = 0
+        self._entry_count = 0
+        self._env: EnvAssignments = ()
+        self._comments: List[str] = []
+        for line in lines:
+            self._append(parse_line(line.rstrip("\r\n"), tuple(self._comments), self._env))
+
+    @classmethod
+    def parse(cls, crontab: str) -> "CronTable":
+        return cls(crontab.splitlines())
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[CronLine]) -> "CronTable":
+        """
+        Builds the table from lines already parsed, such as the lines of another table, indexing them
+        without parsing them again
+        """
+        table = cls()
+        for line in lines:
+            table._append(line)
+        return table
+
+    def _append(self, line: CronLine) -> None:
+        line_id = self._next_id
+        self._next_id += 1
+        self._lines[line_id] = line
+        if isinstance(line, CronEntry):
+            self._index(line_id, line)
+            self._comments.clear()
+        elif isinstance(line, CronEnv):
+            self._env = tuple((name, value) for name, value in self._env if name != line.name) + (
+                (line.name, line.value),)
+            self._comments.clear()
+        elif line.raw.strip():
+            self._comments.append(line.raw.strip().lstrip("#").strip())
+        else:
+            self._comments.clear()
+
+    def _index(self, line_id: int, entry: CronEntry) -> None:
+        self._entry_count += 1
+        self._entries.setdefault(entry.key, {})[line_id] = None
+        self._commands.setdefault(entry.command, {})[line_id] = None
+
+    def _unindex(self, line_id: int, entry: CronEntry) -> None:
+        self._entry_count -= 1
+        for index, key in ((self._entries, entry.key), (self._commands, entry.command)):
+            ids = index[key]
+            del ids[line_id]
+            if not ids:
+                del index[key]
+
+    @staticmethod
+    def _key(entry: Union[str, CronEntry]) -> EntryKey:
+        return (entry if isinstance(entry, CronEntry) else parse_entry(entry)).key
+
+    def __len__(self) -> int:
+        return self._entry_count
+
+    def __iter__(self) -> Iterator[CronEntry]:
+        return (line for line in self._lines.values() if isinstance(line, CronEntry))
+
+    def __contains__(self, entry: Union[str, CronEntry]) -> bool:
+        return self._key(entry) in self._entries
+
+    @property
+    def env(self) -> EnvAssignments:
+        """The environment assignments in effect at the end of the table"""
+        return self._env
+
+    def lines(self) -> Iterator[CronLine]:
+        return iter(self._lines.values())
+
+    def get(self, entry: Union[str, CronEntry]) -> Optional[CronEntry]:
+        ids = self._entries.get(self._key(entry))
+        return self._lines[next(iter(ids))] if ids else None
+
+    def entries_for_command(self, command: str) -> List[CronEntry]:
+        return [self._lines[line_id] for line_id in self._commands.get(normalize_command(command), ())]
+
+    def add(self, entry: Union[str, CronEntry]) -> bool:
+        """
+        Appends an entry at the end of the table unless the same schedule and command is already there
+        :param entry: the crontab entry to add
+        :return: if the entry was added
+        """
+        entry = entry if isinstance(entry, CronEntry) else parse_entry(entry)
+        if entry.key in self._entries:
+            return False
+        self._comments.clear()
+        self._append(entry._replace(comments=(), env=self._env))
+        return True
+
+    def remove(self, entry: Union[str, CronEntry]) -> bool:
+        """
+        Removes every entry with the same schedule and command
+        :param entry: the crontab entry to remove
+        :return: if some entry was removed
+        """
+        ids = self._entries.get(self._key(entry))
+        if not ids:
+            return False
+        for line_id in list(ids):
+            self._unindex(line_id, self._lines.pop(line_id))
+        return True
+
+    def replace(self, old_entry: Union[str, CronEntry], new_entry: Union[str, CronEntry]) -> bool:
+        """
+        Replaces an entry keeping its position on the table. Duplicates of the old entry are dropped,
+        and the old entry is just removed when the new one is already on the table. When both have the
+        same schedule and command, the table is left as it is
+        :param old_entry: the crontab entry to be replaced
+        :param new_entry: the crontab entry to replace with
+        :return: if the old entry was found
+        """
+        new_entry = new_entry if isinstance(new_entry, CronEntry) else parse_entry(new_entry)
+        old_key = self._key(old_entry)
+        ids = self._entries.get(old_key)
+        if not ids:
+            return False
+        if old_key == new_entry.key:
+            return True
+        if new_entry.key in self._entries:
+            return self.remove(old_entry) or True
+
+        line_id, *duplicate_ids = ids
+        for duplicate_id in duplicate_ids:
+            self._unindex(duplicate_id, self._lines.pop(duplicate_id))
+        old_line = self._lines[line_id]
+        self._unindex(line_id, old_line)
+        self._lines[line_id] = new_entry._replace(comments=old_line.comments, env=old_line.env)
+        self._index(line_id, self._lines[line_id])
+        return True
+
+    def render(self) -> str:
+        return "\n".join(line.raw for line in self._lines.values())
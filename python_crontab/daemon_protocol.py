@@ -0,0 +1,97 @@
+import json
+import os
+import socket
+from typing import Any, Dict, Optional
+
+"""
+The messages between the cli and the 'pycron.daemon' management daemon: one JSON object per line
+both ways, over a Unix socket. A connection carries any number of requests, each one answered in turn.
+
+Every request has the 'op' and the 'user' whose crontab it runs on. 'open' tells if the daemon serves
+the backend the cli would use ('backend' and 'spool_dir'), then 'insert' and 'delete' take an 'entry',
+'update' takes the 'old' and 'new' entries, and 'list' takes 'managed'. The replies have 'ok', and
+'error' when not ok, or 'declined' when the daemon does not serve the request, which is then run directly
+"""
+
+DAEMON_SOCKET_VARIABLE = "PYCRON_DAEMON_SOCKET"
+PROTOCOL_VERSION = 1
+
+OP_OPEN = "open"
+OP_INSERT = "insert"
+OP_DELETE = "delete"
+OP_UPDATE = "update"
+OP_LIST = "list"
+
+# The daemon answers the changes once they are committed, which may wait for 'crontab -' and a few
+# commit retries
+CONNECT_TIMEOUT = 1.0
+REPLY_TIMEOUT = 120.0
+
+Message = Dict[str, Any]
+
+
+def default_daemon_socket() -> str:
+    return os.environ.get(DAEMON_SOCKET_VARIABLE) or os.path.join(os.path.expanduser("~"), ".pycron", "daemon.sock")
+
+
+def encode(message: Message) -> bytes:
+    return json.dumps(message, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def decode(line: bytes) -> Message:
+    """
+    :param line: a message, with or without its line break
+    :raise ValueError: when the line is not a JSON object
+    """
+    message = json.loads(line)
+    if not isinstance(message, dict):
+        raise ValueError("not a pycron daemon message")
+    return message
+
+
+class DaemonConnection:
+    def __init__(self, sock: socket.socket):
+        """
+        A connection to the management daemon, see 'connect'
+        """
+        self._sock = sock
+        self._replies = sock.makefile("rb")
+
+    @staticmethod
+    def connect(socket_path: Optional[str] = None) -> Optional["DaemonConnection"]:
+        """
+        :param socket_path: the daemon socket, $PYCRON_DAEMON_SOCKET or ~/.pycron/daemon.sock by default
+        :return: the connection, or None when no daemon listens on the socket
+        """
+        socket_path = socket_path or default_daemon_socket()
+        if not os.path.exists(socket_path):
+            return None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(CONNECT_TIMEOUT)
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            # Left behind by a daemon which died
+            sock.close()
+            return None
+        sock.settimeout(REPLY_TIMEOUT)
+        return DaemonConnection(sock)
+
+    def request(self, message: Message) -> Message:
+        """
+        Sends a request and waits for its reply
+        :raise ConnectionError: when the daemon goes away before replying
+        :raise ValueError: when the reply is malformed
+        """
+        try:
+            self._sock.sendall(encode(message))
+            reply = self._replies.readline()
+        except socket.timeout:
+            raise ConnectionError(f"the pycron daemon did not reply in {REPLY_TIMEOUT:.0f}s")
+        if not reply:
+            raise ConnectionError("the pycron daemon closed the connection")
+        return decode(reply)
+
+    def close(self) -> None:
+        self._replies.close()
+        self._sock.close()
@@ -0,0 +1,87 @@
+import json
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from python_crontab.dispatch_table import DRIFT_RECORD, dispatch_job_id
+
+
+class JobDrift(NamedTuple):
+    """
+    How late the dispatcher launched a sub-minute job over the report window, in seconds, None without launches
+    """
+    job_id: int
+    # The job command, empty when the job is no longer on the jobs file
+    command: str
+    seconds: Optional[int]
+    launches: int
+    mean_drift: Optional[float]
+    max_drift: Optional[float]
+
+    @property
+    def name(self) -> str:
+        return self.command or f"job {self.job_id:08x}"
+
+
+def read_drift(log_path: str, since: Optional[float] = None) -> List[tuple]:
+    """
+    :param since: the oldest minute to read, None for the whole log
+    :return: the drift records, in the DRIFT_RECORD order, none when the log is missing
+    """
+    try:
+        with open(log_path, "rb") as log_file:
+            data = log_file.read()
+    except FileNotFoundError:
+        return []
+    # A record half written by a dispatcher killed in between is dropped
+    data = data[:len(data) - len(data) % DRIFT_RECORD.size]
+    return [record for record in DRIFT_RECORD.iter_unpack(data) if since is None or record[0] >= since]
+
+
+def collect_drift(records: List[tuple], jobs: List[Tuple[int, str]]) -> List[JobDrift]:
+    """
+    Aggregates the drift records per job, the mean weighted by the launches of every dispatcher run
+    :param jobs: the jobs file, its jobs are reported even without launches
+    :return: the drift of the jobs in the jobs file order, then the jobs of the records which match no job
+    """
+    commands: Dict[int, Tuple[Optional[int], str]] = {dispatch_job_id(seconds, command): (seconds, command)
+                                                       for seconds, command in jobs}
+    totals: Dict[int, List[float]] = {job: [0, 0.0, 0.0] for job in commands}
+    for _, job, launches, mean_drift, max_drift in records:
+        total = totals.setdefault(job, [0, 0.0, 0.0])
+        total[0] += launches
+        total[1] += mean_drift * launches
+        total[2] = max(total[2], max_drift)
+    drifts = []
+    for job, (launches, drift_sum, max_drift) in totals.items():
+        seconds, command = commands.get(job, (None, ""))
+        drifts.append(JobDrift(job, command, seconds, launches, drift_sum / launches if launches else None,
+                               max_drift if launches else None))
+    return drifts
+
+
+def _milliseconds(seconds: Optional[float]) -> str:
+    return f"{seconds * 1000:.1f}" if seconds is not None else "-"
+
+
+def drift_table(drifts: List[JobDrift]) -> str:
+    if not drifts:
+        return "No sub-minute job and no recorded launch"
+    lines = [f"{'every':>5} {'launches':>8} {'mean ms':>8} {'max ms':>8}  job"]
+    for drift in drifts:
+        every = f"{drift.seconds}s" if drift.seconds is not None else "-"
+        lines.append(f"{every:>5} {drift.launches:>8} {_milliseconds(drift.mean_drift):>8} "
+                     f"{_milliseconds(drift.max_drift):>8}  {drift.name}")
+    return "\n".join(lines)
+
+
+def drift_json(drifts: List[JobDrift], since: Optional[float], until: float) -> str:
+    return json.dumps({
+        "since": since,
+        "until": until,
+        "jobs": [{
+            "job_id": f"{drift.job_id:08x}",
+            "command": drift.command,
+            "interval_seconds": drift.seconds,
+            "launches": drift.launches,
+            "drift_seconds": {"mean": drift.mean_drift, "max": drift.max_drift},
+        } for drift in drifts],
+    }, indent=2)
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import os
+import struct
+import zlib
+
+"""
+The sub-minute jobs launched by the 'pycron.dispatch' dispatcher, and the drift log it writes. A single
+crontab entry runs the dispatcher every minute, which launches every job of its jobs file at its offsets
+within the minute
+"""
+
+# The sub-minute intervals, in seconds: they divide the minute, so every minute launches a job at the same offsets
+SUBMINUTE_STEPS = (1, 2, 3, 4, 5, 6, 10, 12, 15, 20, 30)
+
+# minute (wall time the dispatcher run is for), job id, launches, mean and max drift (seconds)
+DRIFT_RECORD = struct.Struct("<dIIdd")
+
+DISPATCH_DIR_VARIABLE = "PYCRON_DISPATCH_DIR"
+
+
+def default_dispatch_dir() -> str:
+    return os.environ.get(DISPATCH_DIR_VARIABLE) or os.path.join(os.path.expanduser("~"), ".pycron", "dispatch")
+
+
+def jobs_path(user: str, directory: str | None = None) -> str:
+    """
+    :return: the jobs file of the user, each line a job: the interval in seconds and the command
+    """
+    return os.path.join(directory or default_dispatch_dir(), f"{user}.jobs")
+
+
+def drift_log_path(jobs_file: str) -> str:
+    """
+    :return: the drift log written by the dispatcher of the jobs file, along with it
+    """
+    return os.path.splitext(jobs_file)[0] + ".drift"
+
+
+def parse_seconds(spec: str) -> int | None:
+    """
+    Parses a sub-minute interval such as '10s'
+    :param spec: an interval as given to the cli
+    :return: the interval in seconds, or None when the spec is not a sub-minute interval
+    :raise ValueError: when the interval does not divide the minute
+    """
+    spec = str(spec).strip()
+    if not spec.endswith("s") or not spec[:-1].isdigit():
+        return None
+    seconds = int(spec[:-1])
+    if seconds not in SUBMINUTE_STEPS:
+        raise ValueError(f"the sub-minute interval must divide the minute: {', '.join(map(str, SUBMINUTE_STEPS))} "
+                         f"seconds")
+    return seconds
+
+
+def dispatch_job_id(seconds: int, command: str) -> int:
+    """
+    :return: the CRC32 of the job line, as the run record 'job_id' of the command, with the interval as
+    the same command may run at several intervals
+    """
+    return zlib.crc32(f"{seconds} {' '.join(command.split())}".encode())
+
+
+def read_jobs(path: str) -> list[tuple[int, str]]:
+    """
+    :return: the interval in seconds and the command of every job, none when the jobs file is missing
+    """
+    jobs = []
+    try:
+        with open(path, encoding="utf-8") as jobs_file:
+            for line in jobs_file:
+                seconds, _, command = line.strip().partition(" ")
+                if seconds.isdigit() and int(seconds) in SUBMINUTE_STEPS and command:
+                    jobs.append((int(seconds), command))
+    except FileNotFoundError:
+        pass
+    return jobs
+
+
+def append_drift(log_path: str, records: list[tuple]) -> None:
+    """
+    Appends the drift records of a dispatcher run with a single O_APPEND write, creating the log when needed
+    :param records: the record fields, in the DRIFT_RECORD order
+    """
+    os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+    fd = os.open(log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, b"".join(DRIFT_RECORD.pack(*fields) for fields in records))
+    finally:
+        os.close(fd)
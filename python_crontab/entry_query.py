@@ -0,0 +1,218 @@
+import csv
+import io
+import json
+import os
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+from python_crontab.build_py_cron import PYCRON_DISPATCH_SCRIPT, PYCRON_RUN_SCRIPT, BuildPyCronScript, is_pycron_script
+from python_crontab.cron_schedule import CronSchedule
+from python_crontab.cron_table import CronEntry, normalize_schedule
+from python_crontab.interfaces.icron_backend import ICronBackend
+from python_crontab.profiling import phase
+
+# What built the entry: 'script' for BuildPyCronScript, 'module' for BuildPyModuleCronScript
+KIND_SCRIPT = "script"
+KIND_MODULE = "module"
+
+
+class ManagedEntry(NamedTuple):
+    schedule: str
+    # The crontab line
+    raw: str
+    kind: str
+    interpreter: str
+    # The script, or the module path of the module entries
+    path: str
+    module: Optional[str]
+    # 'run' for the entries recorded or guarded by the 'pycron.run' wrapper, 'warm' for the
+    # 'pycron.trigger' ones, 'dispatch' for the dispatcher of the sub-minute jobs, None when the job
+    # runs straight from cron
+    runner: Optional[str]
+    overlap: Optional[str]
+    # The resource class of the 'pycron.run' entries, see 'python_crontab.run_class'
+    resource_class: Optional[str]
+
+
+def describe_entry(entry: CronEntry) -> Optional[ManagedEntry]:
+    """
+    Takes apart the command of an entry built by pycron, with or without a wrapper
+    :param entry: a crontab entry
+    :return: what the entry runs, or None when pycron did not build it
+    """
+    wrapped = BuildPyCronScript.split_command(entry.command)
+    if wrapped is None:
+        return None
+    runner = None
+    if wrapped.wrapper is not None:
+        runner = "run" if is_pycron_script(wrapped.wrapper, PYCRON_RUN_SCRIPT) else "warm"
+    command, cwd = wrapped.command, wrapped.options.get("--cwd")
+    overlap, resource_class = wrapped.options.get("--overlap"), wrapped.options.get("--class")
+    if command.startswith("cd "):
+        cd_command, _, command = command.partition(" && ")
+        cwd = cd_command[len("cd "):]
+    interpreter, _, arguments = command.partition(" ")
+    if arguments.startswith("-S ") and is_pycron_script(arguments.split()[1], PYCRON_DISPATCH_SCRIPT):
+        return ManagedEntry(entry.schedule, entry.raw, KIND_SCRIPT, interpreter, arguments.split()[1], None,
+                            "dispatch", None, None)
+    if arguments.startswith("-m ") and cwd is not None:
+        return ManagedEntry(entry.schedule, entry.raw, KIND_MODULE, interpreter, cwd, arguments[len("-m "):], runner,
+                            overlap, resource_class)
+    if not arguments:
+        return None
+    return ManagedEntry(entry.schedule, entry.raw, KIND_SCRIPT, interpreter, arguments, None, runner, overlap,
+                        resource_class)
+
+
+# The name the '--list' index is kept under on the table cache
+_INDEX_NAME = "entries"
+
+
+class EntryIndex:
+    def __init__(self, entries: Iterable[CronEntry] = ()):
+        """
+        The entries built by pycron, indexed by interpreter, path and schedule on a single pass, so the
+        queries only look at the entries of the smallest matching index. The index is plain lists and dicts,
+        kept on the table cache by 'load_entry_index'
+        @param entries: the crontab entries, such as a CronTable
+        """
+        self._rows: List[tuple] = []
+        self._interpreters: Dict[str, List[int]] = {}
+        self._paths: Dict[str, List[int]] = {}
+        self._schedules: Dict[str, List[int]] = {}
+        for entry in entries:
+            managed = describe_entry(entry)
+            if managed is None:
+                continue
+            position = len(self._rows)
+            self._rows.append(tuple(managed))
+            self._interpreters.setdefault(managed.interpreter, []).append(position)
+            self._paths.setdefault(managed.path, []).append(position)
+            self._schedules.setdefault(managed.schedule, []).append(position)
+
+    def dump(self) -> tuple:
+        return self._rows, self._interpreters, self._paths, self._schedules
+
+    @classmethod
+    def from_dump(cls, dump: tuple) -> "EntryIndex":
+        index = cls()
+        index._rows, index._interpreters, index._paths, index._schedules = dump
+        return index
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _under(self, path: str) -> Set[int]:
+        # The distinct paths are far fewer than the entries
+        path = os.path.normpath(path)
+        directory = path.rstrip(os.sep) + os.sep
+        positions: Set[int] = set()
+        for indexed_path, indexed in self._paths.items():
+            indexed_path = os.path.normpath(indexed_path)
+            if indexed_path == path or indexed_path.startswith(directory):
+                positions.update(indexed)
+        return positions
+
+    def query(self, interpreter: Optional[str] = None, path: Optional[str] = None, schedule: Optional[str] = None,
+              pattern: Optional[str] = None) -> List[ManagedEntry]:
+        """
+        Finds the entries matching every given filter
+        :param interpreter: the python interpreter running the job
+        :param path: the script or module path, or a directory holding them
+        :param schedule: an interval in minutes or a cron schedule, as given to '--insert'
+        :param pattern: a regular expression searched on the crontab line
+        :return: the matching entries, in the crontab order
+        :raise InvalidCronSchedule: when the schedule can not be understood
+        """
+        matches: List[Set[int]] = []
+        if interpreter is not None:
+            matches.append(set(self._interpreters.get(interpreter, ())))
+        if path is not None:
+            matches.append(self._under(path))
+        if schedule is not None:
+            expression = CronSchedule.from_spec(schedule).expression
+            matches.append(set(self._schedules.get(normalize_schedule(expression.split()), ())))
+        if matches:
+            matches.sort(key=len)
+            rows = [self._rows[position] for position in sorted(matches[0].intersection(*matches[1:]))]
+        else:
+            rows = self._rows
+        if pattern is not None:
+            search = re.compile(pattern).search
+            rows = [row for row in rows if search(row[1])]
+        return [tuple.__new__(ManagedEntry, row) for row in rows]
+
+
+def load_entry_index(backend: ICronBackend) -> Optional[EntryIndex]:
+    """
+    Indexes the pycron entries of a crontab. With a table cache, the index is kept on it under the digest of
+    the crontab, so a crontab whose signature did not change is not even read, and one read unchanged is
+    not indexed again
+    :param backend: the crontab storage
+    :return: the index, or None when the user has no crontab
+    """
+    cache = backend.table_cache
+    table = None
+    digest = backend.cached_digest()
+    if digest is None:
+        table, digest = backend.read_table()
+        if table is None:
+            return None
+    if cache is not None:
+        with phase("table_cache"):
+            dump = cache.load_index(backend.user, _INDEX_NAME, digest)
+        if dump is not None:
+            return EntryIndex.from_dump(dump)
+    if table is None:
+        table = backend.read_table().table
+    with phase("index"):
+        index = EntryIndex(table)
+    if cache is not None:
+        with phase("table_cache"):
+            cache.store_index(backend.user, _INDEX_NAME, digest, index.dump())
+    return index
+
+
+# The fields of the JSON and CSV outputs, besides the crontab line
+_COLUMNS = ("kind", "schedule", "interpreter", "path", "module", "runner", "overlap", "resource_class")
+
+
+def _values(managed: ManagedEntry) -> tuple:
+    return tuple(getattr(managed, column) for column in _COLUMNS)
+
+
+def _runner(managed: ManagedEntry) -> str:
+    runner = managed.runner or "-"
+    if managed.overlap is not None:
+        runner = f"{runner}:{managed.overlap}"
+    if managed.resource_class is not None:
+        runner = f"{runner}@{managed.resource_class}"
+    return runner
+
+
+def entries_table(entries: List[ManagedEntry]) -> str:
+    runners = [_runner(managed) for managed in entries]
+    runner_width = max([len("runner")] + [len(runner) for runner in runners])
+    schedule_width = max([len("schedule")] + [len(managed.schedule) for managed in entries])
+    interpreter_width = max([len("interpreter")] + [len(managed.interpreter) for managed in entries])
+    lines = [f"{'kind':<6}  {'runner':<{runner_width}}  {'schedule':<{schedule_width}}  "
+             f"{'interpreter':<{interpreter_width}}  script | module path and name"]
+    for managed, runner in zip(entries, runners):
+        target = managed.path if managed.module is None else f"{managed.path} {managed.module}"
+        lines.append(f"{managed.kind:<6}  {runner:<{runner_width}}  {managed.schedule:<{schedule_width}}  "
+                     f"{managed.interpreter:<{interpreter_width}}  {target}")
+    return "\n".join(lines)
+
+
+def entries_json(entries: List[ManagedEntry]) -> str:
+    return json.dumps([dict(zip(_COLUMNS, _values(managed)), entry=managed.raw) for managed in entries],
+                      indent=2)
+
+
+def entries_csv(entries: List[ManagedEntry]) -> str:
+    output = io.StringIO()
+    writer = csv.writer(output, lineterminator="\n")
+    writer.writerow(_COLUMNS + ("entry",))
+    for managed in entries:
+        writer.writerow(_values(managed) + (managed.raw,))
+    return output.getvalue().rstrip("\n")
@@ -0,0 +1,272 @@
+import json
+import marshal
+import os
+import stat
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from environment import CMD_TIMEOUT, VALIDATION_CACHE
+from exceptions import BashCmdFailed
+from python_crontab.entry_query import KIND_MODULE, ManagedEntry
+from python_crontab.profiling import phase
+from utilities.bash_run import executor
+
+"""
+Checks that the entries built by pycron can run at all, which cron does not tell: their output goes to
+/dev/null. The interpreter must be executable and start, the script must be a readable file, and the
+module must be importable by the interpreter from its module path, as 'cd path && python -m module'
+finds it. The paths are checked in parallel on a bounded pool, and the interpreter runs once per
+interpreter and module path for all the modules under it. What the interpreters answered is memoized
+on disk by the interpreter, module path and module, along with the mtime of every file the answer
+depended on, so it is only asked again once one of them changed
+"""
+
+# Run by the checked interpreter, which may be of any python 3 version: finds each module as
+# 'python -m' would, including the '__main__' of the packages, without running it
+_PROBE = """
+import importlib.util, json, sys
+for name in sys.argv[1:]:
+    try:
+        spec = importlib.util.find_spec(name)
+        if spec is not None and spec.submodule_search_locations is not None:
+            spec = importlib.util.find_spec(name + ".__main__")
+        error = None if spec is not None else "no module named '%s'" % name
+        origin = spec.origin if spec is not None and spec.has_location else None
+    except Exception as e:
+        error, origin = "%s: %s" % (type(e).__name__, e), None
+    print(json.dumps([name, origin, error]))
+"""
+
+_MEMO_VERSION = 1
+
+# The (file, st_mtime_ns) an answer depended on, -1 for a missing file
+Stamps = Tuple[Tuple[str, int], ...]
+# The interpreter, the module path and the module, with '' for the interpreter start check
+MemoKey = Tuple[str, str, str]
+
+
+class EntryCheck(NamedTuple):
+    managed: ManagedEntry
+    # What would keep cron from running the entry, empty when nothing
+    problems: Tuple[str, ...]
+
+    @property
+    def ok(self) -> bool:
+        return not self.problems
+
+
+def _path_problems(paths: List[Tuple[str, str]]) -> List[Tuple[Optional[str], int]]:
+    """
+    Checks paths of the entries, a single stat each
+    :param paths: the kind, 'interpreter', 'script' or 'module path', and the path
+    :return: the problem of each path, None when there is none, and its mtime as the stamps take it
+    """
+    checked = []
+    for kind, path in paths:
+        try:
+            path_stat = os.stat(path)
+        except OSError:
+            checked.append((f"the {kind} {path} does not exist", -1))
+            continue
+        problem = None
+        if kind == "interpreter" and (stat.S_ISDIR(path_stat.st_mode) or not os.access(path, os.X_OK)):
+            problem = f"the interpreter {path} is not executable"
+        elif kind == "script" and (not stat.S_ISREG(path_stat.st_mode) or not os.access(path, os.R_OK)):
+            problem = f"the script {path} is not a readable file"
+        elif kind == "module path" and not stat.S_ISDIR(path_stat.st_mode):
+            problem = f"the module path {path} is not a directory"
+        checked.append((problem, path_stat.st_mtime_ns))
+    return checked
+
+
+class EntryValidator:
+    def __init__(self, max_workers: int = 8, memo_path: Optional[str] = VALIDATION_CACHE,
+                 timeout: float = CMD_TIMEOUT):
+        """
+        Validates the entries built by pycron, see the module documentation
+        @param max_workers: how many paths are checked, and interpreters run, at once
+        @param memo_path: the file the interpreter answers are memoized on, None memoizes them in memory only
+        @param timeout: seconds an interpreter may take to answer
+        """
+        self.max_workers = max_workers
+        self.memo_path = memo_path
+        self.timeout = timeout
+        self._memo: Dict[MemoKey, Tuple[Stamps, Optional[str]]] = self._load_memo()
+        # How many interpreter runs the last 'check' took, the rest was answered by the memo
+        self.probes = 0
+        # The mtimes seen by the running 'check', each file is stat once
+        self._mtimes: Dict[str, int] = {}
+
+    def _load_memo(self) -> Dict[MemoKey, Tuple[Stamps, Optional[str]]]:
+        if self.memo_path is None:
+            return {}
+        try:
+            with open(self.memo_path, "rb") as memo_file:
+                version, memo = marshal.loads(memo_file.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return {}
+        return memo if version == _MEMO_VERSION else {}
+
+    def _store_memo(self) -> None:
+        """Replaces the memo file atomically. Failing to store it is not an error"""
+        if self.memo_path is None:
+            return
+        directory = os.path.dirname(self.memo_path) or "."
+        try:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".validation.")
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, "wb") as memo_file:
+                memo_file.write(marshal.dumps((_MEMO_VERSION, self._memo)))
+            os.replace(temp_path, self.memo_path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+    def _mtime(self, path: str) -> int:
+        mtime = self._mtimes.get(path)
+        if mtime is None:
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                mtime = -1
+            self._mtimes[path] = mtime
+        return mtime
+
+    def _memoized(self, key: MemoKey) -> Tuple[bool, Optional[str]]:
+        """
+        :return: if the memo answers the key, and its answer
+        """
+        memoized = self._memo.get(key)
+        if memoized is None:
+            return False, None
+        stamps, problem = memoized
+        if any(self._mtime(path) != mtime for path, mtime in stamps):
+            return False, None
+        return True, problem
+
+    def _probe(self, interpreter: str, module_path: str, modules: List[str]) -> Dict[MemoKey, Optional[str]]:
+        """
+        Runs the interpreter once to find the modules from the module path, or just to start without modules
+        :return: the problem of each module, None when it is importable
+        """
+        stamps: Stamps = ((interpreter, self._mtime(interpreter)),)
+        if module_path:
+            stamps += ((module_path, self._mtime(module_path)),)
+        keys = [(interpreter, module_path, module) for module in modules] or [(interpreter, "", "")]
+        try:
+            completed = executor.run([interpreter, "-c", _PROBE] + modules, timeout=self.timeout,
+                                     cwd=module_path or None)
+        except BashCmdFailed:
+            return {key: f"the interpreter {interpreter} did not answer in {self.timeout:.0f}s" for key in keys}
+        except OSError as e:
+            return {key: f"the interpreter {interpreter} does not start: {e.strerror}" for key in keys}
+        if completed.return_code != 0:
+            error = completed.stderr.strip().splitlines()[-1:] or [f"exit code {completed.return_code}"]
+            problem = f"the interpreter {interpreter} fails: {error[0]}"
+            for key in keys:
+                self._memo[key] = (stamps, problem)
+            return dict.fromkeys(keys, problem)
+
+        problems: Dict[MemoKey, Optional[str]] = {}
+        for line in completed.stdout.splitlines():
+            try:
+                module, origin, error = json.loads(line)
+            except (ValueError, TypeError):
+                continue
+            key = (interpreter, module_path, module)
+            problems[key] = f"the module {module} is not importable from {module_path}: {error}" if error else None
+            self._memo[key] = (stamps + (((origin, self._mtime(origin)),) if origin else ()), problems[key])
+        if not modules:
+            problems[keys[0]] = None
+            self._memo[keys[0]] = (stamps, None)
+        for key in keys:
+            # A module the probe did not answer for, which only a broken interpreter does
+            problems.setdefault(key, f"the interpreter {interpreter} did not check the module {key[2]}")
+        return problems
+
+    def check(self, entries: Iterable[ManagedEntry]) -> List[EntryCheck]:
+        """
+        Validates the entries, each path checked and each interpreter run once however many entries share it
+        :param entries: the entries built by pycron, as EntryIndex.query lists them
+        :return: the check of every entry, in the given order
+        """
+        entries = list(entries)
+        paths = list(dict.fromkeys(
+            [("interpreter", managed.interpreter) for managed in entries] +
+            [("module path" if managed.kind == KIND_MODULE else "script", managed.path) for managed in entries]))
+        self._mtimes = {}
+        with phase("validate"), ThreadPoolExecutor(self.max_workers) as pool:
+            # A chunk per worker, a task per path would cost more than its stat
+            chunks = [paths[start::self.max_workers] for start in range(self.max_workers)]
+            path_problems: Dict[Tuple[str, str], Optional[str]] = {}
+            for chunk, checked in zip(chunks, pool.map(_path_problems, chunks)):
+                for (kind, path), (problem, mtime) in zip(chunk, checked):
+                    path_problems[kind, path] = problem
+                    self._mtimes[path] = mtime
+
+            # Only the existing interpreters are run, and from the existing module paths
+            answers: Dict[MemoKey, Optional[str]] = {}
+            groups: Dict[Tuple[str, str], List[str]] = {}
+            for managed in entries:
+                if path_problems[("interpreter", managed.interpreter)] is not None:
+                    continue
+                if managed.kind == KIND_MODULE:
+                    if path_problems[("module path", managed.path)] is not None:
+                        continue
+                    key = (managed.interpreter, managed.path, managed.module)
+                else:
+                    key = (managed.interpreter, "", "")
+                if key in answers:
+                    continue
+                answered, answers[key] = self._memoized(key)
+                if not answered:
+                    modules = groups.setdefault(key[:2], [])
+                    if key[2]:
+                        modules.append(key[2])
+            self.probes = len(groups)
+            for problems in pool.map(lambda group: self._probe(group[0][0], group[0][1], group[1]), groups.items()):
+                answers.update(problems)
+        if groups:
+            self._store_memo()
+
+        checks = []
+        for managed in entries:
+            problems = [path_problems[("interpreter", managed.interpreter)],
+                        path_problems[("module path" if managed.kind == KIND_MODULE else "script", managed.path)]]
+            if managed.kind == KIND_MODULE:
+                problems.append(answers.get((managed.interpreter, managed.path, managed.module)))
+            else:
+                problems.append(answers.get((managed.interpreter, "", "")))
+            checks.append(EntryCheck(managed, tuple(dict.fromkeys(problem for problem in problems if problem))))
+        return checks
+
+
+def broken_report(checks: List[EntryCheck]) -> str:
+    """
+    :return: the broken entries, each one followed by its problems
+    """
+    lines = []
+    for check in checks:
+        if not check.ok:
+            lines.append(f"  {check.managed.raw}")
+            lines.extend(f"    - {problem}" for problem in check.problems)
+    return "\n".join(lines)
+
+
+def audit_table(checks: List[EntryCheck]) -> str:
+    broken = sum(not check.ok for check in checks)
+    summary = f"{len(checks)} pycron entries checked, {broken} broken"
+    return f"{summary}\n{broken_report(checks)}" if broken else summary
+
+
+def audit_json(checks: List[EntryCheck]) -> str:
+    return json.dumps([{
+        "entry": check.managed.raw,
+        "kind": check.managed.kind,
+        "ok": check.ok,
+        "problems": list(check.problems),
+    } for check in checks], indent=2)
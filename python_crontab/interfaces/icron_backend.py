@@ -0,0 +1,172 @@
+import io
+import os
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, Optional, TextIO
+
+from python_crontab.cron_table import CronTable, parse_entry
+from python_crontab.profiling import phase
+from python_crontab.snapshots import SnapshotStore
+from python_crontab.table_cache import CachedTable, Signature, TableCache
+from utilities import crontab_digest, crontab_lines, default_commit_lock_dir, file_lock, lines_digest
+
+
+class ICronBackend(ABC):
+    """
+    Interface for the storage where a user crontab is read from and written to
+    """
+    # The backend name, as given to 'make_cron_backend'
+    name = ""
+
+    def __init__(self, user: str):
+        self.user = user
+        # Snapshots the crontab replaced by every commit, None keeps no snapshot
+        self.snapshots: Optional[SnapshotStore] = None
+        # Keeps the crontab parsed between the calls, None parses it on every read
+        self.table_cache: Optional[TableCache] = None
+
+    @abstractmethod
+    def read(self) -> Optional[str]:
+        """
+        Reads the whole crontab
+        @return: the crontab content or None when the user has no crontab
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def write(self, crontab: str) -> None:
+        """
+        Replaces the whole crontab
+        @param crontab: the new crontab content
+        """
+        raise NotImplementedError
+
+    @contextmanager
+    def open_crontab(self) -> Iterator[Optional[TextIO]]:
+        """
+        Opens the crontab to be read as a file, line by line, while the context lasts. The backends
+        override it to stream the crontab instead of reading it whole
+        @return: the crontab opened in text mode, or None when the user has no crontab
+        """
+        crontab = self.read()
+        yield None if crontab is None else io.StringIO(crontab)
+
+    def write_lines(self, lines: Iterable[str]) -> None:
+        """
+        Replaces the whole crontab by the given lines, written as they come
+        @param lines: the crontab lines, without line breaks
+        """
+        self.write("\n".join(lines))
+
+    def signature(self) -> Optional[Signature]:
+        """
+        Tells if the stored crontab changed without reading it, as a stat of its file does
+        @return: a value which changes whenever the crontab does, or None when the backend can not tell
+        """
+        return None
+
+    def cached_table(self) -> Optional[CachedTable]:
+        """
+        @return: the parsed crontab from the table cache, when the signature tells it is still the stored
+        one, None otherwise. Nothing is read but the cache
+        """
+        if self.table_cache is None:
+            return None
+        signature = self.signature()
+        if signature is None:
+            return None
+        with phase("table_cache"):
+            return self.table_cache.load(self.user, signature=signature)
+
+    def cached_digest(self) -> Optional[str]:
+        """
+        @return: the 'crontab_digest' of the crontab from the table cache, when the signature tells it is still the
+        stored one, None otherwise. Only the cache header is read
+        """
+        signature = self.signature() if self.table_cache is not None else None
+        if signature is None:
+            return None
+        return self.table_cache.digest(self.user, signature)
+
+    def cached_contains(self, entry: str) -> Optional[bool]:
+        """
+        @return: if the entry is on the crontab, as the table cache tells when the signature says it is still
+        the stored one, without building the table. None when the cache can not tell
+        """
+        signature = self.signature() if self.table_cache is not None else None
+        if signature is None:
+            return None
+        with phase("table_cache"):
+            return self.table_cache.contains(self.user, signature, parse_entry(entry).key)
+
+    def read_table(self) -> CachedTable:
+        """
+        Reads the crontab parsed. With a table cache, a crontab whose signature did not change is not read
+        at all, and one read with the same digest as the cached one is not parsed again
+        @return: the table, None when the user has no crontab, and the 'crontab_digest' of the crontab
+        """
+        cached = self.cached_table()
+        if cached is not None:
+            return cached
+        # Taken before reading, so a crontab changed meanwhile does not match the cache
+        signature = self.signature() if self.table_cache is not None else None
+        crontab = self.read()
+        digest = crontab_digest(crontab)
+        if self.table_cache is not None:
+            with phase("table_cache"):
+                cached = self.table_cache.load(self.user, digest=digest)
+        if cached is None:
+            with phase("parse"):
+                cached = CachedTable(None if crontab is None else CronTable.parse(crontab), digest)
+        if self.table_cache is not None:
+            with phase("table_cache"):
+                self.table_cache.store(self.user, signature, cached)
+        return cached
+
+    @property
+    def lock_path(self) -> str:
+        """The lock serializing the pycron commits to the crontab of the user"""
+        return os.path.join(default_commit_lock_dir(), f"crontab-{self.user}.lock")
+
+    def write_if_unchanged(self, crontab: str, expected_digest: Optional[str]) -> bool:
+        """
+        Replaces the whole crontab unless it changed since it was read. The crontab is read again
+        under the commit lock, so concurrent pycron commits can not lose each other updates, and
+        snapshot on the same pass
+        @param crontab: the new crontab content
+        @param expected_digest: the 'crontab_digest' of the crontab as it was read
+        @return: if the crontab was written, False when it changed in between
+        """
+        with file_lock(self.lock_path):
+            if self._digest() != expected_digest:
+                return False
+            self._invalidate_table()
+            self.write(crontab)
+            return True
+
+    def write_lines_if_unchanged(self, lines: Callable[[], Iterable[str]], expected_digest: Optional[str]) -> bool:
+        """
+        Same as 'write_if_unchanged', streaming the new crontab
+        @param lines: gives the new crontab lines, without line breaks. Only called when the crontab is written
+        @param expected_digest: the 'crontab_digest' of the crontab as it was read
+        @return: if the crontab was written, False when it changed in between
+        """
+        with file_lock(self.lock_path):
+            if self._digest() != expected_digest:
+                return False
+            self._invalidate_table()
+            self.write_lines(lines())
+            return True
+
+    def _invalidate_table(self) -> None:
+        # Dropped before writing, so a failed write can not leave the cache on a crontab it half replaced
+        if self.table_cache is not None:
+            self.table_cache.invalidate(self.user)
+
+    def _digest(self) -> Optional[str]:
+        with self.open_crontab() as crontab:
+            if crontab is None:
+                return None
+            if self.snapshots is None:
+                return lines_digest(crontab_lines(crontab))
+            return self.snapshots.store(crontab_lines(crontab))
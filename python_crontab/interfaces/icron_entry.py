@@ -1,8 +1,9 @@
-import threading
 from abc import abstractmethod, ABC
-from typing import NoReturn, Optional
+from typing import NoReturn, Optional, Union
 
-from utilities import time_constraints, check_pkg_existence
+from python_crontab.cron_schedule import CronSchedule
+from python_crontab.interfaces.icron_backend import ICronBackend
+from utilities.cron_backend import make_cron_backend
 
 
 class ICronEntry(ABC):
@@ -12,16 +13,28 @@ class ICronEntry(ABC):
         Interface for setting a generic script entry through crontab command
         """
         self._script = ""
-        self._interval = ""
+        self._schedule: Optional[CronSchedule] = None
+
+    @property
+    def schedule(self) -> CronSchedule:
+        return self._schedule
+
+    @schedule.setter
+    def schedule(self, value: Union[str, CronSchedule]) -> None:
+        """
+        Sets when the entry runs, validating the expression
+        @param value: a compiled schedule, an interval in minutes or a cron expression / macro
+        """
+        self._schedule = value if isinstance(value, CronSchedule) else CronSchedule.from_spec(value)
 
     @property
     def interval(self) -> str:
-        return self._interval
+        """The schedule expression, kept for the interval based callers"""
+        return self._schedule.expression if self._schedule is not None else ""
 
     @interval.setter
     def interval(self, value: str) -> NoReturn:
-        time_constraints(value)
-        self._interval = value
+        self.schedule = value
 
     @property
     def script(self) -> str:
@@ -59,18 +72,17 @@ class IPyCronEntry(ICronEntry):
         self._py_interpreter = py_interpreter
 
 
-class IPyCronManager:
-    def __init__(self, pycron_builder: IPyCronEntry):
+class IPyCronManager(ABC):
+    def __init__(self, pycron_builder: IPyCronEntry, backend: Optional[ICronBackend] = None):
         """
         Manages the insertion and updating of the python script into cron
-        @warning This interface must not implement the ABC helper class due to quirks
-        related metaclass used in the concrete implementation of this interface
+        @param pycron_builder: the builder of the python script entries
+        @param backend: the crontab storage. Defaults to the one configured on the environment
         """
-        check_pkg_existence()
         super(IPyCronManager, self).__init__()
         self.successfully_command = False
         self.pycron_builder = pycron_builder
-        self.event = threading.Event()
+        self.backend = backend if backend is not None else make_cron_backend()
 
     @property
     def interval(self) -> str:
@@ -1,13 +1,25 @@
-from abc import ABC
 from functools import wraps
-from typing import List, Tuple, Callable
+from typing import List, Tuple, Callable, Optional, Union
 
-from environment import USER
-from exceptions import MinOutOfRangeException, NoPyModuleFound
+from exceptions import (NoPyModuleFound, InvalidManifest, InvalidCronBackend, InvalidCronSchedule, BashCmdFailed,
+                        CrontabConflict, DaemonError)
+from python_crontab.interfaces.icron_backend import ICronBackend
 from python_crontab.interfaces.icron_entry import IPyCronEntry, IPyCronManager
-from utilities import generate_new_crontab, check_source_existence
-from utilities.cron_script_manager import CronScriptManager
-from utilities.singleton import Singleton
+from python_crontab.cron_schedule import CronSchedule
+from python_crontab.build_py_cron import PYCRON_COMMAND_PREFIX, PYCRON_COMMAND_SUFFIX, PYCRON_DISPATCH_SCRIPT
+from python_crontab.cron_table import CronEntry, CronTable, parse_entry
+from python_crontab.dispatch_table import jobs_path, parse_seconds, read_jobs
+from python_crontab.entry_query import describe_entry
+from python_crontab.entry_validator import EntryValidator, broken_report
+from python_crontab.manifest import ManifestOp, load_manifest
+from python_crontab.placement import MinutePlanner, spread_entry
+from python_crontab.pycron_enum import PyCron
+from utilities import check_source_existence, file_lock, write_lines_atomically
+from utilities.cron_script_manager import CronScriptManager, DaemonScriptManager, StreamingCronScriptManager
+
+# Errors reported to the user as a message instead of a traceback
+HANDLED_ERRORS = (NoPyModuleFound, InvalidManifest, InvalidCronBackend, InvalidCronSchedule, BashCmdFailed,
+                  CrontabConflict, DaemonError, FileNotFoundError)
 
 
 def _error_wrapper(func: Callable[..., None]) -> Callable[..., None]:
@@ -15,22 +27,12 @@ def _error_wrapper(func: Callable[..., None]) -> Callable[..., None]:
     def inner_wrapper(*args, **kwargs):
         try:
             func(*args, **kwargs)
-        except (MinOutOfRangeException, NoPyModuleFound, FileNotFoundError) as e:
+        except HANDLED_ERRORS as e:
             print(e)
 
     return inner_wrapper
 
 
-class MetaSingletonWrapper(ABC, Singleton):
-    """
-    A Metaclass with the only purpose of comply with Python
-    inheritance and metaclass building process.
-    This metaclass is essential so that the multiple inheritance chain and
-    interface looking up mechanism properly works
-    """
-    pass
-
-
 class UpdatePyCronValues:
     """
     Holds the old and new pycron came from cron file
@@ -51,50 +53,80 @@ class UpdatePyCronValues:
         self.ready_to_update = True if len(self.old_pycron_values) != 0 else False
 
 
-class ManagePyCronScript(IPyCronManager, UpdatePyCronValues, metaclass=MetaSingletonWrapper):
-    def __init__(self, pycron_builder: IPyCronEntry):
-        super(ManagePyCronScript, self).__init__(pycron_builder)
+class ManagePyCronScript(IPyCronManager, UpdatePyCronValues):
+    def __init__(self, pycron_builder: IPyCronEntry, backend: Optional[ICronBackend] = None, spread: bool = False):
+        """
+        @param spread: if new '*/N' entries get the minute offset which keeps the peak of
+        concurrent starts lowest, and existing entries are matched on any of their offsets
+        """
+        super(ManagePyCronScript, self).__init__(pycron_builder, backend)
+        self.spread = spread
+        # If the operations go through the 'pycron.daemon' when it is running
+        self.use_daemon = True
 
     @_error_wrapper
     def update_py_specs(self, interval: str, *script) -> None:
         """
         Update the values of interval and python script in the python crontab builder
-        :param interval: the interval to update
+        :param interval: the interval in minutes or the cron schedule to update
         :param script: the python script to update
         """
         self.interval = interval
         self.set_script(*script)
 
-    def _pycron_update_builder(self) -> Tuple[str, str]:
+    def _pycron_update_builder(self, table: Optional[CronTable] = None) -> Tuple[str, str]:
         """
         Builds the old and new python script formatted to cron entry
+        :param table: the current crontab, which the entries are spread over when spreading
         :return: a tuple with the formatted python scripts
         """
         self.update_py_specs(*self.old_pycron_values)
         old_pycron = self.pycron_builder.build_cron_script()
         self.update_py_specs(*self.new_pycron_values)
         new_pycron = self.pycron_builder.build_cron_script()
+        if self.spread and table is not None:
+            old_pycron = spread_entry(table, old_pycron)
+            old_key = parse_entry(old_pycron).key
+            new_pycron = spread_entry(table, new_pycron, MinutePlanner(e for e in table if e.key != old_key))
         return old_pycron, new_pycron
 
+    def _cron_manager(self) -> Union[CronScriptManager, DaemonScriptManager]:
+        """
+        The single entry operations go through the daemon when it is running, and otherwise stream the
+        crontab, unless spreading, which needs the whole table in memory
+        """
+        if self.spread:
+            return CronScriptManager(self.pycron_builder, self.backend)
+        daemon_manager = DaemonScriptManager.connect(self.pycron_builder, self.backend) if self.use_daemon else None
+        return daemon_manager or StreamingCronScriptManager(self.pycron_builder, self.backend)
+
+    def _cached_contains(self, cron_entry: str) -> Optional[bool]:
+        """
+        :return: if the entry is on the crontab, as the table cache tells without reading the crontab. None when
+        the cache can not tell, or when spreading, which matches the entries on any of their offsets
+        """
+        return None if self.spread else self.backend.cached_contains(cron_entry)
+
     @_error_wrapper
     def init_cron(self) -> None:
-        with CronScriptManager(self.pycron_builder) as c:
+        with self._cron_manager() as c:
             if not c.some_entry_exists:
-                print(f"Generating a new cron for {USER} user...")
-                generate_new_crontab(c.crontab_gen.build_cron_script())
+                print(f"Generating a new cron for {self.backend.user} user...")
+                c.insert_new_cron()
+                c.commit()
                 self.successfully_command = True
             else:
-                print(f"{USER} user already has a cron entry. Use '--update' switch to alter existent entries")
+                print(f"{self.backend.user} user already has a cron entry. Use '--update' switch to alter existent entries")
 
     @_error_wrapper
     def update_cron(self) -> None:
         if self.ready_to_update:
-            with CronScriptManager(self.pycron_builder) as c:
+            with self._cron_manager() as c:
                 if c.some_entry_exists:
                     print("Updating the cron entry...")
-                    old_pycron, new_pycron = self._pycron_update_builder()
-                    new_script = c.update_cron(old_pycron, new_pycron)
-                    generate_new_crontab(new_script)
+                    old_pycron, new_pycron = self._pycron_update_builder(c.cron_table if self.spread else None)
+                    c.update_cron(old_pycron, new_pycron)
+                    c.commit()
                     if not c.was_entry_modified:
                         print("No correspondent cron entry found to be updated")
                         return
@@ -104,26 +136,41 @@ class ManagePyCronScript(IPyCronManager, UpdatePyCronValues, metaclass=MetaSingl
 
     @_error_wrapper
     def insert_new_cron(self) -> None:
-        with CronScriptManager(self.pycron_builder) as c:
-            if c.some_entry_exists:
+        if self._cached_contains(self.pycron_builder.build_cron_script()):
+            print("Inserting a new cron entry...")
+            print("This cron entry already exists")
+            return
+        with self._cron_manager() as c:
+            # The daemon inserts into a missing crontab too. Initializing it through another connection would
+            # find the changes of the other clients pending and refuse, losing the entry
+            if c.some_entry_exists or isinstance(c, DaemonScriptManager):
                 print("Inserting a new cron entry...")
-                new_script = c.insert_new_cron()
-                generate_new_crontab(new_script)
+                new_pycron = self.pycron_builder.build_cron_script()
+                if self.spread:
+                    new_pycron = spread_entry(c.cron_table, new_pycron, MinutePlanner(c.cron_table))
+                    print(f"Spread to '{parse_entry(new_pycron).schedule}'")
+                c.insert_new_cron(new_pycron)
+                c.commit()
                 if c.was_entry_modified:
                     print("This cron entry already exists")
                     return
                 self.successfully_command = True
             else:
-                print(f"No entry found. Initializing the a cron entry for {USER} user...")
+                print(f"No entry found. Initializing the a cron entry for {self.backend.user} user...")
                 self.init_cron()
 
     @_error_wrapper
     def remove_cron_entry(self) -> None:
-        with CronScriptManager(self.pycron_builder) as c:
+        if self._cached_contains(self.pycron_builder.build_cron_script()) is False:
+            print("Removing the cron entry...")
+            print("No entry found to be deleted with provided parameters")
+            return
+        with self._cron_manager() as c:
             if c.some_entry_exists:
                 print("Removing the cron entry...")
-                new_script = c.remove_cron_entry()
-                generate_new_crontab(new_script)
+                cron_entry = self.pycron_builder.build_cron_script()
+                c.remove_cron_entry(spread_entry(c.cron_table, cron_entry) if self.spread else cron_entry)
+                c.commit()
                 if not c.was_entry_modified:
                     print("No entry found to be deleted with provided parameters")
                     return
@@ -141,3 +188,242 @@ class ManagePyModuleCronScript(ManagePyCronScript):
             super().set_script(f"cd {py_path} && {self.pycron_builder.py_interpreter} -m {py_module}")
         except ValueError:
             raise NoPyModuleFound
+
+
+class ManageSubMinuteJobs:
+    def __init__(self, manager: ManagePyCronScript, jobs_file: Optional[str] = None):
+        """
+        Manages the jobs running more than once a minute, with an interval in seconds such as '10s'. They
+        are kept on a jobs file launched by the 'pycron.dispatch' dispatcher, which a single crontab entry
+        runs every minute, so the crontab gets one entry however many sub-minute jobs there are
+        @param manager: builds the job commands, as it builds the entries, and keeps the dispatcher entry
+        @param jobs_file: the jobs file, the one of the crontab owner on $PYCRON_DISPATCH_DIR by default
+        """
+        self.manager = manager
+        self.jobs_file = jobs_file or jobs_path(manager.backend.user)
+        self.successfully_command = False
+
+    @staticmethod
+    def is_subminute(values: List[str]) -> bool:
+        """
+        :param values: the interval and the python script [module] given to the cli
+        """
+        try:
+            return parse_seconds(values[0]) is not None
+        except ValueError:
+            return True
+
+    def _job(self, values: List[str]) -> Tuple[int, str]:
+        """
+        :return: the interval in seconds and the command of the job, as cron would run it
+        """
+        try:
+            seconds = parse_seconds(values[0])
+        except ValueError as e:
+            raise InvalidCronSchedule(values[0], str(e))
+        if seconds is None:
+            raise InvalidCronSchedule(values[0], "both intervals must be in seconds to update a sub-minute job")
+        self.manager.interval = "* * * * *"
+        self.manager.set_script(*values[1:])
+        return seconds, parse_entry(self.manager.pycron_builder.build_cron_script()).command
+
+    def _is_dispatcher(self, entry: CronEntry) -> bool:
+        return PYCRON_DISPATCH_SCRIPT in entry.command and f" --jobs {self.jobs_file} " in entry.command
+
+    def _sync_dispatcher(self, has_jobs: bool) -> None:
+        """
+        Keeps a single dispatcher entry on the crontab while there are jobs, and none once there are not
+        """
+        dispatcher = (f"* * * * * {PYCRON_COMMAND_PREFIX} {self.manager.pycron_builder.py_interpreter} -S "
+                      f"{PYCRON_DISPATCH_SCRIPT} --jobs {self.jobs_file} {PYCRON_COMMAND_SUFFIX}")
+        dispatcher_key = parse_entry(dispatcher).key
+        with CronScriptManager(self.manager.pycron_builder, self.manager.backend) as c:
+            for entry in [entry for entry in c.cron_table if self._is_dispatcher(entry)]:
+                if not has_jobs or entry.key != dispatcher_key:
+                    c.remove_cron_entry(entry.raw)
+            if has_jobs:
+                c.insert_new_cron(dispatcher)
+            c.commit()
+
+    def _change(self, change: Callable[[List[Tuple[int, str]]], bool]) -> bool:
+        """
+        Changes the jobs file and the dispatcher entry, serialized with the other changes of the jobs file.
+        A dispatcher without jobs launches nothing, while jobs without a dispatcher silently never run, so
+        the dispatcher entry is written before the jobs and removed after them
+        :param change: changes the jobs in place
+        :return: what the change returned
+        """
+        with file_lock(self.jobs_file + ".lock"):
+            jobs = read_jobs(self.jobs_file)
+            if not change(jobs):
+                return False
+            if jobs:
+                self._sync_dispatcher(True)
+            write_lines_atomically(self.jobs_file, (f"{seconds} {command}" for seconds, command in jobs))
+            if not jobs:
+                self._sync_dispatcher(False)
+            return True
+
+    @_error_wrapper
+    def insert_new_cron(self, values: List[str]) -> None:
+        job = self._job(values)
+        print("Inserting a new sub-minute job...")
+
+        def insert(jobs: List[Tuple[int, str]]) -> bool:
+            if job in jobs:
+                return False
+            jobs.append(job)
+            return True
+
+        if not self._change(insert):
+            print("This sub-minute job already exists")
+            return
+        self.successfully_command = True
+
+    @_error_wrapper
+    def remove_cron_entry(self, values: List[str]) -> None:
+        job = self._job(values)
+        print("Removing the sub-minute job...")
+
+        def remove(jobs: List[Tuple[int, str]]) -> bool:
+            kept = [kept_job for kept_job in jobs if kept_job != job]
+            removed = len(kept) != len(jobs)
+            jobs[:] = kept
+            return removed
+
+        if not self._change(remove):
+            print("No sub-minute job found to be deleted with provided parameters")
+            return
+        self.successfully_command = True
+
+    @_error_wrapper
+    def update_cron(self, old_values: List[str], new_values: List[str]) -> None:
+        old_job, new_job = self._job(old_values), self._job(new_values)
+        print("Updating the sub-minute job...")
+
+        def replace(jobs: List[Tuple[int, str]]) -> bool:
+            if old_job not in jobs:
+                return False
+            jobs[:] = [new_job if job == old_job else job for job in jobs if job != new_job or old_job == new_job]
+            return True
+
+        if not self._change(replace):
+            print("No correspondent sub-minute job found to be updated")
+            return
+        self.successfully_command = True
+
+
+class ManifestSummary:
+    """
+    Holds the cron entries touched by a batch manifest, grouped by outcome
+    """
+
+    def __init__(self):
+        self.added: List[str] = []
+        self.removed: List[str] = []
+        self.updated: List[str] = []
+        self.unchanged: List[str] = []
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.added or self.removed or self.updated)
+
+    def __str__(self) -> str:
+        lines = [f"Added: {len(self.added)}, removed: {len(self.removed)}, "
+                 f"updated: {len(self.updated)}, unchanged: {len(self.unchanged)}"]
+        for title, entries in (("+", self.added), ("-", self.removed), ("~", self.updated), ("=", self.unchanged)):
+            lines.extend(f"  {title} {entry}" for entry in entries)
+        return "\n".join(lines)
+
+
+class ManagePyCronManifest:
+    def __init__(self, script_manager: ManagePyCronScript, module_manager: ManagePyModuleCronScript,
+                 spread: bool = False, validator: Optional[EntryValidator] = None):
+        """
+        Applies every operation of a batch manifest over a single crontab read and a single crontab write
+        @param script_manager: the manager used to build the python script entries
+        @param module_manager: the manager used to build the python module entries
+        @param spread: if the inserted '*/N' entries are spread over the minutes, each one
+        placed over the load left by the operations before it
+        @param validator: checks the inserted and updated entries can run before the crontab is read,
+        None applies them unchecked
+        """
+        self.script_manager = script_manager
+        self.module_manager = module_manager
+        self.spread = spread
+        self.validator = validator
+        self._planner: Optional[MinutePlanner] = None
+        self.successfully_command = False
+        self.summary = ManifestSummary()
+
+    def _build_entry(self, values: List[str]) -> str:
+        """
+        Builds the formatted cron entry of a manifest operation
+        :param values: the schedule and the python script [module] of the entry
+        :return: the formatted cron entry
+        """
+        manager = self.module_manager if ManifestOp.is_module(values) else self.script_manager
+        manager.interval = values[0]
+        manager.set_script(*values[1:])
+        return manager.pycron_builder.build_cron_script()
+
+    def _validate(self, ops: List[ManifestOp]) -> None:
+        """
+        Checks every entry the manifest inserts or updates to, all at once
+        :raise InvalidManifest: when some entry would fail to run
+        """
+        new_entries = (self._build_entry(op.values) for op in ops if op.action is not PyCron.DELETE)
+        checks = self.validator.check(describe_entry(parse_entry(entry)) for entry in dict.fromkeys(new_entries))
+        broken = sum(not check.ok for check in checks)
+        if broken:
+            raise InvalidManifest(f"{broken} of its entries would not run, nothing was applied\n"
+                                  f"{broken_report(checks)}")
+
+    def _unload(self, cron_entry: str) -> None:
+        """Takes an entry which left the table out of the spread load"""
+        if self._planner is not None:
+            self._planner.remove(CronSchedule.parse(parse_entry(cron_entry).schedule))
+
+    def _apply_op(self, c: CronScriptManager, op: ManifestOp) -> None:
+        new_pycron = self._build_entry(op.values)
+        if op.action is PyCron.INSERT:
+            if self._planner is not None:
+                new_pycron = spread_entry(c.cron_table, new_pycron, self._planner)
+            c.insert_new_cron(new_pycron)
+            (self.summary.unchanged if c.was_entry_modified else self.summary.added).append(new_pycron)
+        elif op.action is PyCron.DELETE:
+            if self._planner is not None:
+                new_pycron = spread_entry(c.cron_table, new_pycron)
+            c.remove_cron_entry(new_pycron)
+            if c.was_entry_modified:
+                self._unload(new_pycron)
+            (self.summary.removed if c.was_entry_modified else self.summary.unchanged).append(new_pycron)
+        else:
+            old_pycron = self._build_entry(op.old_values)
+            if self._planner is not None:
+                old_pycron = spread_entry(c.cron_table, old_pycron)
+                if c.cron_table.get(old_pycron) is not None:
+                    self._unload(old_pycron)
+                    new_pycron = spread_entry(c.cron_table, new_pycron, self._planner)
+            c.update_cron(old_pycron, new_pycron)
+            (self.summary.updated if c.was_entry_modified else self.summary.unchanged).append(new_pycron)
+
+    @_error_wrapper
+    def apply(self, manifest_path: str) -> None:
+        """
+        Applies the manifest operations in memory, in order, and writes the resulting crontab once
+        :param manifest_path: the path to the JSON or TOML manifest
+        """
+        ops = load_manifest(manifest_path)
+        if self.validator is not None:
+            self._validate(ops)
+        self.summary = ManifestSummary()
+        with CronScriptManager(self.script_manager.pycron_builder, self.script_manager.backend) as c:
+            print(f"Applying {len(ops)} manifest operations to the {c.backend.user} user crontab...")
+            self._planner = MinutePlanner(c.cron_table) if self.spread else None
+            for op in ops:
+                self._apply_op(c, op)
+            if self.summary.has_changes:
+                c.commit()
+        print(self.summary)
+        self.successfully_command = True
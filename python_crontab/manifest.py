@@ -0,0 +1,96 @@
+import json
+import os
+from typing import Any, Dict, List, NamedTuple
+
+from exceptions import InvalidManifest
+from python_crontab.pycron_enum import PyCron, SubPyCron
+from python_crontab.cron_schedule import CronSchedule
+from utilities import check_source_existence
+
+try:
+    import tomllib as _toml
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as _toml
+    except ImportError:
+        _toml = None
+
+_MANIFEST_ACTIONS = {str(PyCron.INSERT): PyCron.INSERT,
+                     str(PyCron.DELETE): PyCron.DELETE,
+                     str(PyCron.UPDATE): PyCron.UPDATE}
+
+
+class ManifestOp(NamedTuple):
+    """
+    A single crontab operation read from a batch manifest. The values follow the same
+    layout of the cli switches: [schedule, script] or [schedule, module path, module name]
+    """
+    action: PyCron
+    values: List[str]
+    old_values: List[str] = []
+
+    @staticmethod
+    def is_module(values: List[str]) -> bool:
+        return len(values) == 3
+
+
+def _entry_values(entry: Dict[str, Any], position: int) -> List[str]:
+    """
+    Converts a manifest entry table into the list of values used by the cron managers
+    :param entry: the manifest entry holding 'interval' or 'schedule', 'script' and optionally 'module'
+    :param position: the entry position, used on error messages
+    :return: the list of values
+    """
+    if not isinstance(entry, dict) or "script" not in entry or not ("interval" in entry or "schedule" in entry):
+        raise InvalidManifest(f"entry #{position} must define 'script' and either 'interval' or 'schedule'")
+    values = [str(entry.get("schedule", entry.get("interval"))), str(entry["script"])]
+    CronSchedule.from_spec(values[0])
+    if entry.get("module"):
+        check_source_existence(values[1])
+        values.append(str(entry["module"]))
+    return values
+
+
+def _read_manifest(manifest_path: str) -> Dict[str, Any]:
+    check_source_existence(manifest_path)
+    extension = os.path.splitext(manifest_path)[1].lower()
+    try:
+        if extension == ".json":
+            with open(manifest_path, encoding="utf-8") as manifest:
+                return json.load(manifest)
+        if extension == ".toml":
+            if _toml is None:
+                raise InvalidManifest("TOML manifests require Python 3.11+ or the 'tomli' package")
+            with open(manifest_path, "rb") as manifest:
+                return _toml.load(manifest)
+    except ValueError as e:
+        raise InvalidManifest(str(e))
+    raise InvalidManifest(f"unsupported manifest extension '{extension}' (use .json or .toml)")
+
+
+def load_manifest(manifest_path: str) -> List[ManifestOp]:
+    """
+    Reads a JSON or TOML manifest with a list of 'ops'. Each op has an 'op' key
+    (insert, delete or update); insert and delete ops hold 'interval' (minutes) or 'schedule'
+    (cron expression or macro), 'script' and
+    optionally 'module', while update ops hold the same keys inside 'old' and 'new' tables
+    :param manifest_path: the path to the manifest file
+    :return: the validated list of operations, in the manifest order
+    """
+    content = _read_manifest(manifest_path)
+    entries = content.get("ops") if isinstance(content, dict) else None
+    if not isinstance(entries, list):
+        raise InvalidManifest("the manifest must hold a list of 'ops'")
+
+    ops: List[ManifestOp] = []
+    for position, entry in enumerate(entries, start=1):
+        action = _MANIFEST_ACTIONS.get(str(entry.get("op", "")).lower()) if isinstance(entry, dict) else None
+        if action is None:
+            raise InvalidManifest(f"entry #{position} must have an 'op' of {', '.join(_MANIFEST_ACTIONS)}")
+        if action is PyCron.UPDATE:
+            ops.append(ManifestOp(action,
+                                  _entry_values(entry.get(str(SubPyCron.NEW)), position),
+                                  _entry_values(entry.get(str(SubPyCron.OLD)), position)))
+        else:
+            ops.append(ManifestOp(action, _entry_values(entry, position)))
+    return ops
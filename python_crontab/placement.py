@@ -0,0 +1,161 @@
+import re
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from exceptions import InvalidCronSchedule
+from python_crontab.build_py_cron import BuildPyCronScript
+from python_crontab.cron_schedule import CronSchedule
+from python_crontab.cron_table import CronEntry, CronTable, parse_entry
+from python_crontab.simulate import ScheduleSimulation, bit_positions, horizon_mask
+
+# The load is measured over a fixed week, starting on a monday, so placing the
+# same entries over the same table always gives the same result
+REFERENCE_START = datetime(2024, 1, 1)
+REFERENCE_MINUTES = 7 * 24 * 60
+
+_STEP_MINUTES = re.compile(r"^(?:\*|(\d+)-59)/(\d+)$")
+
+
+class SpreadFamily(NamedTuple):
+    """
+    The '*/N' schedules and all of their offset variants ('3-59/N') share the step and the other fields
+    """
+    step: int
+    other_fields: str
+
+    def with_offset(self, offset: int) -> CronSchedule:
+        minute = f"*/{self.step}" if offset == 0 else f"{offset}-59/{self.step}"
+        return CronSchedule.parse(f"{minute} {self.other_fields}")
+
+
+def spread_family(schedule: CronSchedule) -> Optional[SpreadFamily]:
+    """
+    :return: the family of a '*/N' or 'O-59/N' schedule, or None for the schedules which can not be spread
+    """
+    fields = schedule.expression.split()
+    step_match = _STEP_MINUTES.match(fields[0]) if len(fields) == 5 else None
+    if step_match is None or not 2 <= int(step_match.group(2)) <= 59:
+        return None
+    step = int(step_match.group(2))
+    if int(step_match.group(1) or 0) >= step:
+        return None
+    return SpreadFamily(step, " ".join(fields[1:]))
+
+
+class MinutePlanner:
+    def __init__(self, entries: Iterable[CronEntry]):
+        """
+        Keeps how many jobs start on each minute of a reference week and picks the minute
+        offset of new '*/N' schedules so the peak of concurrent starts stays as low as possible
+        @param entries: the entries already on the crontab
+        """
+        self.counts = ScheduleSimulation(entries, REFERENCE_MINUTES // 60, REFERENCE_START).counts
+        self._patterns: Dict[tuple, int] = {}
+
+    def _fires(self, schedule: CronSchedule) -> List[int]:
+        return list(bit_positions(horizon_mask(schedule, REFERENCE_START, REFERENCE_MINUTES, self._patterns)))
+
+    def add(self, schedule: CronSchedule, weight: int = 1) -> None:
+        for minute in self._fires(schedule):
+            self.counts[minute] += weight
+
+    def remove(self, schedule: CronSchedule) -> None:
+        self.add(schedule, -1)
+
+    @property
+    def peak(self) -> int:
+        return max(self.counts, default=0)
+
+    def place(self, schedule: CronSchedule) -> CronSchedule:
+        """
+        Chooses the offset with the lowest peak of concurrent starts, then the fewest overall
+        collisions, then the smallest offset, and adds the placed schedule to the load
+        :param schedule: the schedule to place. Those which are not '*/N' are kept as they are
+        :return: the placed schedule
+        """
+        family = spread_family(schedule)
+        if family is not None:
+            best: Optional[Tuple[Tuple[int, int, int], CronSchedule]] = None
+            for offset in range(family.step):
+                candidate = family.with_offset(offset)
+                fires = self._fires(candidate)
+                if not fires:
+                    continue
+                cost = (max(self.counts[minute] for minute in fires), sum(self.counts[minute] for minute in fires),
+                        offset)
+                if best is None or cost < best[0]:
+                    best = (cost, candidate)
+            schedule = best[1] if best is not None else schedule
+        self.add(schedule)
+        return schedule
+
+
+def find_placed(table: CronTable, schedule: CronSchedule, command: str) -> Optional[CronEntry]:
+    """
+    Finds the entry running the command on any offset of the schedule family
+    :param table: the crontab
+    :param schedule: the requested schedule, usually '*/N'
+    :param command: the entry command
+    :return: the placed entry or None when the command is not on the table with that family
+    """
+    family = spread_family(schedule)
+    for entry in table.entries_for_command(command):
+        if entry.schedule == schedule.expression:
+            return entry
+        try:
+            if family is not None and spread_family(CronSchedule.parse(entry.schedule)) == family:
+                return entry
+        except InvalidCronSchedule:
+            continue
+    return None
+
+
+def rebalance(table: CronTable) -> List[Tuple[CronEntry, CronEntry]]:
+    """
+    Places again every pycron managed '*/N' entry over the load of the other entries. The most
+    frequent entries are placed first, then the table order is followed
+    :param table: the crontab, changed in place
+    :return: the (old, new) pairs of the entries which moved
+    """
+    movable: List[Tuple[int, int, CronEntry, SpreadFamily]] = []
+    fixed: List[CronEntry] = []
+    for position, entry in enumerate(table):
+        family = None
+        if BuildPyCronScript.is_managed(entry.command):
+            try:
+                family = spread_family(CronSchedule.parse(entry.schedule))
+            except InvalidCronSchedule:
+                pass
+        if family is None:
+            fixed.append(entry)
+        else:
+            movable.append((family.step, position, entry, family))
+
+    planner = MinutePlanner(fixed)
+    moves = []
+    for _, _, entry, family in sorted(movable, key=lambda item: item[:2]):
+        placed = planner.place(family.with_offset(0))
+        if placed.expression != entry.schedule:
+            new_entry = entry._replace(schedule=placed.expression, raw=f"{placed.expression} {entry.command}")
+            table.replace(entry, new_entry)
+            moves.append((entry, new_entry))
+    return moves
+
+
+def spread_entry(table: CronTable, cron_entry: str, planner: Optional[MinutePlanner] = None) -> str:
+    """
+    Resolves a built '*/N' entry against the placements already on the table
+    :param table: the crontab
+    :param cron_entry: the entry as built by the pycron builders
+    :param planner: the load used to place the entry when its command is not on the table yet.
+    Without it the entry is only resolved, which is what deleting and updating need
+    :return: the entry already placed for the command, the newly placed entry or the entry unchanged
+    """
+    entry = parse_entry(cron_entry)
+    schedule = CronSchedule.parse(entry.schedule)
+    placed = find_placed(table, schedule, entry.command)
+    if placed is not None:
+        return placed.raw
+    if planner is None:
+        return cron_entry
+    return f"{planner.place(schedule).expression} {entry.command}"
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import os
+import struct
+
+"""
+The messages between the 'pycron.trigger' client of the warm entries and the 'pycron.pool' daemon.
+A request is a length prefixed list of NUL separated strings, which can not be part of an argument
+or an environment variable, sent along with the stdin, stdout and stderr descriptors of the trigger.
+The pool replies STARTED once the job is forked, then the job exit code, negative when the job was
+killed by a signal, or only DECLINED when it does not run the job
+"""
+
+POOL_SOCKET_VARIABLE = "PYCRON_POOL_SOCKET"
+PROTOCOL_VERSION = "2"
+
+JOB_SCRIPT = "script"
+JOB_MODULE = "module"
+
+LENGTH = struct.Struct("<I")
+STATUS = struct.Struct("<i")
+# Replied instead of an exit code when the pool does not run the job, which is then run cold
+DECLINED = -(2 ** 31)
+# Replied before the exit code, from then on the job is not run cold, as it may have run already
+STARTED = DECLINED + 1
+
+
+def default_pool_socket() -> str:
+    return os.environ.get(POOL_SOCKET_VARIABLE) or os.path.join(os.path.expanduser("~"), ".pycron", "pool.sock")
+
+
+class JobRequest:
+    __slots__ = ("interpreter", "kind", "target", "args", "cwd", "env")
+
+    def __init__(self, interpreter: str, kind: str, target: str, args: list[str], cwd: str, env: dict[str, str]):
+        """
+        A job the trigger asks the pool to run
+        @param interpreter: the python interpreter of the crontab entry, the pool only runs the jobs of its own
+        @param kind: 'script' to run a file, 'module' to run a module as 'python -m' does
+        @param target: the script path or the module name
+        @param args: the job arguments
+        @param cwd: the job working directory
+        @param env: the job environment
+        """
+        self.interpreter = interpreter
+        self.kind = kind
+        self.target = target
+        self.args = args
+        self.cwd = cwd
+        self.env = env
+
+    @property
+    def argv(self) -> list[str]:
+        return [self.interpreter] + (["-m"] if self.kind == JOB_MODULE else []) + [self.target] + self.args
+
+    def encode(self) -> bytes:
+        fields = [PROTOCOL_VERSION, self.interpreter, self.kind, self.target, self.cwd, str(len(self.args))]
+        fields += self.args
+        fields += [f"{name}={value}" for name, value in self.env.items()]
+        payload = "\0".join(fields).encode("utf-8", "surrogateescape")
+        return LENGTH.pack(len(payload)) + payload
+
+    @staticmethod
+    def decode(payload: bytes) -> "JobRequest":
+        """
+        :param payload: the request without its length prefix
+        :raise ValueError: when the request is malformed or of some other protocol version
+        """
+        fields = payload.decode("utf-8", "surrogateescape").split("\0")
+        if len(fields) < 6 or fields[0] != PROTOCOL_VERSION or fields[2] not in (JOB_SCRIPT, JOB_MODULE):
+            raise ValueError("not a pycron job request")
+        _, interpreter, kind, target, cwd, arg_count = fields[:6]
+        args_end = 6 + int(arg_count)
+        env = dict(variable.split("=", 1) for variable in fields[args_end:])
+        return JobRequest(interpreter, kind, target, fields[6:args_end], cwd, env)
+
+
+def request_length(header: bytes) -> int:
+    return LENGTH.unpack_from(header)[0] + LENGTH.size
+
+
+def recv_exactly(sock, size: int, received: bytes = b"") -> bytes:
+    """
+    Receives until 'size' bytes are there
+    :param sock: the connected socket
+    :param size: the message size
+    :param received: the start of the message, when already received
+    :raise ConnectionError: when the peer closes the connection before
+    """
+    data = bytearray(received)
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("the connection was closed in the middle of a message")
+        data += chunk
+    return bytes(data)
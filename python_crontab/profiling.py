@@ -0,0 +1,137 @@
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import ContextManager, Dict, Iterator, List, Optional
+
+"""
+Per phase timings of a cli call, turned on by '--profile' or $PYCRON_PROFILE. The phases are only
+recorded while a profile is running: otherwise 'phase' hands back a shared no-op context, so the
+instrumented code costs nothing. The cli hands 'Profile.add_command' to the bash executor to record
+the commands.
+This module is imported on every cli call and must stay cheap: json and cProfile are only
+imported when profiling
+"""
+
+# Where the profile goes to stand for stderr
+PROFILE_STDERR = "-"
+
+_NO_PHASE = nullcontext()
+
+
+class Profile:
+    def __init__(self, started: Optional[float] = None, dump_path: Optional[str] = None):
+        """
+        Collects the phases and the commands run during a cli call
+        @param started: the perf_counter time the call started, now by default
+        @param dump_path: where the cProfile stats of the call are dumped, None does not run cProfile
+        """
+        self.started = time.perf_counter() if started is None else started
+        self.dump_path = dump_path
+        self.phases: List[Dict] = []
+        self.commands: List[Dict] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._cprofile = None
+        if dump_path is not None:
+            import cProfile
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def _ms(self, perf_time: float) -> float:
+        return round((perf_time - self.started) * 1000, 3)
+
+    def _stack(self) -> List[str]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def add_phase(self, name: str, start: float, end: float) -> None:
+        """
+        Records a phase timed outside of a 'phase' context, such as the argument parsing
+        """
+        with self._lock:
+            self.phases.append({"phase": name, "thread": threading.current_thread().name,
+                                "depth": len(self._stack()), "start_ms": self._ms(start),
+                                "elapsed_ms": round((end - start) * 1000, 3)})
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        stack = self._stack()
+        start = time.perf_counter()
+        stack.append(name)
+        try:
+            yield
+        finally:
+            stack.pop()
+            self.add_phase(name, start, time.perf_counter())
+
+    def add_command(self, commands: List[str], return_code: Optional[int], elapsed: float) -> None:
+        stack = self._stack()
+        with self._lock:
+            self.commands.append({"command": " ".join(commands), "return_code": return_code,
+                                  "phase": stack[-1] if stack else None, "thread": threading.current_thread().name,
+                                  "start_ms": self._ms(time.perf_counter() - elapsed),
+                                  "elapsed_ms": round(elapsed * 1000, 3)})
+
+    def report(self) -> Dict:
+        """
+        :return: the profile with the phases and commands in start order, and the total time per phase
+        """
+        totals: Dict[str, float] = {}
+        for phase_time in self.phases:
+            totals[phase_time["phase"]] = round(totals.get(phase_time["phase"], 0) + phase_time["elapsed_ms"], 3)
+        return {
+            "argv": sys.argv,
+            "total_ms": self._ms(time.perf_counter()),
+            "phase_totals_ms": totals,
+            "commands_run": len(self.commands),
+            "commands_ms": round(sum(command["elapsed_ms"] for command in self.commands), 3),
+            "phases": sorted(self.phases, key=lambda phase_time: phase_time["start_ms"]),
+            "commands": self.commands,
+        }
+
+    def finish(self, output: str) -> None:
+        """
+        Stops cProfile, dumping its stats, and writes the profile as JSON
+        :param output: the file the profile is written to, or '-' for stderr
+        """
+        import json
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.dump_path)
+        report = json.dumps(self.report(), indent=2)
+        if output == PROFILE_STDERR:
+            print(report, file=sys.stderr)
+        else:
+            with open(output, "w", encoding="utf-8") as profile_file:
+                profile_file.write(report + "\n")
+
+
+_profile: Optional[Profile] = None
+
+
+def phase(name: str) -> ContextManager[None]:
+    """
+    Times the code run inside the context as a phase of the running profile
+    :param name: the phase name
+    """
+    return _NO_PHASE if _profile is None else _profile.phase(name)
+
+
+@contextmanager
+def profiling(output: str, dump_path: Optional[str] = None, started: Optional[float] = None) -> Iterator[Profile]:
+    """
+    Profiles the code run inside the context, writing the profile once it ends, even on errors
+    :param output: the file the JSON profile is written to, or '-' for stderr
+    :param dump_path: where the cProfile stats are dumped (read them with 'python -m pstats'), None skips cProfile
+    :param started: the perf_counter time the profiled call started, now by default
+    """
+    global _profile
+    _profile = Profile(started, dump_path)
+    try:
+        yield _profile
+    finally:
+        profile, _profile = _profile, None
+        profile.finish(output)
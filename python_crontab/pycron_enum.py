@@ -16,6 +16,38 @@ class PyCron(_EnumMixin, Enum):
     UPDATE = "update"
     DELETE = "delete"
     MODULE = "module"
+    APPLY = "apply"
+    BACKEND = "backend"
+    SPOOL_DIR = "spool-dir"
+    SIMULATE = "simulate"
+    SPREAD = "spread"
+    REBALANCE = "rebalance"
+    RECORD = "record"
+    OVERLAP = "overlap"
+    STATUS = "status"
+    RUN_LOG = "run-log"
+    STATS = "stats"
+    FORMAT = "format"
+    OUTPUT = "output"
+    WARM = "warm"
+    USERS = "users"
+    ALL_USERS = "all-users"
+    MAX_PARALLEL = "max-parallel"
+    PROFILE = "profile"
+    PROFILE_DUMP = "profile-dump"
+    HISTORY = "history"
+    DIFF = "diff"
+    ROLLBACK = "rollback"
+    NO_DAEMON = "no-daemon"
+    LIST = "list"
+    PATH = "path"
+    SCHEDULE = "schedule"
+    MATCH = "match"
+    AUDIT = "audit"
+    NO_VALIDATE = "no-validate"
+    DISPATCH = "dispatch"
+    CLASS = "class"
+    CLASSES = "classes"
 
 
 class SubPyCron(_EnumMixin, Enum):
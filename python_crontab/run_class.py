@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+import fcntl
+import os
+import struct
+import time
+import zlib
+
+"""
+The resource classes of the 'pycron.run' wrapper: a class caps how many of its jobs run at once on the
+host, and may lower their cpu and io priority or pin them to some cpus. The classes are defined on a
+classes file, a class per line:
+
+    # name  max=N [nice=N] [ionice=idle|best-effort[:0-7]|realtime[:0-7]] [cpus=0-3,6]
+    heavy   max=2 nice=10 ionice=idle cpus=0-3
+
+A class admits its jobs through a semaphore of flock()ed slot files, one per concurrent job, on a
+directory shared by every user of the host. A job finding no free slot waits on the class queue lock,
+and the first one in the queue polls the slots, so a burst of fires waits in a bounded queue instead
+of starting at once. How long the jobs waited is appended to the wait log
+"""
+
+CLASSES_VARIABLE = "PYCRON_CLASSES"
+SLOT_DIR_VARIABLE = "PYCRON_SLOT_DIR"
+
+# queued at (wall time), waited (seconds), job id, class id
+WAIT_RECORD = struct.Struct("<ddII")
+
+# The first in the queue polls the slots every POLL_START seconds, doubling up to POLL_MAX
+POLL_START = 0.01
+POLL_MAX = 0.25
+
+# The ionice scheduling classes, by the names the classes file takes
+IONICE_CLASSES = {"realtime": "1", "best-effort": "2", "idle": "3"}
+
+
+def default_classes_file() -> str:
+    return os.environ.get(CLASSES_VARIABLE) or os.path.join(os.path.expanduser("~"), ".pycron", "classes")
+
+
+def default_slot_dir() -> str:
+    # Host wide, the slots are shared by the jobs of every user
+    return os.environ.get(SLOT_DIR_VARIABLE) or "/tmp/pycron-slots"
+
+
+def wait_log_path(run_log: str) -> str:
+    """
+    :return: the wait log of the wrapper writing the run log, along with it
+    """
+    return os.path.splitext(run_log)[0] + ".waits"
+
+
+def class_id(name: str) -> int:
+    return zlib.crc32(name.encode())
+
+
+def _parse_cpus(spec: str) -> list[int]:
+    cpus = []
+    for part in spec.split(","):
+        first, _, last = part.partition("-")
+        cpus.extend(range(int(first), int(last or first) + 1))
+    if not cpus:
+        raise ValueError(f"'{spec}' is not a cpu list such as 0-3,6")
+    return cpus
+
+
+def _find_executable(name: str) -> str | None:
+    """As shutil.which, without importing it on every job run"""
+    for directory in os.environ.get("PATH", os.defpath).split(os.pathsep):
+        path = os.path.join(directory or ".", name)
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+    return None
+
+
+class ResourceClass:
+    __slots__ = ("name", "max_running", "nice", "ionice", "cpus")
+
+    def __init__(self, name: str, max_running: int, nice: int | None = None, ionice: str | None = None,
+                 cpus: list[int] | None = None):
+        """
+        @param name: the class name given to '--class'
+        @param max_running: how many jobs of the class run at once on the host
+        @param nice: the niceness added to the jobs
+        @param ionice: the io scheduling class and level, such as 'idle' or 'best-effort:7'
+        @param cpus: the cpus the jobs are pinned to
+        """
+        self.name = name
+        self.max_running = max_running
+        self.nice = nice
+        self.ionice = ionice
+        self.cpus = cpus
+
+    @classmethod
+    def parse(cls, line: str) -> "ResourceClass":
+        """
+        :param line: a line of the classes file
+        :raise ValueError: when the line is not a class definition
+        """
+        name, *settings = line.split()
+        values = {}
+        for setting in settings:
+            key, separator, value = setting.partition("=")
+            if not separator or key not in ("max", "nice", "ionice", "cpus"):
+                raise ValueError(f"unknown setting '{setting}' of the class {name}")
+            values[key] = value
+        if not values.get("max", "").isdigit() or int(values["max"]) < 1:
+            raise ValueError(f"the class {name} needs the max=N jobs it runs at once, 1 or more")
+        ionice = values.get("ionice")
+        if ionice is not None:
+            scheduling, _, level = ionice.partition(":")
+            if scheduling not in IONICE_CLASSES or level and (not level.isdigit() or int(level) > 7):
+                raise ValueError(f"the ionice of the class {name} must be idle, best-effort[:0-7] or realtime[:0-7]")
+        try:
+            nice = int(values["nice"]) if "nice" in values else None
+            cpus = _parse_cpus(values["cpus"]) if "cpus" in values else None
+        except ValueError:
+            raise ValueError(f"the class {name} takes an integer nice and a cpu list such as cpus=0-3,6") from None
+        return cls(name, int(values["max"]), nice, ionice, cpus)
+
+    def settings(self) -> str:
+        """
+        :return: the settings as the classes file takes them
+        """
+        settings = [f"max={self.max_running}"]
+        if self.nice is not None:
+            settings.append(f"nice={self.nice}")
+        if self.ionice is not None:
+            settings.append(f"ionice={self.ionice}")
+        if self.cpus is not None:
+            settings.append(f"cpus={','.join(map(str, self.cpus))}")
+        return " ".join(settings)
+
+    def ionice_command(self) -> list[str] | None:
+        """
+        :return: the util-linux 'ionice' command the job runs under, none without an io priority, None when
+        the class has one but 'ionice' is not on the PATH
+        """
+        if self.ionice is None:
+            return []
+        ionice = _find_executable("ionice")
+        if ionice is None:
+            return None
+        scheduling, _, level = self.ionice.partition(":")
+        command = [ionice, "-c", IONICE_CLASSES[scheduling]]
+        return command + ["-n", level] if level and scheduling != "idle" else command
+
+    def apply(self) -> None:
+        """
+        Lowers the priority of this process and pins it to the class cpus, which the job inherits
+        :raise OSError: when the cpus are not on the host
+        """
+        if self.nice is not None:
+            os.nice(self.nice)
+        if self.cpus is not None:
+            os.sched_setaffinity(0, self.cpus)
+
+
+def read_classes(path: str | None = None) -> dict[str, ResourceClass]:
+    """
+    :param path: the classes file, $PYCRON_CLASSES or ~/.pycron/classes by default
+    :return: the classes by name, none when the file is missing
+    :raise ValueError: when some line is not a class definition
+    """
+    classes = {}
+    try:
+        with open(path or default_classes_file(), encoding="utf-8") as classes_file:
+            for line in classes_file:
+                line = line.partition("#")[0].strip()
+                if line:
+                    resource_class = ResourceClass.parse(line)
+                    classes[resource_class.name] = resource_class
+    except FileNotFoundError:
+        pass
+    return classes
+
+
+def _open_shared(path: str) -> int:
+    """
+    Opens a lock file every user of the host may lock. An existing file is opened without O_CREAT, which
+    the protected_regular sysctl denies on the files of other users on sticky directories such as /tmp
+    """
+    try:
+        return os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        fd = os.open(path, os.O_RDONLY | os.O_CREAT, 0o666)
+        try:
+            os.fchmod(fd, 0o666)
+        except OSError:
+            pass
+        return fd
+
+
+def _try_flock(path: str, blocking: bool = False) -> int | None:
+    fd = _open_shared(path)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _flocked_files() -> set[tuple[int, int, int]]:
+    """
+    :return: the device major, minor and inode of the files some process holds a flock() on
+    """
+    locked = set()
+    with open("/proc/locks", encoding="ascii") as locks:
+        for line in locks:
+            # 1: FLOCK  ADVISORY  WRITE 597 fe:00:13533606 0 EOF, the processes waiting for it have a '->'
+            fields = line.split()
+            if len(fields) > 5 and fields[1] == "FLOCK":
+                major, minor, inode = fields[5].split(":")
+                locked.add((int(major, 16), int(minor, 16), int(inode)))
+    return locked
+
+
+class ClassSlot:
+    def __init__(self, resource_class: ResourceClass, slot_dir: str | None = None):
+        """
+        A slot of the class semaphore, held while the job runs. The slots are flock()s, so they are
+        freed by the kernel whenever the wrapper dies, and the job does not inherit them
+        @param resource_class: the class of the job
+        @param slot_dir: where the slot files are kept, shared by every user of the host
+        """
+        self.resource_class = resource_class
+        self.slot_dir = slot_dir or default_slot_dir()
+        self.slots = [os.path.join(self.slot_dir, f"{resource_class.name}.{slot}.slot")
+                      for slot in range(resource_class.max_running)]
+        self.queue_lock = os.path.join(self.slot_dir, f"{resource_class.name}.queue")
+        # Seconds the job waited for a slot
+        self.waited = 0.0
+        self._fd: int | None = None
+
+    def _try_slots(self) -> bool:
+        for slot in self.slots:
+            self._fd = _try_flock(slot)
+            if self._fd is not None:
+                return True
+        return False
+
+    def acquire(self) -> None:
+        """Waits for a free slot, in line with the other waiting jobs of the class"""
+        start = time.perf_counter()
+        try:
+            os.makedirs(self.slot_dir, 0o1777)
+            os.chmod(self.slot_dir, 0o1777)
+        except FileExistsError:
+            pass
+        if self._try_slots():
+            return
+        queue_fd = _try_flock(self.queue_lock, blocking=True)
+        try:
+            delay = POLL_START
+            while not self._try_slots():
+                time.sleep(delay)
+                delay = min(delay * 2, POLL_MAX)
+        finally:
+            os.close(queue_fd)
+        self.waited = time.perf_counter() - start
+
+    def release(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def running(self) -> int:
+        """
+        :return: how many slots are held, only as exact as the moment it is called. The slots are looked up
+        on the flock()s the kernel lists, without taking them, so the probe never turns a job away
+        :raise OSError: when the kernel does not list its locks on /proc/locks
+        """
+        locked = _flocked_files()
+        held = 0
+        for slot in self.slots:
+            try:
+                stat = os.stat(slot)
+            except FileNotFoundError:
+                continue
+            held += (os.major(stat.st_dev), os.minor(stat.st_dev), stat.st_ino) in locked
+        return held
+
+
+def append_wait(log_path: str, fields: tuple) -> None:
+    """
+    Appends a record to the wait log with a single O_APPEND write, creating the log when needed
+    :param fields: the record fields, in the WAIT_RECORD order
+    """
+    os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+    fd = os.open(log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, WAIT_RECORD.pack(*fields))
+    finally:
+        os.close(fd)
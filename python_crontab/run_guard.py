@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import fcntl
+import os
+
+"""
+The overlap guard of the 'pycron.run' wrapper: a non-blocking lock per job, so a job still running
+when cron fires it again is not started twice
+"""
+
+# A fire of a job which is still running is dropped...
+OVERLAP_SKIP = "skip"
+# ...or waits for the running one, but only one fire waits and the others are dropped
+OVERLAP_QUEUE = "queue"
+OVERLAP_MODES = (OVERLAP_SKIP, OVERLAP_QUEUE)
+
+LOCK_DIR_VARIABLE = "PYCRON_LOCK_DIR"
+
+
+def default_lock_dir() -> str:
+    return os.environ.get(LOCK_DIR_VARIABLE) or os.path.join(os.path.expanduser("~"), ".pycron", "locks")
+
+
+def _try_lock(path: str, blocking: bool = False) -> int | None:
+    """
+    :return: the descriptor holding the lock, or None when some other process holds it
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+class JobGuard:
+    def __init__(self, job_id: int, mode: str, lock_dir: str | None = None):
+        """
+        Keeps a job from overlapping itself. The locks are flock()s on files named after the job id,
+        so they are dropped by the kernel whenever the wrapper dies, and the job does not inherit them
+        @param job_id: the id of the normalized job command
+        @param mode: what to do with an overlapping fire, 'skip' or 'queue'
+        @param lock_dir: where the lock files are kept
+        """
+        lock_dir = lock_dir or default_lock_dir()
+        os.makedirs(lock_dir, exist_ok=True)
+        self.run_lock = os.path.join(lock_dir, f"{job_id:08x}.lock")
+        self.queue_lock = os.path.join(lock_dir, f"{job_id:08x}.queue")
+        self.mode = mode
+        # If the job had to wait for a previous run
+        self.waited = False
+        self._fd: int | None = None
+
+    def acquire(self) -> bool:
+        """
+        :return: if the job may run, False when the fire has to be skipped
+        """
+        self._fd = _try_lock(self.run_lock)
+        if self._fd is not None or self.mode != OVERLAP_QUEUE:
+            return self._fd is not None
+        queue_fd = _try_lock(self.queue_lock)
+        if queue_fd is None:
+            # Some other fire is already waiting
+            return False
+        try:
+            self.waited = True
+            self._fd = _try_lock(self.run_lock, blocking=True)
+        finally:
+            os.close(queue_fd)
+        return True
+
+    def release(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
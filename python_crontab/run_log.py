@@ -0,0 +1,116 @@
+import mmap
+import os
+import sys
+from typing import List, NamedTuple, Optional
+
+from python_crontab.run_record import RUN_RECORD, FLAG_SKIPPED, FLAG_QUEUED
+
+"""
+Reads the run log written by the 'pycron.run' wrapper: an append-only file of fixed-size little
+endian records, read back straight from a memory map
+"""
+
+
+class RunRecord(NamedTuple):
+    started: float
+    duration: float
+    user_cpu: float
+    system_cpu: float
+    max_rss_kib: int
+    # Negative when the job was killed by a signal
+    exit_code: int
+    pid: int
+    job_id: int
+    flags: int
+
+    @property
+    def skipped(self) -> bool:
+        return bool(self.flags & FLAG_SKIPPED)
+
+    @property
+    def queued(self) -> bool:
+        return bool(self.flags & FLAG_QUEUED)
+
+    @property
+    def failed(self) -> bool:
+        return not self.skipped and self.exit_code != 0
+
+
+def _first_finished_since(mapped: mmap.mmap, count: int, since: float) -> int:
+    """
+    Binary searches the first record of a run finished at or after 'since'. Records are appended
+    as the runs finish, so their finish times only go backwards when the clock does
+    """
+    low, high = 0, count
+    while low < high:
+        middle = (low + high) // 2
+        started, duration = RUN_RECORD.unpack_from(mapped, middle * RUN_RECORD.size)[:2]
+        if started + duration < since:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+class RunColumns(NamedTuple):
+    """
+    The run log read column wise: one list per record field
+    """
+    started: List[float]
+    duration: List[float]
+    user_cpu: List[float]
+    system_cpu: List[float]
+    max_rss_kib: List[int]
+    exit_code: List[int]
+    pid: List[int]
+    job_id: List[int]
+    flags: List[int]
+
+
+# Where each field sits when the records are seen as an array of the field type: the
+# started time is the double 0 of every 7 doubles, the job id the unsigned 12 of every 14...
+_COLUMN_LAYOUT = (("d", 0), ("d", 1), ("d", 2), ("d", 3), ("q", 4), ("i", 10), ("I", 11), ("I", 12), ("I", 13))
+
+
+def _records_columns(records: memoryview) -> RunColumns:
+    if sys.byteorder != "little":
+        # The typed views below read the fields on the host byte order
+        return RunColumns(*map(list, zip(*RUN_RECORD.iter_unpack(records)))) if records.nbytes else _empty_columns()
+    columns = []
+    for column_format, index in _COLUMN_LAYOUT:
+        with records.cast(column_format) as typed:
+            columns.append(typed[index::RUN_RECORD.size // typed.itemsize].tolist())
+    return RunColumns(*columns)
+
+
+def _empty_columns() -> RunColumns:
+    return RunColumns(*([] for _ in RunColumns._fields))
+
+
+def read_run_columns(log_path: str, since: Optional[float] = None) -> RunColumns:
+    """
+    Reads the run log through a memory map, column wise. Each column is copied out of the map
+    with a single strided slice, so no record is unpacked one by one. A trailing partial record,
+    left by a write which was cut, is ignored
+    :param log_path: the run log path
+    :param since: only the runs finished from this timestamp on are read, the older part of
+    the log is skipped without being read
+    :return: the columns of the records in the order the runs finished, empty when there is no log yet
+    """
+    if not os.path.exists(log_path):
+        return _empty_columns()
+    with open(log_path, "rb") as log:
+        size = os.fstat(log.fileno()).st_size // RUN_RECORD.size * RUN_RECORD.size
+        if not size:
+            return _empty_columns()
+        with mmap.mmap(log.fileno(), size, access=mmap.ACCESS_READ) as mapped:
+            first = 0 if since is None else _first_finished_since(mapped, size // RUN_RECORD.size, since)
+            with memoryview(mapped) as view, view[first * RUN_RECORD.size:] as records:
+                return _records_columns(records)
+
+
+def read_runs(log_path: str, since: Optional[float] = None) -> List[RunRecord]:
+    """
+    Reads the run log records, see read_run_columns
+    """
+    return list(map(RunRecord, *read_run_columns(log_path, since)))
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import os
+import struct
+import zlib
+
+"""
+The record format of the run log, and its writer, imported by the 'pycron.run' wrapper on every job run
+"""
+
+# started, duration, user cpu, system cpu (seconds), max rss (KiB), exit code, pid, job id, flags
+RUN_RECORD = struct.Struct("<ddddqiIII")
+
+# The fire was dropped by the overlap guard as the job was still running
+FLAG_SKIPPED = 1
+# The job waited for its previous run to finish
+FLAG_QUEUED = 2
+
+RUN_LOG_VARIABLE = "PYCRON_RUN_LOG"
+
+
+def default_run_log() -> str:
+    return os.environ.get(RUN_LOG_VARIABLE) or os.path.join(os.path.expanduser("~"), ".pycron", "runs.log")
+
+
+def job_id(command: str) -> int:
+    """
+    :param command: the command the wrapper ran, as it would be written on the crontab without the wrapper
+    :return: the CRC32 of the normalized command, which identifies the job on the run log
+    """
+    return zlib.crc32(" ".join(command.split()).encode())
+
+
+def append_run(log_path: str, fields: tuple) -> None:
+    """
+    Appends a record to the run log, creating it when needed. Records are written with a single
+    O_APPEND write, so concurrent jobs never interleave their records
+    :param log_path: the run log path
+    :param fields: the record fields, in the 'RunRecord' order
+    """
+    os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+    fd = os.open(log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, RUN_RECORD.pack(*fields))
+    finally:
+        os.close(fd)
@@ -0,0 +1,153 @@
+import json
+import math
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from python_crontab.cron_table import CronEntry
+from python_crontab.run_log import RunColumns
+from python_crontab.run_record import FLAG_SKIPPED
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class JobStats(NamedTuple):
+    """
+    The runs of a job over the stats window. The durations are in seconds, None without runs
+    """
+    job_id: int
+    # The job command, empty when the job is no longer on the crontab
+    command: str
+    schedule: str
+    runs: int
+    failures: int
+    skipped: int
+    p50: Optional[float]
+    p95: Optional[float]
+    p99: Optional[float]
+    max_duration: Optional[float]
+    total_duration: float
+    max_rss_kib: int
+
+    @property
+    def failure_rate(self) -> float:
+        return self.failures / self.runs if self.runs else 0.0
+
+    @property
+    def name(self) -> str:
+        return self.command or f"job {self.job_id:08x}"
+
+
+def _quantile(ordered: List[float], quantile: float) -> Optional[float]:
+    """Nearest rank quantile of already sorted values"""
+    return ordered[max(0, math.ceil(quantile * len(ordered)) - 1)] if ordered else None
+
+
+def collect_stats(runs: RunColumns, jobs: Dict[int, Tuple[CronEntry, str]]) -> List[JobStats]:
+    """
+    Aggregates the run records per job. The columns are walked once together, appending each
+    duration to its job list, and each job list is sorted once for all of its quantiles
+    :param runs: the run log columns of the window
+    :param jobs: the crontab entries running through the wrapper, by job id. They are reported
+    even without runs, and the jobs of the records which match no entry are reported by their id
+    :return: the stats of the crontab jobs in the table order, then the others
+    """
+    durations: Dict[int, List[float]] = {job: [] for job in jobs}
+    failures: Dict[int, int] = dict.fromkeys(jobs, 0)
+    skipped: Dict[int, int] = dict.fromkeys(jobs, 0)
+    max_rss: Dict[int, int] = dict.fromkeys(jobs, 0)
+    for job, duration, rss_kib, exit_code, flags in zip(runs.job_id, runs.duration, runs.max_rss_kib,
+                                                        runs.exit_code, runs.flags):
+        job_durations = durations.get(job)
+        if job_durations is None:
+            job_durations = durations[job] = []
+            failures[job] = skipped[job] = max_rss[job] = 0
+        if flags & FLAG_SKIPPED:
+            skipped[job] += 1
+            continue
+        job_durations.append(duration)
+        if exit_code:
+            failures[job] += 1
+        if rss_kib > max_rss[job]:
+            max_rss[job] = rss_kib
+
+    stats = []
+    for job, job_durations in durations.items():
+        job_durations.sort()
+        entry, command = jobs.get(job, (None, ""))
+        p50, p95, p99 = (_quantile(job_durations, quantile) for quantile in QUANTILES)
+        stats.append(JobStats(job, command, entry.schedule if entry is not None else "", len(job_durations),
+                              failures[job], skipped[job], p50, p95, p99, job_durations[-1] if job_durations else None,
+                              math.fsum(job_durations), max_rss[job]))
+    return stats
+
+
+def _seconds(value: Optional[float]) -> str:
+    return f"{value:.3f}" if value is not None else "-"
+
+
+def stats_table(stats: List[JobStats]) -> str:
+    if not stats:
+        return "No recorded run and no crontab entry running through the pycron.run wrapper"
+    lines = [f"{'runs':>7} {'fail%':>6} {'skipped':>7} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'max s':>8} "
+             f"{'rss MiB':>8}  job"]
+    for job in stats:
+        lines.append(f"{job.runs:>7} {job.failure_rate * 100:>6.1f} {job.skipped:>7} {_seconds(job.p50):>8} "
+                     f"{_seconds(job.p95):>8} {_seconds(job.p99):>8} {_seconds(job.max_duration):>8} "
+                     f"{job.max_rss_kib / 1024:>8.1f}  {' '.join(filter(None, (job.schedule, job.name)))}")
+    return "\n".join(lines)
+
+
+def stats_json(stats: List[JobStats], since: Optional[float], until: float) -> str:
+    return json.dumps({
+        "since": since,
+        "until": until,
+        "jobs": [{
+            "job_id": f"{job.job_id:08x}",
+            "command": job.command,
+            "schedule": job.schedule,
+            "runs": job.runs,
+            "failures": job.failures,
+            "failure_rate": job.failure_rate,
+            "skipped": job.skipped,
+            "duration_seconds": {"p50": job.p50, "p95": job.p95, "p99": job.p99, "max": job.max_duration},
+            "max_rss_kib": job.max_rss_kib,
+        } for job in stats],
+    }, indent=2)
+
+
+def label_value(value: str) -> str:
+    """
+    :return: the value escaped for a label of the Prometheus text format
+    """
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+# The window counts are gauges, as they go down when old runs leave the window
+_GAUGES = (
+    ("pycron_job_runs", "Runs of the job over the stats window", lambda job: job.runs),
+    ("pycron_job_failures", "Runs of the job which exited with a non zero code", lambda job: job.failures),
+    ("pycron_job_failure_ratio", "Failed runs over all runs of the job", lambda job: job.failure_rate),
+    ("pycron_job_skipped", "Fires skipped by the overlap guard as the job was still running", lambda job: job.skipped),
+    ("pycron_job_max_rss_bytes", "Peak resident memory of the job runs", lambda job: job.max_rss_kib * 1024),
+)
+
+
+def stats_prometheus(stats: List[JobStats]) -> str:
+    """
+    Formats the stats for the textfile collector of the node exporter
+    """
+    labels = {job.job_id: f'job="{label_value(job.name)}",job_id="{job.job_id:08x}",'
+                          f'schedule="{label_value(job.schedule)}"' for job in stats}
+    lines = []
+    for name, help_text, value in _GAUGES:
+        lines.extend((f"# HELP {name} {help_text}", f"# TYPE {name} gauge"))
+        lines.extend(f"{name}{{{labels[job.job_id]}}} {value(job)}" for job in stats)
+
+    name = "pycron_job_duration_seconds"
+    lines.extend((f"# HELP {name} Wall time of the job runs", f"# TYPE {name} summary"))
+    for job in stats:
+        for quantile, value in zip(QUANTILES, (job.p50, job.p95, job.p99)):
+            if value is not None:
+                lines.append(f'{name}{{{labels[job.job_id]},quantile="{quantile}"}} {value}')
+        lines.append(f"{name}_sum{{{labels[job.job_id]}}} {job.total_duration}")
+        lines.append(f"{name}_count{{{labels[job.job_id]}}} {job.runs}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,75 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from python_crontab.build_py_cron import BuildPyCronScript
+from python_crontab.cron_table import CronEntry, CronTable
+from python_crontab.run_log import RunRecord
+from python_crontab.run_record import job_id
+
+
+def wrapped_jobs(table: CronTable) -> Dict[int, Tuple[CronEntry, str]]:
+    """
+    Finds the crontab entries running through the 'pycron.run' wrapper
+    :param table: the crontab
+    :return: the entry and the job command, by the job id the wrapper records the runs with.
+    When the same job is on several entries, the first one is kept
+    """
+    jobs: Dict[int, Tuple[CronEntry, str]] = {}
+    for entry in table:
+        job_command = BuildPyCronScript.unwrapped_command(entry.command)
+        if job_command is not None:
+            jobs.setdefault(job_id(job_command), (entry, job_command))
+    return jobs
+
+
+class JobStatus:
+    def __init__(self, entry: CronEntry, job_command: str):
+        """
+        How an entry running through the 'pycron.run' wrapper ran, according to the run log
+        @param entry: the crontab entry
+        @param job_command: the command the wrapper runs, which identifies the job on the run log
+        """
+        self.entry = entry
+        self.job_command = job_command
+        self.runs = 0
+        self.failed = 0
+        self.skipped = 0
+        self.queued = 0
+        self.last_run: Optional[RunRecord] = None
+
+    def add(self, record: RunRecord) -> None:
+        if record.skipped:
+            self.skipped += 1
+            return
+        self.runs += 1
+        self.failed += record.failed
+        self.queued += record.queued
+        self.last_run = record
+
+    @staticmethod
+    def collect(table: CronTable, runs: Iterable[RunRecord]) -> List["JobStatus"]:
+        """
+        Matches the run log records to the crontab entries running through the wrapper
+        :param table: the crontab
+        :param runs: the run log records, in the order they were written
+        :return: the status of every wrapped entry, in the table order
+        """
+        statuses = {job: JobStatus(entry, job_command) for job, (entry, job_command) in wrapped_jobs(table).items()}
+        for record in runs:
+            status = statuses.get(record.job_id)
+            if status is not None:
+                status.add(record)
+        return list(statuses.values())
+
+
+def status_report(statuses: List[JobStatus]) -> str:
+    if not statuses:
+        return "No crontab entry runs through the pycron.run wrapper, build them with '--record' or '--overlap'"
+    lines = [f"{'runs':>6} {'failed':>6} {'skipped':>7} {'queued':>6}  {'last run':<19} {'exit':>4}  entry"]
+    for status in statuses:
+        last_run = status.last_run
+        started = datetime.fromtimestamp(last_run.started).strftime("%Y-%m-%d %H:%M:%S") if last_run else "never"
+        exit_code = str(last_run.exit_code) if last_run else "-"
+        lines.append(f"{status.runs:>6} {status.failed:>6} {status.skipped:>7} {status.queued:>6}  "
+                     f"{started:<19} {exit_code:>4}  {status.entry.schedule} {status.job_command}")
+    return "\n".join(lines)
@@ -0,0 +1,178 @@
+import sys
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Sequence, Union
+
+from environment import USER, CRON_BACKEND, CRON_SPOOL_DIR
+from python_crontab.build_py_cron import BuildPyCronScript, BuildPyModuleCronScript
+from python_crontab.cron_schedule import CronSchedule
+from python_crontab.cron_table import CronEntry, CronTable, parse_entry
+from python_crontab.interfaces.icron_backend import ICronBackend
+from python_crontab.placement import MinutePlanner, spread_entry
+from utilities import check_source_existence
+from utilities.cron_backend import make_cron_backend
+from utilities.cron_script_manager import CronScriptManager, StreamingCronScriptManager
+
+# An entry as given to the session: (schedule, script) or (schedule, module path, module name)
+EntrySpec = Sequence[str]
+
+
+class CronTab:
+    def __init__(self, user: str = USER, py: Optional[str] = None,
+                 backend: Union[str, ICronBackend] = CRON_BACKEND, spool_dir: str = CRON_SPOOL_DIR, *,
+                 record: bool = False, overlap: Optional[str] = None, resource_class: Optional[str] = None,
+                 warm: bool = False, spread: bool = False):
+        """
+        A session over a user crontab for the programs which change it in process, as the cli does:
+
+            with CronTab(py="/usr/bin/python3").batch() as crontab:
+                crontab.insert("*/10", "/opt/jobs/report.py")
+                crontab.delete("0 9 * * *", "/opt/jobs", "jobs.cleanup")
+
+        The operations return what they did and raise the errors the cli prints, nothing is printed.
+        Each operation outside a batch reads and commits the crontab on its own, a batch reads it once
+        and commits every operation on a single write. The sessions share no state, so any number of
+        them, over the same or other crontabs, may live in a process
+        @param user: the crontab owner
+        @param py: the python interpreter running the jobs, this interpreter by default
+        @param backend: the crontab storage, or its name ('crontab' or 'spool')
+        @param spool_dir: the cron spool directory used by the 'spool' backend
+        @param record: see BuildPyCronScript
+        @param overlap: see BuildPyCronScript
+        @param resource_class: see BuildPyCronScript
+        @param warm: see BuildPyCronScript
+        @param spread: if the '*/N' entries get the minute offset keeping the concurrent starts fewest
+        """
+        self.backend = backend if isinstance(backend, ICronBackend) else make_cron_backend(backend, user, spool_dir)
+        self.spread = spread
+        self._builders = (BuildPyCronScript(), BuildPyModuleCronScript())
+        for builder in self._builders:
+            builder.set_py_interpreter(py or sys.executable)
+            builder.record = record
+            builder.overlap = overlap
+            builder.resource_class = resource_class
+            builder.warm = warm
+        # If the last commit wrote the crontab, False when the operations left it as it was
+        self.written = False
+        self._batch: Optional[CronScriptManager] = None
+        self._planner: Optional[MinutePlanner] = None
+
+    @property
+    def user(self) -> str:
+        return self.backend.user
+
+    def entry(self, schedule: str, script: str, module: Optional[str] = None) -> str:
+        """
+        Builds the crontab entry of a python script or module, as the cli builds it
+        :param schedule: an interval in minutes or a cron schedule
+        :param script: the python script, or the module path when a module is given
+        :param module: the python module name
+        :return: the crontab entry
+        """
+        builder = self._builders[module is not None]
+        builder.interval = schedule
+        if module is None:
+            builder.script = script
+        else:
+            check_source_existence(script)
+            builder.script = f"cd {script} && {builder.py_interpreter} -m {module}"
+        return builder.build_cron_script()
+
+    @contextmanager
+    def batch(self) -> Iterator["CronTab"]:
+        """
+        Runs the operations inside on the crontab read once, and commits them on a single write when the
+        batch ends. Nothing is written when an exception leaves the batch. Nested batches join the outer one
+        """
+        if self._batch is not None:
+            yield self
+            return
+        with CronScriptManager(self._builders[0], self.backend) as manager:
+            self._batch = manager
+            self._planner = MinutePlanner(manager.cron_table) if self.spread else None
+            try:
+                yield self
+            finally:
+                self._batch = None
+                self._planner = None
+            self.written = manager.commit()
+
+    def _apply(self, operation: Callable[[CronScriptManager], bool]) -> bool:
+        if self._batch is not None:
+            return operation(self._batch)
+        # Spreading places the entries over the load of the whole table
+        manager_class = CronScriptManager if self.spread else StreamingCronScriptManager
+        with manager_class(self._builders[0], self.backend) as manager:
+            done = operation(manager)
+            self.written = manager.commit()
+        return done
+
+    def _planner_for(self, table: CronTable) -> MinutePlanner:
+        return self._planner if self._planner is not None else MinutePlanner(table)
+
+    def _unload(self, cron_entry: str) -> None:
+        if self._planner is not None:
+            self._planner.remove(CronSchedule.parse(parse_entry(cron_entry).schedule))
+
+    def insert(self, schedule: str, script: str, module: Optional[str] = None) -> bool:
+        """
+        Inserts the entry of a python script or module
+        :return: if the entry was inserted, False when it was already on the crontab
+        """
+        cron_entry = self.entry(schedule, script, module)
+
+        def operation(manager: CronScriptManager) -> bool:
+            new_entry = spread_entry(manager.cron_table, cron_entry, self._planner_for(manager.cron_table)) \
+                if self.spread else cron_entry
+            return not manager.insert_new_cron(new_entry)
+
+        return self._apply(operation)
+
+    def delete(self, schedule: str, script: str, module: Optional[str] = None) -> bool:
+        """
+        Removes the entry of a python script or module
+        :return: if the entry was removed, False when it was not on the crontab
+        """
+        cron_entry = self.entry(schedule, script, module)
+
+        def operation(manager: CronScriptManager) -> bool:
+            old_entry = spread_entry(manager.cron_table, cron_entry) if self.spread else cron_entry
+            removed = manager.remove_cron_entry(old_entry)
+            if removed:
+                self._unload(old_entry)
+            return removed
+
+        return self._apply(operation)
+
+    def update(self, old: EntrySpec, new: EntrySpec) -> bool:
+        """
+        Replaces an entry keeping its position on the crontab
+        :param old: the (schedule, script) or (schedule, module path, module name) of the entry to replace
+        :param new: the (schedule, script) or (schedule, module path, module name) to replace it with
+        :return: if the old entry was replaced, False when it was not on the crontab
+        """
+        old_cron_entry, new_cron_entry = self.entry(*old), self.entry(*new)
+
+        def operation(manager: CronScriptManager) -> bool:
+            old_entry, new_entry = old_cron_entry, new_cron_entry
+            if self.spread:
+                table = manager.cron_table
+                old_entry = spread_entry(table, old_entry)
+                if table.get(old_entry) is not None:
+                    self._unload(old_entry)
+                    old_key = parse_entry(old_entry).key
+                    planner = self._planner or MinutePlanner(entry for entry in table if entry.key != old_key)
+                    new_entry = spread_entry(table, new_entry, planner)
+            return manager.update_cron(old_entry, new_entry)
+
+        return self._apply(operation)
+
+    def entries(self, managed: bool = False) -> List[CronEntry]:
+        """
+        :param managed: if only the entries built by pycron are listed
+        :return: the crontab entries, with the operations of the running batch applied
+        """
+        if self._batch is not None:
+            table = self._batch.cron_table
+        else:
+            table = self.backend.read_table().table or CronTable()
+        return [entry for entry in table if not managed or BuildPyCronScript.is_managed(entry.command)]
@@ -0,0 +1,177 @@
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from exceptions import InvalidCronSchedule
+from python_crontab.cron_schedule import CronSchedule
+from python_crontab.cron_table import CronEntry
+
+_HEAT_GLYPHS = " .:-=+*#%@"
+
+
+def _add_to_counter(planes: List[int], mask: int, weight: int) -> None:
+    """
+    Adds 'weight' to the counter of every minute set on 'mask'. The counters are bit sliced:
+    planes[j] holds the bit j of every minute counter, so a whole horizon is added with a
+    handful of big integer operations instead of one addition per minute
+    """
+    plane = 0
+    while weight:
+        if weight & 1:
+            carry, index = mask, plane
+            while carry:
+                if index >= len(planes):
+                    planes.extend([0] * (index - len(planes) + 1))
+                planes[index], carry = planes[index] ^ carry, planes[index] & carry
+                index += 1
+        weight >>= 1
+        plane += 1
+
+
+def bit_positions(mask: int) -> Iterable[int]:
+    bits = bin(mask)[:1:-1]
+    position = bits.find("1")
+    while position != -1:
+        yield position
+        position = bits.find("1", position + 1)
+
+
+def _hour_pattern(schedule: CronSchedule, first_hour: datetime, slots: int) -> int:
+    pattern = 0
+    for slot in range(slots):
+        if schedule.hour_matches(first_hour + timedelta(hours=slot)):
+            pattern |= 1 << (60 * slot)
+    return pattern
+
+
+def horizon_mask(schedule: CronSchedule, start: datetime, minutes: int, patterns: Optional[Dict[tuple, int]] = None) -> int:
+    """
+    Builds the bitmask of the minutes when a schedule fires, the bit N being the minute N after start
+    :param schedule: the compiled schedule
+    :param start: the first minute of the horizon
+    :param minutes: the horizon length
+    :param patterns: cache of the matching hours by the schedule time key, shared by the callers
+    :return: the fire times bitmask
+    """
+    first_hour = start.replace(minute=0)
+    patterns = {} if patterns is None else patterns
+    pattern = patterns.get(schedule.time_key)
+    if pattern is None:
+        slots = (start.minute + minutes + 59) // 60
+        pattern = patterns[schedule.time_key] = _hour_pattern(schedule, first_hour, slots)
+    # The slots are 60 bits apart, so the product lays the minutes bitset on every matching hour
+    return ((schedule.minutes * pattern) >> start.minute) & ((1 << minutes) - 1)
+
+
+class ScheduleSimulation:
+    def __init__(self, entries: Iterable[CronEntry], hours: int, start: Optional[datetime] = None):
+        """
+        Expands the cron entries into their fire times over a horizon and counts how many
+        jobs start on each minute. Each distinct schedule becomes a bitmask over the horizon
+        (the minutes bitset multiplied by the pattern of matching hours) and the masks are summed
+        on bit sliced counters, so the cost depends on the distinct schedules, not on the fire times
+        @param entries: the crontab entries to simulate
+        @param hours: the horizon length in hours
+        @param start: the first simulated minute. Defaults to the next minute from now
+        """
+        if start is None:
+            start = datetime.now().replace(second=0, microsecond=0) + timedelta(minutes=1)
+        self.start = start.replace(second=0, microsecond=0)
+        self.minutes = hours * 60
+        self.jobs: Dict[CronSchedule, List[CronEntry]] = {}
+        self.skipped: List[Tuple[CronEntry, str]] = []
+        self.masks: Dict[CronSchedule, int] = {}
+        for entry in entries:
+            try:
+                schedule = CronSchedule.parse(entry.schedule)
+            except InvalidCronSchedule as e:
+                self.skipped.append((entry, e.reason))
+                continue
+            if schedule.is_time_based:
+                self.jobs.setdefault(schedule, []).append(entry)
+            else:
+                self.skipped.append((entry, "the schedule does not fire at a point in time"))
+        self.counts = self._simulate()
+
+    def _simulate(self) -> List[int]:
+        patterns: Dict[tuple, int] = {}
+        planes: List[int] = []
+
+        for schedule, entries in self.jobs.items():
+            mask = horizon_mask(schedule, self.start, self.minutes, patterns)
+            self.masks[schedule] = mask
+            _add_to_counter(planes, mask, len(entries))
+
+        counts = [0] * self.minutes
+        for plane_bit, plane in enumerate(planes):
+            for minute in bit_positions(plane):
+                counts[minute] += 1 << plane_bit
+        return counts
+
+    @property
+    def entry_count(self) -> int:
+        return sum(len(entries) for entries in self.jobs.values())
+
+    @property
+    def peak(self) -> int:
+        return max(self.counts, default=0)
+
+    def moment(self, minute: int) -> datetime:
+        return self.start + timedelta(minutes=minute)
+
+    def jobs_at(self, minute: int) -> List[CronEntry]:
+        """
+        :param minute: the minute offset from the simulation start
+        :return: the entries starting on that minute
+        """
+        return [entry for schedule, mask in self.masks.items() if mask >> minute & 1
+                for entry in self.jobs[schedule]]
+
+    def busiest_minutes(self, top: int) -> List[int]:
+        """
+        :return: the minute offsets with more than one job starting, busiest first
+        """
+        colliding = [minute for minute, count in enumerate(self.counts) if count > 1]
+        return sorted(colliding, key=lambda minute: -self.counts[minute])[:top]
+
+    def render_heatmap(self) -> str:
+        """
+        Renders one row per hour and one column per minute, the darker the glyph the more jobs
+        start on that minute, relative to the peak
+        """
+        peak = self.peak or 1
+        rows = ["                  " + "".join(str(minute // 10) if minute % 10 == 0 else " " for minute in range(60))]
+        offset = -self.start.minute
+        while offset < self.minutes:
+            cells = []
+            for minute in range(offset, offset + 60):
+                count = self.counts[minute] if 0 <= minute < self.minutes else 0
+                cells.append(_HEAT_GLYPHS[-(-count * (len(_HEAT_GLYPHS) - 1) // peak)])
+            row_counts = self.counts[max(offset, 0):offset + 60]
+            rows.append(f"{self.moment(offset):%Y-%m-%d %H:%M} |{''.join(cells)}| max {max(row_counts)}")
+            offset += 60
+        return "\n".join(rows)
+
+    def report(self, top: int = 5, jobs_per_minute: int = 10) -> str:
+        lines = [f"Simulated {self.entry_count} entries ({len(self.jobs)} distinct schedules) over "
+                 f"{self.minutes // 60} hours from {self.start:%Y-%m-%d %H:%M}",
+                 self.render_heatmap()]
+        peak_minutes = [minute for minute, count in enumerate(self.counts) if count == self.peak and count]
+        if peak_minutes:
+            shown = ", ".join(f"{self.moment(minute):%H:%M}" for minute in peak_minutes[:10])
+            more = f" (+{len(peak_minutes) - 10} more)" if len(peak_minutes) > 10 else ""
+            lines.append(f"Peak: {self.peak} concurrent starts at {shown}{more}")
+        else:
+            lines.append("No job starts on the simulated horizon")
+
+        busiest = self.busiest_minutes(top)
+        if busiest:
+            lines.append("Colliding minutes:")
+            for minute in busiest:
+                lines.append(f"  {self.moment(minute):%Y-%m-%d %H:%M}  {self.counts[minute]} jobs")
+                jobs = self.jobs_at(minute)
+                lines.extend(f"      {entry}" for entry in jobs[:jobs_per_minute])
+                if len(jobs) > jobs_per_minute:
+                    lines.append(f"      ... and {len(jobs) - jobs_per_minute} more")
+        for entry, reason in self.skipped:
+            lines.append(f"Skipped '{entry}': {reason}")
+        return "\n".join(lines)
@@ -0,0 +1,156 @@
+import hashlib
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+"""
+The snapshots of the crontabs replaced by the pycron commits, so any of them can be restored. The
+snapshots are content addressed: each crontab is stored once, gzipped, under its 'crontab_digest',
+and an index keeps the order they were replaced in
+"""
+
+# Fixed width index records, so the last one and their count are found without reading the index
+_RECORD = "{taken:017.6f} {digest} {lines:010d}\n"
+_RECORD_SIZE = len(_RECORD.format(taken=0, digest="0" * 64, lines=0))
+_CHUNK_SIZE = 256 * 1024
+
+
+class Snapshot(NamedTuple):
+    # The snapshot number on the history, 1 being the most recent
+    number: int
+    taken: float
+    digest: str
+    lines: int
+
+
+class SnapshotStore:
+    def __init__(self, directory: str, keep: int):
+        """
+        Keeps the snapshots of a user crontab on a directory
+        @param directory: the snapshot directory of the user
+        @param keep: how many snapshots are kept, the older ones are pruned in batches
+        """
+        self.directory = directory
+        self.keep = keep
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, "index")
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{digest}.gz")
+
+    def _count(self) -> int:
+        try:
+            return os.path.getsize(self._index_path) // _RECORD_SIZE
+        except FileNotFoundError:
+            return 0
+
+    def _read_records(self, start: int = 0) -> List[str]:
+        try:
+            with open(self._index_path, "rb") as index:
+                index.seek(start * _RECORD_SIZE)
+                content = index.read().decode("ascii")
+        except FileNotFoundError:
+            return []
+        return [content[offset:offset + _RECORD_SIZE] for offset in range(0, len(content), _RECORD_SIZE)]
+
+    def store(self, lines: Iterable[str]) -> str:
+        """
+        Snapshots a crontab, digesting and compressing it in a single pass. A crontab already stored only
+        gets a new index record, and none when it is the last snapshot taken
+        :param lines: the crontab lines, without line breaks
+        :return: the 'crontab_digest' of the crontab
+        """
+        import gzip
+        os.makedirs(self.directory, exist_ok=True)
+        digest = hashlib.sha256()
+        line_count = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=".snapshot.")
+        try:
+            with os.fdopen(fd, "wb") as temp_file, gzip.GzipFile(fileobj=temp_file, mode="wb",
+                                                                 compresslevel=1, mtime=0) as compressed:
+                # The lines are compressed in chunks, a write per line costs more than the compression
+                chunk = bytearray()
+                separator = b""
+                for line in lines:
+                    encoded = line.encode("utf-8")
+                    digest.update(separator + encoded)
+                    # Every line keeps its line break, so a last empty line is restored too
+                    chunk += encoded
+                    chunk += b"\n"
+                    separator = b"\n"
+                    line_count += 1
+                    if len(chunk) >= _CHUNK_SIZE:
+                        compressed.write(chunk)
+                        chunk.clear()
+                compressed.write(chunk)
+            hex_digest = digest.hexdigest()
+            if os.path.exists(self._object_path(hex_digest)):
+                os.unlink(temp_path)
+            else:
+                os.replace(temp_path, self._object_path(hex_digest))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+        last = self._read_records(self._count() - 1) if self._count() else []
+        if not last or last[0].split()[1] != hex_digest:
+            with open(self._index_path, "a", encoding="ascii") as index:
+                index.write(_RECORD.format(taken=time.time(), digest=hex_digest, lines=line_count))
+            if self._count() > self.keep + max(self.keep // 2, 1):
+                self._prune()
+        return hex_digest
+
+    def _prune(self) -> None:
+        """Keeps the 'keep' most recent records, and removes the snapshots no longer recorded"""
+        records = self._read_records(self._count() - self.keep)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=".index.")
+        with os.fdopen(fd, "w", encoding="ascii") as index:
+            index.writelines(records)
+        os.replace(temp_path, self._index_path)
+        kept = {record.split()[1] for record in records}
+        for name in os.listdir(self.directory):
+            if name.endswith(".gz") and name[:-3] not in kept:
+                os.unlink(os.path.join(self.directory, name))
+
+    def history(self) -> List[Snapshot]:
+        """
+        :return: the snapshots, most recent first
+        """
+        records = self._read_records()
+        snapshots = []
+        for number, record in enumerate(reversed(records), 1):
+            taken, digest, lines = record.split()
+            snapshots.append(Snapshot(number, float(taken), digest, int(lines)))
+        return snapshots
+
+    def get(self, number: int) -> Optional[Snapshot]:
+        """
+        :param number: the snapshot number, 1 being the most recent
+        :return: the snapshot or None when there is no such snapshot
+        """
+        count = self._count()
+        if not 1 <= number <= count:
+            return None
+        taken, digest, lines = self._read_records(count - number)[0].split()
+        return Snapshot(number, float(taken), digest, int(lines))
+
+    @contextmanager
+    def open(self, snapshot: Snapshot) -> Iterator[Iterator[str]]:
+        """
+        Opens a snapshot to stream its lines, without line breaks. An open snapshot stays readable even
+        when it is pruned meanwhile, as happens when restoring it snapshots the crontab it replaces
+        """
+        import gzip
+        with gzip.open(self._object_path(snapshot.digest), "rt", encoding="utf-8") as compressed:
+            yield (line[:-1] for line in compressed)
+
+    def size(self, snapshot: Snapshot) -> int:
+        """
+        :return: the compressed size of the snapshot, in bytes
+        """
+        return os.path.getsize(self._object_path(snapshot.digest))
@@ -0,0 +1,168 @@
+import marshal
+import os
+import struct
+import tempfile
+from typing import BinaryIO, Iterator, NamedTuple, Optional, Tuple
+
+from python_crontab.cron_table import CronComment, CronEntry, CronEnv, CronLine, CronTable, EntryKey
+
+"""
+The parsed crontabs kept on disk, so the commands which only read the crontab skip listing and parsing
+it. Each user crontab is a single file of two marshalled values: a small length prefixed header with the
+signature and the 'crontab_digest' of the crontab, checked without loading the rest, then the parsed
+lines as plain tuples, which load several times faster than they parse. The lines are told apart by
+their length. The indexes built over a crontab, such as the '--list' one, are kept alongside under the
+digest of the crontab they were built from
+"""
+
+# Bumped whenever the parsed lines or the indexes change, the caches of other versions are ignored
+_FORMAT_VERSION = 3
+
+# What tells the stored crontab changed without reading it: the spool file inode, size and times
+Signature = Tuple[int, ...]
+
+_HEADER_LENGTH = struct.Struct("<I")
+
+_LINE_TYPES = {len(line_type._fields): line_type for line_type in (CronEntry, CronEnv, CronComment)}
+_ENTRY_FIELDS = len(CronEntry._fields)
+
+
+class CachedTable(NamedTuple):
+    # The parsed crontab, None when the user has no crontab
+    table: Optional[CronTable]
+    digest: Optional[str]
+
+
+def _parsed_lines(rows: list) -> Iterator[CronLine]:
+    for row in rows:
+        yield tuple.__new__(_LINE_TYPES[len(row)], row)
+
+
+class TableCache:
+    def __init__(self, directory: str):
+        """
+        Keeps the parsed crontabs of the users on a directory
+        @param directory: the cache directory, one file per user
+        """
+        self.directory = directory
+
+    def _path(self, user: str, extension: str = "table") -> str:
+        return os.path.join(self.directory, f"{user}.{extension}")
+
+    @staticmethod
+    def _read_header(cache_file: BinaryIO) -> tuple:
+        header_length, = _HEADER_LENGTH.unpack(cache_file.read(_HEADER_LENGTH.size))
+        return marshal.loads(cache_file.read(header_length))
+
+    def _load_rows(self, user: str, signature: Optional[Signature],
+                   digest: Optional[str]) -> Optional[Tuple[Optional[str], Optional[list]]]:
+        try:
+            with open(self._path(user), "rb") as cache_file:
+                version, cached_signature, cached_digest, has_table = self._read_header(cache_file)
+                same_signature = signature is not None and cached_signature == signature
+                same_digest = digest is not None and cached_digest == digest
+                if version != _FORMAT_VERSION or not (same_signature or same_digest):
+                    return None
+                # Loaded from bytes, 'marshal.load' reads a file in small pieces
+                return cached_digest, marshal.loads(cache_file.read()) if has_table else None
+        except (OSError, EOFError, ValueError, TypeError, struct.error):
+            # Missing, or half written by a pycron killed in between
+            return None
+
+    def load(self, user: str, signature: Optional[Signature] = None,
+             digest: Optional[str] = None) -> Optional[CachedTable]:
+        """
+        Loads the cached crontab if it is still the stored one, as told by its signature or by its digest
+        :param signature: the signature of the stored crontab, None to check the digest only
+        :param digest: the 'crontab_digest' of the stored crontab, None to check the signature only
+        :return: the cached crontab, or None when it is missing or stale
+        """
+        loaded = self._load_rows(user, signature, digest)
+        if loaded is None:
+            return None
+        cached_digest, rows = loaded
+        return CachedTable(CronTable.from_lines(_parsed_lines(rows)) if rows is not None else None, cached_digest)
+
+    def contains(self, user: str, signature: Signature, key: EntryKey) -> Optional[bool]:
+        """
+        Tells if an entry is on the cached crontab, scanning the cached lines without building the table
+        :param signature: the signature of the stored crontab
+        :param key: the entry key, its schedule and command
+        :return: if the entry is there, None when the cache is stale or the user has no crontab
+        """
+        loaded = self._load_rows(user, signature, None)
+        if loaded is None or loaded[1] is None:
+            return None
+        schedule, command = key
+        return any(len(row) == _ENTRY_FIELDS and row[1] == command and row[0] == schedule for row in loaded[1])
+
+    def digest(self, user: str, signature: Signature) -> Optional[str]:
+        """
+        Tells the digest of the cached crontab reading the header only
+        :param signature: the signature of the stored crontab
+        :return: the 'crontab_digest' of the cached crontab, None when the cache is stale or the user has no crontab
+        """
+        try:
+            with open(self._path(user), "rb") as cache_file:
+                version, cached_signature, cached_digest, has_table = self._read_header(cache_file)
+        except (OSError, EOFError, ValueError, TypeError, struct.error):
+            return None
+        if version != _FORMAT_VERSION or cached_signature != signature or not has_table:
+            return None
+        return cached_digest
+
+    def _write(self, user: str, extension: str, header: tuple, payload: object) -> None:
+        """Replaces a cache file atomically. Failing to cache is not an error"""
+        header_bytes = marshal.dumps(header)
+        try:
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=f".{user}.")
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, "wb") as cache_file:
+                cache_file.write(_HEADER_LENGTH.pack(len(header_bytes)) + header_bytes)
+                cache_file.write(marshal.dumps(payload))
+            os.replace(temp_path, self._path(user, extension))
+        except OSError:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+    def store(self, user: str, signature: Optional[Signature], cached: CachedTable) -> None:
+        """
+        Caches a crontab, replacing the file atomically. Failing to cache is not an error
+        :param signature: the signature taken before the crontab was read, so a change meanwhile stales the cache
+        """
+        rows = [tuple(line) for line in cached.table.lines()] if cached.table is not None else []
+        self._write(user, "table", (_FORMAT_VERSION, signature, cached.digest, cached.table is not None), rows)
+
+    def load_index(self, user: str, name: str, digest: str) -> Optional[object]:
+        """
+        Loads an index built over the crontab, if it was built from the crontab with this digest
+        :param name: the index name, one file per index and user
+        :param digest: the 'crontab_digest' of the stored crontab
+        :return: the index as stored, or None when it is missing or stale
+        """
+        try:
+            with open(self._path(user, name), "rb") as cache_file:
+                version, cached_digest = self._read_header(cache_file)
+                if version != _FORMAT_VERSION or cached_digest != digest:
+                    return None
+                return marshal.loads(cache_file.read())
+        except (OSError, EOFError, ValueError, TypeError, struct.error):
+            return None
+
+    def store_index(self, user: str, name: str, digest: str, index: object) -> None:
+        """
+        Keeps an index built over the crontab, replacing the file atomically. The indexes are only valid for the
+        crontab they were built from, so they are not dropped by 'invalidate'
+        :param index: plain values only, as marshal takes them
+        """
+        self._write(user, name, (_FORMAT_VERSION, digest), index)
+
+    def invalidate(self, user: str) -> None:
+        """Drops the cached crontab of the user, once pycron wrote the crontab"""
+        try:
+            os.unlink(self._path(user))
+        except FileNotFoundError:
+            pass
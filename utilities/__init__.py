@@ -1,31 +1,132 @@
+import fcntl
+import hashlib
 import os
-from argparse import Namespace
-from typing import NoReturn
+import shutil
+import tempfile
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, List, NoReturn, Optional, TextIO
 
-from exceptions import MinOutOfRangeException
-from utilities.bash_run import run_bash_cmd
+from environment import USER
+from utilities.bash_run import run_bash_cmd, executor
 
 """
 Collection of utilities functions and classes which does not have necessarily relation to each other  
 """
 
 
-def time_constraints(time: str) -> NoReturn:
+def crontab_user_args(user: Optional[str]) -> List[str]:
     """
-    Checks if an input time is between defined constraints
-    :param time: the input time to check for
+    :param user: the crontab owner, None or the invoking user for the own crontab
+    :return: the crontab command arguments selecting the crontab of some other user
     """
-    if int(time) < 0 or int(time) > 59:
-        raise MinOutOfRangeException
+    return ["-u", user] if user is not None and user != USER else []
 
 
-def generate_new_crontab(new_crontab: str) -> None:
+def generate_new_crontab(new_crontab: str, user: Optional[str] = None) -> None:
     """
-    Generate a new crontab entry and insert it into the cron file
+    Generate a new crontab entry and insert it into the cron file. The crontab is written
+    straight to the stdin of 'crontab -'
     :param new_crontab: the already formatted crontab entry
+    :param user: the crontab owner, the invoking user by default
     """
-    echo = run_bash_cmd(["echo", new_crontab], show_output=True).result
-    run_bash_cmd(["crontab"], stdin=echo)
+    executor.run(["crontab"] + crontab_user_args(user) + ["-"], stdin=new_crontab + "\n", check=True)
+
+
+def _replace_file(path: str, write: Callable[[TextIO], None], fsync: bool) -> None:
+    directory = os.path.dirname(path) or "."
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as temp_file:
+            write(temp_file)
+            temp_file.flush()
+            if fsync:
+                os.fsync(temp_file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    if fsync:
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def write_atomically(path: str, text: str, fsync: bool = False) -> None:
+    """
+    Writes a file through a temporary file on the same directory which then replaces it, so
+    readers never see a missing or half written file
+    :param path: the file path
+    :param text: the new file content
+    :param fsync: if the file is flushed to disk before and after replacing the old one
+    """
+    _replace_file(path, lambda temp_file: temp_file.write(text), fsync)
+
+
+def write_lines_atomically(path: str, lines: Iterable[str], fsync: bool = False) -> None:
+    """
+    Same as 'write_atomically', writing the lines as they come, each followed by a line break
+    :param path: the file path
+    :param lines: the lines of the new file content, without line breaks
+    :param fsync: if the file is flushed to disk before and after replacing the old one
+    """
+    _replace_file(path, lambda temp_file: temp_file.writelines(line + "\n" for line in lines), fsync)
+
+
+def crontab_digest(crontab: Optional[str]) -> Optional[str]:
+    """
+    Hashes a crontab as CronTable renders it, without the line breaks at the end, so a crontab
+    read back and an unchanged table rendered have the same digest
+    :param crontab: the crontab content, None when the user has no crontab
+    :return: the hex digest, or None when there is no crontab
+    """
+    return None if crontab is None else lines_digest(crontab.splitlines())
+
+
+def lines_digest(lines: Iterable[str]) -> str:
+    """
+    The 'crontab_digest' of a crontab given line by line, without line breaks
+    """
+    digest = hashlib.sha256()
+    separator = b""
+    for line in lines:
+        digest.update(separator + line.encode("utf-8"))
+        separator = b"\n"
+    return digest.hexdigest()
+
+
+def crontab_lines(crontab: TextIO) -> Iterator[str]:
+    """
+    Streams the lines of a crontab file without line breaks, split as str.splitlines() and so
+    as CronTable splits them
+    :param crontab: the crontab file opened in text mode
+    """
+    for chunk in crontab:
+        yield from chunk.splitlines()
+
+
+def default_commit_lock_dir() -> str:
+    """
+    :return: where the locks serializing the crontab commits are kept, along with the overlap locks of the
+    'pycron.run' wrapper, on $PYCRON_LOCK_DIR or ~/.pycron/locks
+    """
+    return os.environ.get("PYCRON_LOCK_DIR") or os.path.join(os.path.expanduser("~"), ".pycron", "locks")
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """
+    Holds an exclusive flock() on the file while the context lasts, creating the file and its directory
+    :param path: the lock file path
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
 
 
 def check_source_existence(path: str) -> NoReturn:
@@ -42,22 +143,11 @@ def check_pkg_existence() -> None:
     Check if the cron command exists on the OS. Case not, it is installed
     alongside with its dependencies (postfix)
     """
-    check_crontab = run_bash_cmd(["which", "crontab"]).return_code != 0
-    check_postfix = run_bash_cmd(["which", "postfix"]).return_code != 0
+    check_crontab = shutil.which("crontab") is None
+    check_postfix = shutil.which("postfix") is None
     if check_crontab:
         print("Installing cron...")
         os.system("sudo apt install cron")
     if check_postfix:
         print("Installing postfix...")
         os.system("sudo apt install postfix")
-
-
-def check_attr(namespace: Namespace, attr: str) -> bool:
-    """
-    Checks if a namespace has an attribute and if its value is different from None
-    :param namespace: the namespace to check through
-    :param attr: the attribute name which will be check for
-    """
-    if hasattr(namespace, attr) and getattr(namespace, attr) is None:
-        return True
-    return False
@@ -1,19 +1,115 @@
 import subprocess
-from collections import namedtuple
-from typing import List
+import time
+from collections import deque, namedtuple
+from typing import Callable, Deque, Iterable, List, Optional, TextIO
+
+from environment import CMD_TIMEOUT
+from exceptions import BashCmdFailed
 
 BashResults = namedtuple("BashResults", ["return_code", "result"])
+CmdRun = namedtuple("CmdRun", ["commands", "return_code", "stdout", "stderr", "elapsed"])
+
+
+class BashExecutor:
+    def __init__(self, timeout: Optional[float] = CMD_TIMEOUT, history_size: int = 256,
+                 on_command: Optional[Callable[[List[str], Optional[int], float], None]] = None):
+        """
+        Runs commands feeding their stdin and collecting their outputs through a single communicate()
+        call, so no helper process or pipe is needed to pass data in
+        @param timeout: default seconds a command may run before being killed, None waits forever
+        @param history_size: how many of the last runs are kept on 'history'
+        @param on_command: called with the commands, return code (None when timed out) and wall time of
+        every finished run, as the cli profile does
+        """
+        self.timeout = timeout
+        self.history: Deque[CmdRun] = deque(maxlen=history_size)
+        self.on_command = on_command
+
+    def _finished(self, completed: CmdRun) -> None:
+        self.history.append(completed)
+        if self.on_command is not None:
+            self.on_command(completed.commands, completed.return_code, completed.elapsed)
+
+    def run(self, commands: List[str], *, stdin: Optional[str] = None, check: bool = False,
+            timeout: Optional[float] = None, **kwargs) -> CmdRun:
+        """
+        Runs a command and records its wall time
+        :param commands: the command and its arguments
+        :param stdin: the text written to the command stdin
+        :param check: if a non zero exit code raises BashCmdFailed
+        :param timeout: seconds the command may run, defaults to the executor timeout
+        :param kwargs: generic parameter to pass in to Popen
+        :return: the finished run with its outputs and wall time
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start = time.perf_counter()
+        with subprocess.Popen(commands, stdin=subprocess.DEVNULL if stdin is None else subprocess.PIPE,
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding="utf-8", **kwargs) as process:
+            try:
+                stdout, stderr = process.communicate(stdin, timeout=timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.communicate()
+                elapsed = time.perf_counter() - start
+                self._finished(CmdRun(commands, None, "", "", elapsed))
+                raise BashCmdFailed(commands, elapsed=elapsed, timed_out=True)
+
+        completed = CmdRun(commands, process.returncode, stdout, stderr, time.perf_counter() - start)
+        self._finished(completed)
+        if check and completed.return_code != 0:
+            raise BashCmdFailed(commands, completed.return_code, completed.stderr, completed.elapsed)
+        return completed
+
+    def stream(self, commands: List[str], *, lines: Optional[Iterable[str]] = None, stdout: Optional[TextIO] = None,
+               check: bool = False, timeout: Optional[float] = None) -> CmdRun:
+        """
+        Runs a command writing its stdin line by line and sending its stdout straight to a file, so
+        neither is held in memory. The timeout applies once the stdin is written
+        :param commands: the command and its arguments
+        :param lines: the lines written to the command stdin, with their line breaks
+        :param stdout: the file the command writes its output to, discarded by default
+        :param check: if a non zero exit code raises BashCmdFailed
+        :param timeout: seconds the command may run, defaults to the executor timeout
+        :return: the finished run with its error output and wall time, its output is on the file
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start = time.perf_counter()
+        with subprocess.Popen(commands, stdin=subprocess.DEVNULL if lines is None else subprocess.PIPE,
+                              stdout=subprocess.DEVNULL if stdout is None else stdout, stderr=subprocess.PIPE,
+                              encoding="utf-8") as process:
+            if lines is not None:
+                try:
+                    # communicate() then closes the stdin
+                    process.stdin.writelines(lines)
+                except BrokenPipeError:
+                    # The command exited without reading its whole input, its exit code tells why
+                    pass
+            try:
+                _, stderr = process.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.communicate()
+                elapsed = time.perf_counter() - start
+                self._finished(CmdRun(commands, None, "", "", elapsed))
+                raise BashCmdFailed(commands, elapsed=elapsed, timed_out=True)
+
+        completed = CmdRun(commands, process.returncode, "", stderr, time.perf_counter() - start)
+        self._finished(completed)
+        if check and completed.return_code != 0:
+            raise BashCmdFailed(commands, completed.return_code, completed.stderr, completed.elapsed)
+        return completed
+
+
+executor = BashExecutor()
 
 
 def run_bash_cmd(commands: List[str], *, show_output: bool = False, **kwargs) -> BashResults:
     """
     Run a list of bash command
     :param commands: the list of commands for running through bash
-    :param show_output: if the output of the command is redirect to stdout
-    :param kwargs: generic parameter to pass in to bash
+    :param show_output: if the output of the command is returned as the result
+    :param kwargs: generic parameter to pass in to the executor
     :return: an object which contains the bash result and the return code
     """
-    pipe = subprocess.PIPE if show_output else subprocess.DEVNULL
-    completed = subprocess.Popen(commands, stdout=pipe, stderr=subprocess.STDOUT, encoding="utf-8", **kwargs)
-    completed.wait()
-    return BashResults(return_code=completed.returncode, result=completed.stdout)
+    completed = executor.run(commands, **kwargs)
+    return BashResults(return_code=completed.return_code, result=completed.stdout if show_output else None)
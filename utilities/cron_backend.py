@@ -0,0 +1,174 @@
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Optional, TextIO
+
+from environment import (USER, CRON_BACKEND, CRON_SPOOL_DIR, CRON_SPOOL_FSYNC, SNAPSHOT_DIR, SNAPSHOT_KEEP, TABLE_CACHE,
+                         TABLE_CACHE_DIR)
+from exceptions import InvalidCronBackend
+from python_crontab.interfaces.icron_backend import ICronBackend
+from python_crontab.profiling import phase
+from python_crontab.snapshots import SnapshotStore
+from python_crontab.table_cache import Signature, TableCache
+from utilities import (run_bash_cmd, generate_new_crontab, check_pkg_existence, write_atomically, crontab_user_args,
+                       write_lines_atomically, executor)
+
+
+def _file_signature(path: str) -> Signature:
+    # The writes replace the crontab file, so the inode changes even when the size and the times do not
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns
+
+
+class CrontabCmdBackend(ICronBackend):
+    name = "crontab"
+
+    def __init__(self, user: str = USER, spool_dir: str = CRON_SPOOL_DIR):
+        """
+        Reads and writes the crontab through the crontab command
+        @param user: the crontab owner. The crontab of other users than the invoking one goes
+        through 'crontab -u', which requires privileges
+        @param spool_dir: the cron spool directory, where the crontab command keeps the crontab. Only
+        looked at to tell if the crontab changed, when its spool file can be stat
+        """
+        super(CrontabCmdBackend, self).__init__(user)
+        self.spool_dir = spool_dir
+        self._pkg_checked = False
+
+    def _check_pkg(self) -> None:
+        # Deferred to the first crontab access, so building a backend costs nothing
+        if not self._pkg_checked:
+            with phase("check_pkg_existence"):
+                check_pkg_existence()
+            self._pkg_checked = True
+
+    def read(self) -> Optional[str]:
+        with phase("read"):
+            self._check_pkg()
+            crontab_command = run_bash_cmd(["crontab"] + crontab_user_args(self.user) + ["-l"], show_output=True)
+        # A missing crontab is reported by a non zero exit code and a 'no crontab' message on stderr
+        return crontab_command.result if crontab_command.return_code == 0 else None
+
+    def write(self, crontab: str) -> None:
+        with phase("write"):
+            self._check_pkg()
+            generate_new_crontab(crontab, self.user)
+
+    @contextmanager
+    def open_crontab(self) -> Iterator[Optional[TextIO]]:
+        # 'crontab -l' writes straight to a temporary file, which is then read line by line
+        with tempfile.TemporaryFile("w+", encoding="utf-8") as staged:
+            with phase("read"):
+                self._check_pkg()
+                listed = executor.stream(["crontab"] + crontab_user_args(self.user) + ["-l"], stdout=staged)
+                staged.seek(0)
+            yield staged if listed.return_code == 0 else None
+
+    def write_lines(self, lines: Iterable[str]) -> None:
+        with phase("write"):
+            self._check_pkg()
+            executor.stream(["crontab"] + crontab_user_args(self.user) + ["-"], lines=(line + "\n" for line in lines),
+                            check=True)
+
+    def signature(self) -> Optional[Signature]:
+        # The spool directory is usually closed to the users, and a missing file may as well be a
+        # wrong spool directory, so only a file found tells anything
+        try:
+            return _file_signature(os.path.join(self.spool_dir, self.user))
+        except OSError:
+            return None
+
+
+class SpoolFileBackend(ICronBackend):
+    name = "spool"
+
+    def __init__(self, user: str = USER, spool_dir: str = CRON_SPOOL_DIR, fsync: bool = CRON_SPOOL_FSYNC):
+        """
+        Reads and writes the user crontab file straight from the cron spool directory, without
+        spawning any process. Writes go to a temporary file which atomically replaces the crontab,
+        so cron never sees a missing or half written table
+        @param user: the crontab owner, which is also the spool file name
+        @param spool_dir: the cron spool directory
+        @param fsync: if the new crontab is flushed to disk before and after replacing the old one
+        """
+        super(SpoolFileBackend, self).__init__(user)
+        self.spool_dir = spool_dir
+        self.fsync = fsync
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.spool_dir, self.user)
+
+    def read(self) -> Optional[str]:
+        try:
+            with phase("read"), open(self.path, encoding="utf-8") as crontab:
+                return crontab.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, crontab: str) -> None:
+        if crontab:
+            # The crontab is given as rendered, without the last line break, as 'crontab -' gets it.
+            # cron ignores a last line without the line break
+            crontab += "\n"
+        with phase("write"):
+            write_atomically(self.path, crontab, self.fsync)
+
+    @contextmanager
+    def open_crontab(self) -> Iterator[Optional[TextIO]]:
+        with phase("read"):
+            try:
+                crontab = open(self.path, encoding="utf-8")
+            except FileNotFoundError:
+                crontab = None
+        if crontab is None:
+            yield None
+            return
+        # The writes replace the spool file, so it keeps its content while open
+        with crontab:
+            yield crontab
+
+    def write_lines(self, lines: Iterable[str]) -> None:
+        with phase("write"):
+            write_lines_atomically(self.path, lines, self.fsync)
+
+    def signature(self) -> Optional[Signature]:
+        try:
+            return _file_signature(self.path)
+        except FileNotFoundError:
+            return ()
+        except OSError:
+            return None
+
+
+def crontab_users(spool_dir: str = CRON_SPOOL_DIR) -> List[str]:
+    """
+    Lists the users with a crontab: the files of the cron spool directory, which usually only
+    root can read
+    :param spool_dir: the cron spool directory
+    :return: the user names, sorted
+    """
+    return sorted(name for name in os.listdir(spool_dir)
+                  if not name.startswith(".") and os.path.isfile(os.path.join(spool_dir, name)))
+
+
+def make_cron_backend(backend: str = CRON_BACKEND, user: str = USER, spool_dir: str = CRON_SPOOL_DIR) -> ICronBackend:
+    """
+    Builds the crontab storage backend, snapshotting the replaced crontabs unless $PYCRON_SNAPSHOT_KEEP is 0,
+    and caching the parsed crontabs unless $PYCRON_TABLE_CACHE is 0
+    :param backend: the backend name, 'crontab' or 'spool'
+    :param user: the crontab owner
+    :param spool_dir: the cron spool directory, read by the 'spool' backend and stat by the 'crontab' one
+    :return: the backend instance
+    """
+    if backend == "crontab":
+        cron_backend = CrontabCmdBackend(user, spool_dir)
+    elif backend == "spool":
+        cron_backend = SpoolFileBackend(user, spool_dir)
+    else:
+        raise InvalidCronBackend(backend)
+    if SNAPSHOT_KEEP > 0:
+        cron_backend.snapshots = SnapshotStore(os.path.join(SNAPSHOT_DIR, user), SNAPSHOT_KEEP)
+    if TABLE_CACHE:
+        cron_backend.table_cache = TableCache(os.path.join(TABLE_CACHE_DIR, cron_backend.name))
+    return cron_backend
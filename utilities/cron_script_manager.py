@@ -1,80 +1,343 @@
-import io
-from typing import TypeVar, Callable
+import random
+import time
+from contextlib import ExitStack
+from functools import partial
+from typing import Callable, Iterable, Iterator, List, Optional, TextIO, Tuple, TypeVar
 
+from exceptions import CrontabConflict, DaemonError
+from python_crontab.cron_table import CronEntry, CronTable, parse_entry, parse_line
+from python_crontab.daemon_protocol import OP_DELETE, OP_INSERT, OP_OPEN, OP_UPDATE, PROTOCOL_VERSION, \
+    DaemonConnection, Message
+from python_crontab.interfaces.icron_backend import ICronBackend
 from python_crontab.interfaces.icron_entry import ICronEntry
-from utilities import run_bash_cmd
+from python_crontab.profiling import phase
+from utilities import crontab_lines, lines_digest
 
 Self = TypeVar("Self", bound="CronScriptManager")
 
+# How many times a commit is tried when the crontab keeps changing since it was read, waiting a
+# doubling backoff from COMMIT_BACKOFF seconds between the attempts, jittered so the racing commits spread
+COMMIT_ATTEMPTS = 5
+COMMIT_BACKOFF = 0.05
+
 
 class CronScriptManager:
-    def __init__(self, crontab_gen: ICronEntry):
+    def __init__(self, crontab_gen: ICronEntry, backend: ICronBackend):
         """
-        Manages the "CRUD" operation done in the cron scripts
+        Manages the "CRUD" operation done in the cron scripts. The crontab is read and parsed
+        once, and every operation runs over the indexed table in memory. The operations are
+        kept, so they can be applied again over a crontab changed by someone else before the commit
         @param crontab_gen: concrete implementation of class for setting the python script through crontab script
+        @param backend: the storage the crontab is read from and committed to
         """
         self.crontab_gen = crontab_gen
+        self.backend = backend
         self.was_entry_modified = False
-        self._new_cron_io = io.StringIO()
-        self._base_crontab_command = run_bash_cmd(["crontab", "-l"], show_output=True)
-        self._cron_io: io.TextIOWrapper = self._base_crontab_command.result
-        self.some_entry_exists: bool = True if self._base_crontab_command.return_code == 0 else False
-
-    def _io_wrapper(self, func: Callable[..., str]) -> Callable[..., str]:
-        def inner_wrapper(*args, **kwargs) -> str:
-            update_crontab_script = func(*args, **kwargs)
-            self._new_cron_io.close()
-            run_bash_cmd(["crontab", "-r"])
-            return update_crontab_script.strip()
-
-        return inner_wrapper
-
-    def __getattr__(self, item) -> Callable[..., str]:
-        if callable(item):
-            return self._io_wrapper(item)
-
-    def insert_new_cron(self) -> str:
-        new_cron_script = self.crontab_gen.build_cron_script()
-        while True:
-            line = self._cron_io.readline()
-            if line:
-                if new_cron_script in line:
-                    self.was_entry_modified = True
-                    break
-                self._new_cron_io.write(line)
-            else:
-                break
-        self._new_cron_io.write(new_cron_script)
-        return self._new_cron_io.getvalue()
-
-    def remove_cron_entry(self) -> str:
-        cron_script = self.crontab_gen.build_cron_script()
-        while True:
-            line = self._cron_io.readline()
-            if line:
-                if cron_script in line:
-                    line = ""
-                    self.was_entry_modified = True
-                self._new_cron_io.write(line)
-            else:
-                break
-        return self._new_cron_io.getvalue()
-
-    def update_cron(self, old_cron_entry: str, new_cron_entry: str) -> str:
-        while True:
-            line = self._cron_io.readline()
-            if line:
-                if old_cron_entry in line:
-                    line = new_cron_entry + "\n"
-                    self.was_entry_modified = True
-                self._new_cron_io.write(line)
-            else:
-                break
-        return self._new_cron_io.getvalue()
+        self.commit_attempts = 0
+        # The name and the arguments of every operation applied so far
+        self._operations: List[Tuple[str, tuple]] = []
+        self._changed = False
+        self._read()
+
+    def _read(self) -> None:
+        table, self.read_digest = self.backend.read_table()
+        self.some_entry_exists: bool = table is not None
+        self.cron_table = table if table is not None else CronTable()
+
+    def render(self) -> str:
+        """
+        :return: the whole crontab, with every operation applied so far
+        """
+        return self.cron_table.render()
+
+    def commit(self) -> bool:
+        """
+        Writes the crontab, with every operation applied so far, back to the storage backend. Nothing is
+        written when the operations left the crontab as it was read. When the crontab changed since it
+        was read, it is read again and the operations are applied again over it, with a bounded backoff
+        :return: if the crontab was written
+        """
+        for attempt in range(COMMIT_ATTEMPTS):
+            self.commit_attempts = attempt + 1
+            if not self._changed:
+                return False
+            written = self._write_if_unchanged()
+            if written is not None:
+                return written
+            time.sleep(COMMIT_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+            self._replay()
+        raise CrontabConflict(self.backend.user, COMMIT_ATTEMPTS)
+
+    def _write_if_unchanged(self) -> Optional[bool]:
+        """
+        :return: if the crontab was written, False when there was nothing to write, None when the crontab
+        changed since it was read
+        """
+        if lines_digest(line.raw for line in self.cron_table.lines()) == self.read_digest:
+            return False
+        with phase("render"):
+            crontab = self.render()
+        if not crontab and self.read_digest is None:
+            return False
+        return True if self.backend.write_if_unchanged(crontab, self.read_digest) else None
+
+    def _replay(self) -> None:
+        operations, self._operations = self._operations, []
+        self._changed = False
+        self._read()
+        for operation, args in operations:
+            getattr(self, operation)(*args)
+
+    def insert_new_cron(self, new_cron_script: Optional[str] = None) -> bool:
+        """
+        Appends the entry unless it already exists
+        :param new_cron_script: the entry to insert. Defaults to the one from the crontab builder
+        :return: if the entry already existed (also kept on 'was_entry_modified')
+        """
+        new_cron_script = new_cron_script or self.crontab_gen.build_cron_script()
+        self._operations.append(("insert_new_cron", (new_cron_script,)))
+        added = self.cron_table.add(new_cron_script)
+        self._changed |= added
+        self.was_entry_modified = not added
+        return self.was_entry_modified
+
+    def remove_cron_entry(self, cron_script: Optional[str] = None) -> bool:
+        """
+        Removes the entry
+        :param cron_script: the entry to remove. Defaults to the one from the crontab builder
+        :return: if the entry was found and removed (also kept on 'was_entry_modified')
+        """
+        cron_script = cron_script or self.crontab_gen.build_cron_script()
+        self._operations.append(("remove_cron_entry", (cron_script,)))
+        self.was_entry_modified = self.cron_table.remove(cron_script)
+        self._changed |= self.was_entry_modified
+        return self.was_entry_modified
+
+    def update_cron(self, old_cron_entry: str, new_cron_entry: str) -> bool:
+        """
+        Replaces the old entry by the new one, keeping its position on the crontab
+        :return: if the old entry was found and replaced (also kept on 'was_entry_modified')
+        """
+        self._operations.append(("update_cron", (old_cron_entry, new_cron_entry)))
+        self.was_entry_modified = self.cron_table.replace(old_cron_entry, new_cron_entry)
+        self._changed |= self.was_entry_modified
+        return self.was_entry_modified
 
     def __enter__(self) -> Self:
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
-        self._cron_io.close()
+        return False
+
+
+class _EntryMatcher:
+    def __init__(self, entry: CronEntry):
+        """
+        Tells the crontab lines holding an entry. Lines missing some word of the entry command can not
+        run it, so most lines are told apart by substring searches, without being parsed. The longest
+        words go first, as they usually differ first (the pycron entries all end alike)
+        """
+        self.entry = entry
+        self._words = sorted(set(entry.command.split()), key=len, reverse=True)
+
+    def __call__(self, raw: str) -> bool:
+        for word in self._words:
+            if word not in raw:
+                return False
+        line = parse_line(raw)
+        return isinstance(line, CronEntry) and line.key == self.entry.key
+
+
+def _appended(lines: Iterable[str], entry: CronEntry) -> Iterator[str]:
+    yield from lines
+    yield entry.raw
+
+
+def _without(lines: Iterable[str], matcher: _EntryMatcher) -> Iterator[str]:
+    return (raw for raw in lines if not matcher(raw))
+
+
+def _replaced(lines: Iterable[str], matcher: _EntryMatcher, new_entry: CronEntry) -> Iterator[str]:
+    replaced = False
+    for raw in lines:
+        if not matcher(raw):
+            yield raw
+        elif not replaced:
+            replaced = True
+            yield new_entry.raw
+
+
+class StreamingCronScriptManager(CronScriptManager):
+    def __init__(self, crontab_gen: ICronEntry, backend: ICronBackend):
+        """
+        Runs the same operations as CronScriptManager without holding the crontab in memory, so its
+        memory stays flat whatever the crontab size. The crontab is opened as a file (the spool file, or
+        the output of 'crontab -l' staged on a temporary file), every operation scans it for the entries
+        it needs and adds a generator to the pipeline, and the commit streams the crontab through the
+        pipeline straight into the writer. There is no 'cron_table', so the spread placement, which needs
+        the load of the whole table, goes through CronScriptManager
+        """
+        self._files = ExitStack()
+        self._source: Optional[TextIO] = None
+        self._transforms: List[Callable[[Iterable[str]], Iterator[str]]] = []
+        super(StreamingCronScriptManager, self).__init__(crontab_gen, backend)
+
+    def _read(self) -> None:
+        self._files.close()
+        self._transforms = []
+        self._source = self._files.enter_context(self.backend.open_crontab())
+        self.some_entry_exists = self._source is not None
+        with phase("parse"):
+            self.read_digest = None if self._source is None else lines_digest(self._source_lines())
+
+    def _source_lines(self) -> Iterator[str]:
+        if self._source is None:
+            return iter(())
+        self._source.seek(0)
+        return crontab_lines(self._source)
+
+    def lines(self) -> Iterator[str]:
+        """
+        :return: the crontab lines, with every operation applied so far
+        """
+        lines = self._source_lines()
+        for transform in self._transforms:
+            lines = transform(lines)
+        return lines
+
+    def _find(self, *matchers: _EntryMatcher) -> List[bool]:
+        """
+        :return: if each entry is on the crontab, with the operations applied so far
+        """
+        found = [False] * len(matchers)
+        for raw in self.lines():
+            for index, matcher in enumerate(matchers):
+                found[index] = found[index] or matcher(raw)
+            if all(found):
+                break
+        return found
+
+    def render(self) -> str:
+        return "\n".join(self.lines())
+
+    def _write_if_unchanged(self) -> Optional[bool]:
+        # A single operation which changed something always changes the crontab, only several may undo each other
+        if len(self._transforms) > 1 and lines_digest(self.lines()) == self.read_digest:
+            return False
+        return True if self.backend.write_lines_if_unchanged(self.lines, self.read_digest) else None
+
+    def insert_new_cron(self, new_cron_script: Optional[str] = None) -> bool:
+        new_cron_script = new_cron_script or self.crontab_gen.build_cron_script()
+        self._operations.append(("insert_new_cron", (new_cron_script,)))
+        entry = parse_entry(new_cron_script)
+        self.was_entry_modified, = self._find(_EntryMatcher(entry))
+        if not self.was_entry_modified:
+            self._transforms.append(partial(_appended, entry=entry))
+            self._changed = True
+        return self.was_entry_modified
+
+    def remove_cron_entry(self, cron_script: Optional[str] = None) -> bool:
+        cron_script = cron_script or self.crontab_gen.build_cron_script()
+        self._operations.append(("remove_cron_entry", (cron_script,)))
+        matcher = _EntryMatcher(parse_entry(cron_script))
+        self.was_entry_modified, = self._find(matcher)
+        if self.was_entry_modified:
+            self._transforms.append(partial(_without, matcher=matcher))
+            self._changed = True
+        return self.was_entry_modified
+
+    def update_cron(self, old_cron_entry: str, new_cron_entry: str) -> bool:
+        self._operations.append(("update_cron", (old_cron_entry, new_cron_entry)))
+        old_matcher, new_entry = _EntryMatcher(parse_entry(old_cron_entry)), parse_entry(new_cron_entry)
+        if old_matcher.entry.key == new_entry.key:
+            # As on CronTable, the crontab is left as it is
+            self.was_entry_modified, = self._find(old_matcher)
+            return self.was_entry_modified
+        self.was_entry_modified, new_exists = self._find(old_matcher, _EntryMatcher(new_entry))
+        if self.was_entry_modified:
+            # As on CronTable, the old entry is just removed when the new one is already on the crontab
+            self._transforms.append(partial(_without, matcher=old_matcher) if new_exists else
+                                    partial(_replaced, matcher=old_matcher, new_entry=new_entry))
+            self._changed = True
+        return self.was_entry_modified
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
+        self._files.close()
+        return False
+
+
+class DaemonScriptManager:
+    def __init__(self, crontab_gen: ICronEntry, backend: ICronBackend, connection: DaemonConnection,
+                 some_entry_exists: bool):
+        """
+        Runs the single entry operations of CronScriptManager on the 'pycron.daemon', which holds the
+        crontab parsed in memory and coalesces the changes of its clients into a commit. Each operation
+        is answered once committed, so 'commit' has nothing left to do. Built by 'connect'
+        @param connection: the open connection to the daemon
+        @param some_entry_exists: if the user has a crontab, as the daemon holds it
+        """
+        self.crontab_gen = crontab_gen
+        self.backend = backend
+        self.some_entry_exists = some_entry_exists
+        self.was_entry_modified = False
+        self.commit_attempts = 0
+        self._connection = connection
+        self._written = False
+
+    @classmethod
+    def connect(cls, crontab_gen: ICronEntry, backend: ICronBackend) -> Optional["DaemonScriptManager"]:
+        """
+        :return: the manager, or None when no daemon is running or it serves another backend
+        """
+        connection = DaemonConnection.connect()
+        if connection is None:
+            return None
+        try:
+            reply = connection.request({"op": OP_OPEN, "version": PROTOCOL_VERSION, "user": backend.user,
+                                        "backend": backend.name, "spool_dir": getattr(backend, "spool_dir", None)})
+        except (OSError, ValueError):
+            reply = {"declined": "no reply"}
+        if not reply.get("ok"):
+            connection.close()
+            return None
+        return cls(crontab_gen, backend, connection, reply["exists"])
+
+    def _request(self, op: str, **arguments) -> Message:
+        try:
+            reply = self._connection.request({"op": op, "user": self.backend.user, **arguments})
+        except (OSError, ValueError) as e:
+            raise DaemonError(str(e))
+        if not reply.get("ok"):
+            raise DaemonError(reply.get("error", "unknown error"))
+        self._written |= reply["written"]
+        self.commit_attempts = max(self.commit_attempts, reply["attempts"])
+        if reply["changed"]:
+            self.some_entry_exists = True
+        return reply
+
+    def commit(self) -> bool:
+        """
+        :return: if the operations wrote the crontab, which the daemon did before answering them
+        """
+        return self._written
+
+    def insert_new_cron(self, new_cron_script: Optional[str] = None) -> bool:
+        new_cron_script = new_cron_script or self.crontab_gen.build_cron_script()
+        self.was_entry_modified = not self._request(OP_INSERT, entry=new_cron_script)["changed"]
+        return self.was_entry_modified
+
+    def remove_cron_entry(self, cron_script: Optional[str] = None) -> bool:
+        cron_script = cron_script or self.crontab_gen.build_cron_script()
+        self.was_entry_modified = self._request(OP_DELETE, entry=cron_script)["changed"]
+        return self.was_entry_modified
+
+    def update_cron(self, old_cron_entry: str, new_cron_entry: str) -> bool:
+        self.was_entry_modified = self._request(OP_UPDATE, old=old_cron_entry, new=new_cron_entry)["changed"]
+        return self.was_entry_modified
+
+    def __enter__(self) -> "DaemonScriptManager":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
+        self._connection.close()
         return False
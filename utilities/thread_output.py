@@ -0,0 +1,55 @@
+import io
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Iterator, TextIO
+
+
+class ThreadOutput(io.TextIOBase):
+    def __init__(self, stream: TextIO):
+        """
+        Stands for sys.stdout while commands run on concurrent threads: the text printed by a
+        thread capturing its output goes to its own buffer, the rest to the original stream
+        @param stream: the original stream
+        """
+        super(ThreadOutput, self).__init__()
+        self.stream = stream
+        self._local = threading.local()
+
+    def _target(self) -> TextIO:
+        buffer = getattr(self._local, "buffer", None)
+        return self.stream if buffer is None else buffer
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        return self._target().write(text)
+
+    def flush(self) -> None:
+        self._target().flush()
+
+    @contextmanager
+    def capture(self) -> Iterator[io.StringIO]:
+        """
+        Captures what the current thread prints
+        """
+        buffer = io.StringIO()
+        self._local.buffer = buffer
+        try:
+            yield buffer
+        finally:
+            self._local.buffer = None
+
+
+@contextmanager
+def thread_output() -> Iterator[ThreadOutput]:
+    """
+    Replaces sys.stdout by a ThreadOutput while the context lasts
+    """
+    original = sys.stdout
+    sys.stdout = output = ThreadOutput(original)
+    try:
+        yield output
+    finally:
+        sys.stdout = original